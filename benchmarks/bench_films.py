@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+bench_films.py
+"""
+
+import argparse
+import datetime
+import os
+import sys
+import time
+import tracemalloc
+
+from veezi import filmindex
+
+# The stand-in server and synthetic sites live with the tests.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "tests"))
+import fixtures
+
+
+def bs4_films(text):
+	# The BeautifulSoup scraper films() used before the streaming parser.
+	import bs4
+
+	s = bs4.BeautifulSoup(text, "html.parser")
+	trs = s.find("tbody").find_all("tr")
+	films = []
+
+	for tr in trs:
+		link = tr.find("a")
+		edit_url = link["href"]
+		tds = tr.find_all("td")
+
+		films.append(dict(
+			title = link.text,
+			edit_url = edit_url,
+			session = edit_url.split("/")[-1],
+			distributor_name = tds[1].text,
+			release_date = datetime.datetime.strptime(tr.find("td", class_="date").text, "%m/%d/%Y"),
+			genre = tds[3].text,
+			is_active = tds[4].text.strip() == "Active"
+		))
+
+	return films
+
+def fixture(count):
+	return fixtures.films_index_html([
+		dict(
+			title = "Film {0} &amp; Friends".format(i),
+			edit_url = "/films/edit/ST{0:06d}".format(i),
+			distributor_name = "Distributor {0}".format(i % 40),
+			release_date = datetime.datetime(2000, 1, 1) + datetime.timedelta(days = i % 5000),
+			genre = "Drama",
+			is_active = i % 4 != 0,
+		)
+		for i in range(count)
+	])
+
+def _measure(parse, text, repeat):
+	best = None
+	for i in range(repeat):
+		started = time.perf_counter()
+		result = parse(text)
+		elapsed = time.perf_counter() - started
+		best = elapsed if best is None else min(best, elapsed)
+
+	tracemalloc.start()
+	parse(text)
+	peak = tracemalloc.get_traced_memory()[1]
+	tracemalloc.stop()
+	return result, best, peak
+
+def main():
+	parser = argparse.ArgumentParser(description = "Compare the streaming film index parser with BeautifulSoup.")
+	parser.add_argument("--films", type = int, default = 5000)
+	parser.add_argument("--repeat", type = int, default = 3)
+	parser.add_argument("--fixture", help = "parse this saved /films/index page instead of a synthetic one")
+	parser.add_argument("--save", help = "write the synthetic page to this path")
+	args = parser.parse_args()
+
+	if args.fixture:
+		with open(args.fixture, "r", encoding = "utf-8") as f:
+			text = f.read()
+	else:
+		text = fixture(args.films)
+		if args.save:
+			with open(args.save, "w", encoding = "utf-8") as f:
+				f.write(text)
+
+	expected, bs4_seconds, bs4_peak = _measure(bs4_films, text, args.repeat)
+	films, seconds, peak = _measure(filmindex.parse_films, text, args.repeat)
+	assert films == expected
+
+	print("page:       {0:.1f} KiB, {1} films".format(len(text) / 1024.0, len(films)))
+	print("bs4:        {0:8.1f} ms  peak {1:6.1f} MiB".format(bs4_seconds * 1000, bs4_peak / 2.0 ** 20))
+	print("streaming:  {0:8.1f} ms  peak {1:6.1f} MiB".format(seconds * 1000, peak / 2.0 ** 20))
+	print("speedup:    {0:.1f}x".format(bs4_seconds / seconds))
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+bench_import.py
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+
+HEAVY_MODULES = ["bs4", "openpyxl", "dateutil", "more_itertools", "requests", "pkg_resources", "numpy"]
+
+_PROBE = """
+import json, logging, sys, time
+started = time.perf_counter()
+{statement}
+elapsed = time.perf_counter() - started
+print(json.dumps(dict(
+	seconds = elapsed,
+	loaded = [m for m in {heavy!r} if m in sys.modules],
+	root_handlers = len(logging.getLogger().handlers),
+)))
+"""
+
+
+def _probe(statement):
+	code = _PROBE.format(statement = statement, heavy = HEAVY_MODULES)
+	output = subprocess.check_output([sys.executable, "-c", code], stderr = subprocess.DEVNULL)
+	return json.loads(output.decode("utf-8").strip().splitlines()[-1])
+
+def main():
+	parser = argparse.ArgumentParser(description = "Measure the cost of importing veezi in a fresh interpreter.")
+	parser.add_argument("--repeat", type = int, default = 10)
+	args = parser.parse_args()
+
+	statements = [
+		"import veezi",
+		"import veezi; veezi.__version__",
+		"import veezi.libveezi",
+		"import veezi.backoffice; veezi.filmindex.FilmTableParser().feed('<table><tbody></tbody></table>')",
+	]
+	for statement in statements:
+		results = [_probe(statement) for i in range(args.repeat)]
+		print("{0:<100} median {1:7.1f} ms  loads {2}  root handlers {3}".format(
+			statement,
+			statistics.median(r["seconds"] for r in results) * 1000,
+			", ".join(results[0]["loaded"]) or "-",
+			results[0]["root_handlers"],
+		))
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+bench_records.py
+"""
+
+import argparse
+import datetime
+import gc
+import tracemalloc
+
+from veezi import records
+
+
+TICKET_TYPES = ("Adult", "Child", "Senior", "Student", "Member")
+
+
+def _session(n, showtime):
+	return dict(
+		advance_revenue = 0.0,
+		cleanup_duration = 15,
+		code = "S{0:06d}".format(n),
+		complimentaries = False,
+		distributor_share = 0.5,
+		film_id = "ST{0:03d}".format(n % 40),
+		finish = (showtime + datetime.timedelta(hours = 2)).isoformat(),
+		id = n,
+		intermission = 0,
+		is_stopped = False,
+		language_id = "en",
+		play_through_group_code = "",
+		price_card_id = 1,
+		sales_types = ["KIOSK", "POS", "WWW"],
+		seats = 120,
+		seats_available = 80,
+		seats_held = 0,
+		seats_house = 0,
+		seats_sold = 40,
+		status = "Open",
+		show_number = n % 6,
+		show_type = "Public",
+		start = showtime.isoformat(),
+		validation_errors = [],
+		site_id = 9999,
+		screen_id = n % 8,
+	)
+
+def _ticket(name, n):
+	return dict(
+		name = name,
+		sales = n,
+		refunds = 0,
+		admits = n,
+		gross_price = 12.5,
+		net_price = 11.25,
+		net_total = 11.25 * n,
+		tax_total = 1.25 * n,
+		gross_total = 12.5 * n,
+	)
+
+def _shows(count):
+	start = datetime.datetime(2015, 1, 1, 12)
+	shows = dict()
+	for n in range(count):
+		showtime = start + datetime.timedelta(hours = n)
+		show = dict(boxoffice = dict((name, _ticket(name, n % 50)) for name in TICKET_TYPES))
+		show.update(_session(n, showtime))
+		shows[(9999, n % 8, showtime)] = show
+	return shows
+
+def _traced(build):
+	gc.collect()
+	tracemalloc.start()
+	try:
+		result = build()
+		current, peak = tracemalloc.get_traced_memory()
+	finally:
+		tracemalloc.stop()
+	return result, current, peak
+
+def main():
+	parser = argparse.ArgumentParser(description = "Compare retained memory of dict and slotted show records.")
+	parser.add_argument("--shows", type = int, default = 50000)
+	args = parser.parse_args()
+
+	source = _shows(args.shows)
+
+	def dicts():
+		return dict(
+			(show_key, dict(show, boxoffice = dict((name, dict(ticket)) for name, ticket in show["boxoffice"].items())))
+			for show_key, show in source.items()
+		)
+
+	def compact():
+		return dict((show_key, records.compact_show(show)) for show_key, show in source.items())
+
+	dict_shows, dict_bytes, _ = _traced(dicts)
+	compact_shows, compact_bytes, _ = _traced(compact)
+	assert compact_shows == dict_shows
+
+	print("shows:         {0}".format(args.shows))
+	print("dict records:  {0:.1f} MiB ({1:.0f} B/show)".format(dict_bytes / 2.0 ** 20, float(dict_bytes) / args.shows))
+	print("compact:       {0:.1f} MiB ({1:.0f} B/show)".format(compact_bytes / 2.0 ** 20, float(compact_bytes) / args.shows))
+	print("saved:         {0:.0%}".format(1 - float(compact_bytes) / dict_bytes))
+
+if __name__ == "__main__":
+	main()
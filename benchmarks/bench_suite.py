@@ -0,0 +1,178 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+bench_suite.py
+"""
+
+import argparse
+import datetime
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+
+from veezi import api
+from veezi import backoffice
+from veezi import libveezi
+from veezi import reports
+from veezi import transport
+
+# The stand-in server and synthetic sites live with the tests.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "tests"))
+import fixtures
+
+
+BASELINES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines.json")
+
+# Whether a bigger number is better for each kind of measurement.
+HIGHER_IS_BETTER = dict(rows_per_second = True, seconds = False, peak_mib = False)
+
+
+def _kind(name):
+	for kind in HIGHER_IS_BETTER:
+		if name.endswith(kind):
+			return kind
+	raise ValueError(name)
+
+def _best(measure, repeat):
+	return min(measure() for i in range(repeat))
+
+def _parse_seconds(make_rows, content):
+	started = time.perf_counter()
+	for engagement in reports.iter_engagements(make_rows(io.BytesIO(content))):
+		pass
+	return time.perf_counter() - started
+
+def _parse_peak(make_rows, content):
+	tracemalloc.start()
+	try:
+		reports.merge_engagements(dict(), reports.iter_engagements(make_rows(io.BytesIO(content))))
+		return tracemalloc.get_traced_memory()[1]
+	finally:
+		tracemalloc.stop()
+
+def bench_parse(site, repeat):
+	rows = fixtures.report_rows(site["engagements"])
+	body_rows = len(rows) - reports.HEADER_ROWS
+	exports = dict(
+		native = (fixtures.report_workbook(rows), lambda f: reports.xlsx_rows(f, reports.XlsxBackend.native)),
+		openpyxl = (fixtures.report_workbook(rows), lambda f: reports.xlsx_rows(f, reports.XlsxBackend.openpyxl)),
+		csv = (fixtures.report_csv(rows), reports._csv_rows),
+	)
+
+	results = dict()
+	for name, (content, make_rows) in exports.items():
+		seconds = _best(lambda: _parse_seconds(make_rows, content), repeat)
+		results["parse.{0}.rows_per_second".format(name)] = body_rows / seconds
+		results["parse.{0}.peak_mib".format(name)] = _parse_peak(make_rows, content) / 2.0 ** 20
+	return results
+
+def _query_seconds(server, start_date, end_date, **client_kwargs):
+	http = transport.HttpSession()
+	client = libveezi.VeeziClient(
+		backoffice.BackofficeSession(http, root = server.root),
+		api.VeeziApi("token", http = http, root = server.api_root, cache = False),
+		**client_kwargs
+	)
+	started = time.perf_counter()
+	result = client.query(start_date, end_date)
+	seconds = time.perf_counter() - started
+	http.close()
+	return seconds, result
+
+def bench_query(site, start_date, days, latency, repeat):
+	end_date = start_date + datetime.timedelta(days = days)
+	configurations = dict(
+		serial = dict(),
+		parallel = dict(parallel_fetch = True),
+		windowed = dict(parallel_fetch = True, report_window_days = 7, report_workers = 4),
+	)
+
+	results = dict()
+	with fixtures.StandInServer(latency = latency, **site) as server:
+		for name, client_kwargs in configurations.items():
+			timings = []
+			for i in range(repeat):
+				seconds, result = _query_seconds(server, start_date, end_date, **client_kwargs)
+				assert len(result["shows"]) == len(site["sessions"]), name
+				timings.append(seconds)
+			results["query.{0}.seconds".format(name)] = statistics.median(timings)
+	return results
+
+def compare(results, baseline, tolerance):
+	regressions = []
+	for name, value in sorted(results.items()):
+		previous = baseline.get(name)
+		if previous is None:
+			print("{0:<36} {1:12.2f}".format(name, value))
+			continue
+
+		change = (value - previous) / previous if previous else 0.0
+		worse = -change if HIGHER_IS_BETTER[_kind(name)] else change
+		flag = ""
+		if worse > tolerance:
+			flag = "REGRESSION"
+			regressions.append(name)
+		print("{0:<36} {1:12.2f}  baseline {2:12.2f}  {3:+7.1%}  {4}".format(name, value, previous, change, flag))
+	return regressions
+
+def main():
+	parser = argparse.ArgumentParser(description = "Benchmark report parsing and query() against a stand-in server.")
+	parser.add_argument("--distributors", type = int, default = 10)
+	parser.add_argument("--films", type = int, default = 4, help = "films per distributor")
+	parser.add_argument("--screens", type = int, default = 8)
+	parser.add_argument("--days", type = int, default = 90)
+	parser.add_argument("--shows", type = int, default = 4, help = "shows per screen per day")
+	parser.add_argument("--ticket-types", type = int, default = 5)
+	parser.add_argument("--latency", type = float, default = 0.02, help = "stand-in server latency per request, in seconds")
+	parser.add_argument("--repeat", type = int, default = 3)
+	parser.add_argument("--baselines", default = BASELINES)
+	parser.add_argument("--record", action = "store_true", help = "store these results as the baseline")
+	parser.add_argument("--tolerance", type = float, default = 0.3, help = "allowed fractional slowdown before failing")
+	parser.add_argument("--skip-query", action = "store_true")
+	args = parser.parse_args()
+
+	start_date = datetime.datetime(2015, 1, 1)
+	scenario = dict(
+		distributors = args.distributors,
+		films_per_distributor = args.films,
+		screens = args.screens,
+		days = args.days,
+		shows_per_day = args.shows,
+		ticket_types = args.ticket_types,
+	)
+	site = fixtures.synthetic_site(start_date = start_date, **scenario)
+	scenario_key = json.dumps(dict(scenario, latency = args.latency), sort_keys = True)
+	print("scenario: {0}, {1} sessions".format(scenario_key, len(site["sessions"])))
+
+	results = bench_parse(site, args.repeat)
+	if not args.skip_query:
+		results.update(bench_query(site, start_date, args.days, args.latency, args.repeat))
+
+	baselines = dict()
+	if os.path.exists(args.baselines):
+		with open(args.baselines, "r") as f:
+			baselines = json.load(f)
+
+	regressions = compare(results, baselines.get(scenario_key, dict()).get("results", dict()), args.tolerance)
+
+	if args.record:
+		baselines[scenario_key] = dict(
+			results = results,
+			recorded = datetime.datetime.now().replace(microsecond = 0).isoformat(),
+			python = platform.python_version(),
+			machine = platform.machine(),
+		)
+		with open(args.baselines, "w") as f:
+			json.dump(baselines, f, indent = 1, sort_keys = True)
+			f.write("\n")
+		print("recorded baseline in {0}".format(args.baselines))
+	elif regressions:
+		sys.exit("regressions: {0}".format(", ".join(regressions)))
+
+if __name__ == "__main__":
+	main()
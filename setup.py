@@ -36,15 +36,16 @@ setup(
     package_data = {'' : ['version.txt']},
     package_dir = {'' : 'src'},
     scripts = [],
+    python_requires = ">=3.8",
     classifiers = [
         'Intended Audience :: Developers',
         'Operating System :: OS Independent',
         'Programming Language :: Python',
+        'Programming Language :: Python :: 3 :: Only',
         'Topic :: Software Development :: Libraries :: Python Modules'
     ],
     install_requires = [
         "requests==2.9.0",
-        "beautifulsoup4==4.4.1",
         "et_xmlfile==1.0.1",
         "jdcal==1.2",
         "more-itertools==2.2",
@@ -54,6 +55,17 @@ setup(
         "six==1.10.0",
         # 'wsgiref==0.1.2'
     ],
+    extras_require = {
+        # The current aiohttp and numpy need a newer Python than python_requires allows.
+        "async" : [
+            "aiohttp==3.10.11; python_version < '3.10'",
+            "aiohttp==3.14.5; python_version >= '3.10'",
+        ],
+        "columnar" : [
+            "numpy==1.24.4; python_version < '3.11'",
+            "numpy==2.4.6; python_version >= '3.11'",
+        ],
+    },
     tests_require = [
         "nose==1.3.7"
     ],
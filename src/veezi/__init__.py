@@ -4,22 +4,76 @@
 __init__.py
 """
 
-from . import api
-from . import backoffice
-from . import libveezi
-from . import transport
+import importlib as _importlib
 
-import pkg_resources as _pkg_resources
 
+_SUBMODULES = frozenset([
+	"aio",
+	"api",
+	"backoffice",
+	"buffers",
+	"cache",
+	"columnar",
+	"constants",
+	"cookiestore",
+	"dates",
+	"filmindex",
+	"jsonstream",
+	"libveezi",
+	"loggers",
+	"metrics",
+	"records",
+	"reportcache",
+	"reportpool",
+	"reports",
+	"seats",
+	"sync",
+	"transport",
+	"xlsx",
+])
 
-__version__ =_pkg_resources.get_distribution(__name__).version
+__all__ = ["client", "__version__"]
 
-def client(username, password, api_access_token):
-	http = transport.HttpSession()
+
+def _version():
+	import importlib.metadata
+
+	try:
+		return importlib.metadata.version(__name__)
+	except importlib.metadata.PackageNotFoundError:
+		return "unknown"
+
+def __getattr__(name):
+	# Submodules and the version are resolved on first use, so that importing
+	# the package does not pull in requests, openpyxl and friends.
+	if name in _SUBMODULES:
+		return _importlib.import_module("." + name, __name__)
+	if name == "__version__":
+		version = globals()["__version__"] = _version()
+		return version
+	raise AttributeError("module {0!r} has no attribute {1!r}".format(__name__, name))
+
+def __dir__():
+	return sorted(set(globals()).union(_SUBMODULES, ["__version__"]))
+
+def client(username, password, api_access_token, api_cache = None, site_api_access_tokens = None,
+		cookie_path = None, collectors = None):
+	from . import api
+	from . import backoffice
+	from . import libveezi
+	from . import transport
+
+	http = transport.HttpSession(collectors = collectors)
 	backoffice_session = backoffice.BackofficeSession.login(
 		username,
 		password,
 		http = http,
+		lazy = True,
+		cookie_path = cookie_path,
+	)
+	api_session = api.VeeziApi(api_access_token, http = http, cache = api_cache)
+	site_apis = dict(
+		(site_id, api.VeeziApi(access_token, http = http, cache = api_cache))
+		for site_id, access_token in (site_api_access_tokens or dict()).items()
 	)
-	api_session = api.VeeziApi(api_access_token, http = http)
-	return libveezi.VeeziClient(backoffice_session, api_session)
+	return libveezi.VeeziClient(backoffice_session, api_session, site_apis = site_apis)
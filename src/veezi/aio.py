@@ -0,0 +1,432 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+aio.py
+"""
+
+import asyncio
+import copy
+import functools
+import json
+import time
+import urllib.parse
+
+import aiohttp
+
+from .constants import DEFAULT_SITE_ID
+from . import api
+from . import backoffice
+from . import buffers
+from . import filmindex
+from . import libveezi
+from . import loggers
+from . import metrics
+from . import reports
+from . import transport
+
+
+log = loggers.getLogger(__name__)
+
+def _query_items(params):
+	if params is None:
+		return None
+
+	items = []
+	for key, value in params.items():
+		if isinstance(value, (list, tuple)):
+			items.extend((key, str(v)) for v in value)
+		else:
+			items.append((key, str(value)))
+	return items
+
+
+class AsyncResponse(object):
+	def __init__(self, status_code, url, headers, content, encoding = None):
+		self.status_code = status_code
+		self.url = url
+		self.headers = headers
+		self.content = content
+		self.encoding = encoding
+
+	@property
+	def text(self):
+		return self.content.decode(self.encoding or "utf-8", "replace")
+
+	@property
+	def is_redirect(self):
+		return "Location" in self.headers and self.status_code in (301, 302, 303, 307, 308)
+
+
+class AsyncHttpSession(object):
+	"""
+	Pooled aiohttp session with the same defaults as transport.HttpSession.
+	The underlying client session is created on first use, so it binds to
+	whichever event loop is running at the time.
+	"""
+
+	_VERIFY = transport.HttpSession._VERIFY
+
+	def __init__(self, limit = 100, limit_per_host = 0, collectors = None, **session_kwargs):
+		self.limit = limit
+		self.limit_per_host = limit_per_host
+		self.collectors = list(collectors or [])
+		self.session_kwargs = session_kwargs
+		self._session = None
+
+	async def __aenter__(self):
+		return self
+
+	async def __aexit__(self, *exc_info):
+		await self.close()
+
+	def _client(self):
+		if self._session is None:
+			connector = aiohttp.TCPConnector(
+				limit = self.limit,
+				limit_per_host = self.limit_per_host,
+				ssl = None if self._VERIFY else False
+			)
+			self._session = aiohttp.ClientSession(connector = connector, **self.session_kwargs)
+		return self._session
+
+	async def _request(self, method, url, params = None, data = None, headers = None):
+		async with self._client().request(method, url, params = _query_items(params), data = data, headers = headers) as r:
+			content = await r.read()
+			return AsyncResponse(r.status, str(r.url), r.headers, content, r.charset)
+
+	async def request(self, method, url, params = None, data = None, headers = None):
+		if not self.collectors:
+			return await self._request(method, url, params, data, headers)
+
+		method = method.upper()
+		endpoint = metrics.endpoint(url)
+		for collector in self.collectors:
+			collector.request_started(method, endpoint)
+
+		status = None
+		bytes_received = 0
+		started = time.perf_counter()
+		try:
+			r = await self._request(method, url, params, data, headers)
+			status = r.status_code
+			bytes_received = len(r.content)
+			return r
+		finally:
+			seconds = time.perf_counter() - started
+			for collector in self.collectors:
+				collector.request_finished(method, endpoint, status, seconds,
+					metrics.body_size(urllib.parse.urlencode(data) if isinstance(data, dict) else data), bytes_received)
+
+	def get(self, url, **kwargs):
+		return self.request("GET", url, **kwargs)
+
+	def post(self, url, **kwargs):
+		return self.request("POST", url, **kwargs)
+
+	async def close(self):
+		if self._session is not None:
+			await self._session.close()
+			self._session = None
+
+
+class AsyncVeeziApi(api.VeeziApi):
+
+	def __init__(self, access_token, http = None, **kwargs):
+		super(AsyncVeeziApi, self).__init__(access_token, http = http or AsyncHttpSession(), **kwargs)
+
+	async def _fetch_json(self, path, key, entry, ttl, raise_for_status = False):
+		r = await self._get(self._url(path), headers = self._conditional_headers(entry))
+		return self._cache_response(key, entry, ttl, r, raise_for_status)
+
+	async def _get_json(self, endpoint, path):
+		key, entry, ttl = self._cached(endpoint, path)
+		if entry is not None and entry.is_fresh():
+			return copy.deepcopy(entry.value)
+		return await self._fetch_json(path, key, entry, ttl)
+
+	async def session(self, session_id = None):
+		return await self._get_json("session", self._session_path(session_id))
+
+	async def film(self, id):
+		return await self._get_json("film", self._film_path(id))
+
+	async def films(self, ids, max_in_flight = 8):
+		result = api.BulkResult()
+		semaphore = asyncio.Semaphore(max_in_flight)
+
+		async def fetch(id, path, key, entry, ttl):
+			async with semaphore:
+				try:
+					result[id] = await self._fetch_json(path, key, entry, ttl, True)
+				except Exception as e:
+					result.errors[id] = e
+
+		await asyncio.gather(*[fetch(*p) for p in self._films_pending(ids, result)])
+		return result
+
+	async def site(self):
+		return await self._get_json("site", "/site")
+
+	async def screen(self):
+		return await self._get_json("screen", "/screen")
+
+
+def _sync_only(name):
+	def method(self, *args, **kwargs):
+		raise NotImplementedError("{0} is only available on the sync BackofficeSession.".format(name))
+	method.__name__ = name
+	return method
+
+
+class AsyncBackofficeSession(backoffice.BackofficeSession):
+
+	@classmethod
+	async def login(cls, username, password, http = None, lazy = False, **kwargs):
+		"""
+		As BackofficeSession.login, but without `cookie_path`: an aiohttp
+		cookie jar can't be shared through a cookie file.
+		"""
+		result = cls(http or AsyncHttpSession(), **kwargs)
+		result.set_credentials(username, password)
+		if not lazy:
+			await result._ensure_login()
+		return result
+
+	def _login_lock(self):
+		# Created on first use, so that it binds to the running loop.
+		lock = getattr(self, "_async_auth_lock", None)
+		if lock is None:
+			lock = self._async_auth_lock = asyncio.Lock()
+		return lock
+
+	async def _login(self, username, password):
+		url, data = self._login_request(username, password)
+		await self.http.post(url, data = data)
+
+	async def _authenticate(self):
+		await self._login(*self._credentials)
+		self._auth_version = (self._auth_version or 0) + 1
+
+	async def _ensure_login(self):
+		if self._credentials is None or self._authenticated:
+			return
+
+		async with self._login_lock():
+			if not self._authenticated:
+				await self._authenticate()
+				self._authenticated = True
+
+	async def _reauthenticate(self, stale_version):
+		async with self._login_lock():
+			if self._auth_version == stale_version:
+				await self._authenticate()
+
+	async def _request(self, method, url, **kwargs):
+		await self._ensure_login()
+		auth_version = self._auth_version
+		r = await self.http.request(method, url, **kwargs)
+
+		if self._credentials is not None and self._is_login_redirect(r):
+			self._login_expired(method, url)
+			await self._reauthenticate(auth_version)
+			r = await self.http.request(method, url, **kwargs)
+		return r
+
+	async def _get(self, url, **kwargs):
+		return await self._request("GET", url, **kwargs)
+
+	async def _post(self, url, **kwargs):
+		return await self._request("POST", url, **kwargs)
+
+	async def sitedetail(self, site_id = DEFAULT_SITE_ID):
+		r = await self._get(self._url("/programming/getsitedetail/{0}".format(site_id)))
+		return json.loads(r.text)
+
+	async def sessions(self, start_date, days = None, site_id = DEFAULT_SITE_ID):
+		url, data = self._sessions_request(start_date, days, site_id)
+		r = await self._post(url, data = data)
+		return json.loads(r.text)["sessions"]
+
+	async def iter_sessions(self, start_date, end_date = None, window_days = None, site_id = DEFAULT_SITE_ID):
+		for window_start, days in self._session_windows(start_date, end_date, window_days):
+			for session in await self.sessions(window_start, days, site_id):
+				yield session
+
+	async def showtimes(self, *args, **kwargs):
+		return self._showtimes_by_film_id(await self.sessions(*args, **kwargs))
+
+	async def iter_films(self, max_pages = None):
+		url = self._url("/films/index")
+		pages = 0
+		while url and (max_pages is None or pages < max_pages):
+			r = await self._get(url)
+			parser = filmindex.FilmTableParser()
+			parser.feed(r.text)
+			parser.close()
+			for film in parser.films():
+				yield film
+			pages += 1
+			url = urllib.parse.urljoin(r.url, parser.next_url) if parser.next_url else None
+
+	async def films(self, max_pages = None):
+		return [film async for film in self.iter_films(max_pages)]
+
+	async def _report_content(self, report, user_params, export_format = backoffice.ExportFormat.excel):
+		stats = dict()
+		started = time.time()
+		url, params = self._report_launch_request(report, user_params)
+		r = await self._post(url, params = params)
+		export_url, export_params = self._report_export_request(r.text, export_format)
+		stats["launch_seconds"] = time.time() - started
+
+		started = time.time()
+		e = await self._get(export_url, params = export_params)
+		stats["download_seconds"] = time.time() - started
+		self._record_report_stages(stats)
+		return e.content
+
+	def _parse_dbfattr(self, collect, content, export_format, xlsx_backend, tracer = None):
+		with metrics.timed(getattr(self.http, "collectors", ()), "report.parse"):
+			return collect(self._export_engagements(buffers.MemoryFile(content), export_format, xlsx_backend, tracer))
+
+	async def _dbfattr(self, collect, *args, **kwargs):
+		xlsx_backend = kwargs.pop("xlsx_backend", reports.XlsxBackend.native)
+		export_format = kwargs.pop("export_format", backoffice.ExportFormat.excel)
+		tracer = kwargs.pop("tracer", None)
+		content = await self._report_content(
+			backoffice.Reports.distributors_by_film_and_ticket_type,
+			self._dbfattr_params(*args, **kwargs),
+			export_format
+		)
+		loop = asyncio.get_running_loop()
+		return await loop.run_in_executor(None, self._parse_dbfattr, collect, content, export_format,
+			xlsx_backend, tracer)
+
+	async def iter_distributors_by_film_and_ticket_type_report(self, *args, **kwargs):
+		"""
+		Yields the report's engagements like the sync method, but only once
+		the whole export has been downloaded and parsed.
+		"""
+		for engagement in await self._dbfattr(list, *args, **kwargs):
+			yield engagement
+
+	async def distributors_by_film_and_ticket_type_report(self, *args, **kwargs):
+		return await self._dbfattr(functools.partial(reports.merge_engagements, dict()), *args, **kwargs)
+
+	# Blocking helpers of the sync session that would otherwise be inherited.
+	_iter_session_window = _sync_only("_iter_session_window")
+	_report_export = _sync_only("_report_export")
+
+
+class AsyncVeeziClient(libveezi.VeeziClient):
+
+	async def _box_office_report(self, start_date, end_date, window_days = None, workers = None,
+			site_id = DEFAULT_SITE_ID, bounded = None, **report_params):
+		bounded = self._is_bounded(start_date, end_date, bounded)
+		start_date, end_date = self._report_range(start_date, end_date)
+		windows = self._box_office_windows(start_date, end_date, window_days) if bounded else []
+
+		if len(windows) <= 1 and not any(cached for window_start, window_end, cached in windows):
+			return await self.backoffice_session.distributors_by_film_and_ticket_type_report(
+				start_date,
+				end_date,
+				site_id = site_id,
+				**report_params
+			)
+
+		semaphore = asyncio.Semaphore(workers or self.report_workers)
+		cache_params = self._report_cache_params(site_id, **report_params)
+		loop = asyncio.get_running_loop()
+
+		async def window_report(window):
+			window_start, window_end, cached = window
+			if cached:
+				# Partitions are read and written off the loop; they can be large.
+				engagements = await loop.run_in_executor(None, self.report_cache.get, cache_params,
+					window_start, window_end)
+				if engagements is not None:
+					return engagements
+
+			async with semaphore:
+				engagements = await self.backoffice_session.distributors_by_film_and_ticket_type_report(
+					window_start,
+					window_end,
+					site_id = site_id,
+					**report_params
+				)
+
+			if cached:
+				await loop.run_in_executor(None, self.report_cache.put, cache_params, window_start, window_end,
+					engagements)
+			return engagements
+
+		return self._merge_window_reports(await asyncio.gather(*[
+			window_report(window) for window in windows
+		]))
+
+	async def query(self, start_date = None, end_date = None, report_window_days = None, report_workers = None,
+			compact = None, site_ids = None, site_workers = None):
+		bounded = self._is_bounded(start_date, end_date)
+		start_date, end_date = self._query_range(start_date, end_date)
+		query_site = functools.partial(self._query_site,
+			start_date = start_date,
+			end_date = end_date,
+			bounded = bounded,
+			report_window_days = report_window_days,
+			report_workers = report_workers,
+			compact = compact
+		)
+
+		semaphore = asyncio.Semaphore(site_workers or self.site_workers)
+
+		async def limited_query_site(site_id):
+			async with semaphore:
+				return await query_site(site_id)
+
+		with metrics.timed(self.collectors, "query"):
+			if site_ids is None:
+				return await query_site(DEFAULT_SITE_ID)
+
+			for site_id in site_ids:
+				self._site_api(site_id)
+			return self._merge_site_results(await asyncio.gather(*[
+				limited_query_site(site_id) for site_id in site_ids
+			]))
+
+	async def _sessions(self, start_date, end_date, site_id):
+		return [
+			session async for session in self.backoffice_session.iter_sessions(start_date, end_date,
+				window_days = self.session_window_days, site_id = site_id)
+		]
+
+	async def _query_site(self, site_id, start_date, end_date, report_window_days = None, report_workers = None,
+			compact = None, bounded = True):
+		site_api = self._site_api(site_id)
+		with metrics.timed(self.collectors, "fetch"):
+			site_response, screen_response, bor, sessions = await asyncio.gather(
+				site_api.site(),
+				site_api.screen(),
+				self._box_office_report(
+					start_date = start_date,
+					end_date = end_date,
+					window_days = report_window_days,
+					workers = report_workers,
+					site_id = site_id,
+					bounded = bounded
+				),
+				self._sessions(start_date, end_date, site_id)
+			)
+
+		with metrics.timed(self.collectors, "join"):
+			return self._join(site_response, screen_response, bor, sessions, compact, site_id)
+
+
+async def client(username, password, api_access_token, **kwargs):
+	http = AsyncHttpSession(collectors = kwargs.get("collectors"))
+	backoffice_session = await AsyncBackofficeSession.login(
+		username,
+		password,
+		http = http,
+	)
+	api_session = AsyncVeeziApi(api_access_token, http = http)
+	return AsyncVeeziClient(backoffice_session, api_session, **kwargs)
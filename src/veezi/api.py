@@ -4,18 +4,47 @@
 api.py
 """
 
+import concurrent.futures
+import copy
 import json
 
+import requests
+
+from . import cache as responsecache
 from . import transport
 
 
+class BulkResult(dict):
+	"""
+	Results of a bulk lookup keyed by id.  Ids whose lookup failed are left
+	out and their exceptions are kept in `errors` instead.
+	"""
+
+	def __init__(self, *args, **kwargs):
+		super(BulkResult, self).__init__(*args, **kwargs)
+		self.errors = dict()
+
+
 class VeeziApi(object):
+	"""
+	Responses for the endpoints in TTLS are cached in `cache`, by default
+	the process-wide cache.shared(), so every client in the process reuses
+	them.  Pass `cache = False` to always fetch.
+	"""
 
 	ROOT = "http://api.us.veezi.com/v1{0}"
+	TTLS = dict(
+		site = 60 * 60,
+		screen = 60 * 60,
+		film = 24 * 60 * 60,
+	)
 
-	def __init__(self, access_token, http = None):
+	def __init__(self, access_token, http = None, root = None, cache = None, ttls = None):
 		self.access_token = access_token
-		self.http = http or transport.HttpSession()
+		self.http = http or transport.shared_session()
+		self.root = root or self.ROOT
+		self.cache = responsecache.shared() if cache is None else (cache or None)
+		self.ttls = dict(self.TTLS, **(ttls or dict()))
 
 	def _get(self, *args, **kwargs):
 		headers = kwargs.setdefault("headers", dict())
@@ -24,27 +53,98 @@ class VeeziApi(object):
 		return self.http.get(*args, **kwargs)
 
 	def _url(self, path):
-		return self.ROOT.format(path)
+		return self.root.format(path)
 
-	def session(self, session_id = None):
-		if session_id:
-			r = self._get(self._url("/session/{0}".format(id)))
+	def _cached(self, endpoint, path):
+		ttl = self.ttls.get(endpoint)
+		if self.cache is None or not ttl:
+			return None, None, ttl
+		key = (self.root, self.access_token, path)
+		return key, self.cache.lookup(key), ttl
+
+	def _conditional_headers(self, entry):
+		return entry.conditional_headers() if entry is not None else dict()
+
+	def _raise_for_status(self, r):
+		if r.status_code != 304 and not 200 <= r.status_code < 300:
+			raise requests.HTTPError("{0} error for url: {1}".format(r.status_code, r.url), response = r)
+
+	def _cache_response(self, key, entry, ttl, r, raise_for_status = False):
+		if raise_for_status:
+			self._raise_for_status(r)
+		if key is None:
+			return json.loads(r.text)
+
+		if entry is not None and r.status_code == 304:
+			self.cache.revalidated(key, ttl)
+			value = entry.value
 		else:
-			r = self._get(self._url("/session"))
-		j = json.loads(r.text)
-		return j
+			value = json.loads(r.text)
+			# Error payloads are passed through but never cached.
+			if 200 <= r.status_code < 300:
+				self.cache.store(key, value, ttl, r.headers.get("ETag"), r.headers.get("Last-Modified"))
+		return copy.deepcopy(value)
+
+	def _fetch_json(self, path, key, entry, ttl, raise_for_status = False):
+		r = self._get(self._url(path), headers = self._conditional_headers(entry))
+		return self._cache_response(key, entry, ttl, r, raise_for_status)
+
+	def _get_json(self, endpoint, path):
+		key, entry, ttl = self._cached(endpoint, path)
+		if entry is not None and entry.is_fresh():
+			return copy.deepcopy(entry.value)
+		return self._fetch_json(path, key, entry, ttl)
+
+	def _session_path(self, session_id):
+		if session_id:
+			return "/session/{0}".format(session_id)
+		return "/session"
+
+	def session(self, session_id = None):
+		return self._get_json("session", self._session_path(session_id))
+
+	def _film_path(self, id):
+		return "/film/{0}".format(id)
 
 	def film(self, id):
-		r = self._get(self._url("/film/{0}".format(id)))
-		j = json.loads(r.text)
-		return j
+		return self._get_json("film", self._film_path(id))
+
+	def _films_pending(self, ids, result):
+		pending = []
+		seen = set()
+		for id in ids:
+			if id in seen:
+				continue
+			seen.add(id)
+			path = self._film_path(id)
+			key, entry, ttl = self._cached("film", path)
+			if entry is not None and entry.is_fresh():
+				result[id] = copy.deepcopy(entry.value)
+			else:
+				pending.append((id, path, key, entry, ttl))
+		return pending
+
+	def films(self, ids, max_in_flight = 8):
+		result = BulkResult()
+		pending = self._films_pending(ids, result)
+		if not pending:
+			return result
+
+		with concurrent.futures.ThreadPoolExecutor(min(max_in_flight, len(pending))) as executor:
+			futures = [
+				(id, executor.submit(self._fetch_json, path, key, entry, ttl, True))
+				for id, path, key, entry, ttl in pending
+			]
+			for id, future in futures:
+				try:
+					result[id] = future.result()
+				except Exception as e:
+					result.errors[id] = e
+
+		return result
 
 	def site(self):
-		r = self._get(self._url("/site"))
-		j = json.loads(r.text)
-		return j
+		return self._get_json("site", "/site")
 
 	def screen(self):
-		r = self._get(self._url("/screen"))
-		j = json.loads(r.text)
-		return j
+		return self._get_json("screen", "/screen")
@@ -4,30 +4,33 @@
 backoffice.py
 """
 
-import bs4
+import codecs
+import collections
 import contextlib
 import datetime
-import dateutil.parser
 import enum
 import json
 import logging
-import more_itertools
-import openpyxl
 import re
-import tempfile
+import threading
+import time
 import urllib
 
 from .constants import DEFAULT_SITE_ID
+from . import buffers
+from . import cookiestore
+from . import dates
+from . import filmindex
+from . import jsonstream
+from . import metrics
+from . import reportpool
+from . import reports
 from . import transport
 from . import loggers
 
 
 log = loggers.getLogger(__name__)
 
-def _log_row_type(row_type, row):
-	log.debug("{0}: {1}".format(row_type, " | ".join(str(c.value) for c in row)))
-
-
 class Reports(enum.Enum):
 	distributors_by_film_and_ticket_type = 5
 
@@ -52,57 +55,191 @@ class MultiFeatureRevenue(enum.Enum):
 	full_revenue_per_film = "F"
 
 
+class ExportFormat(enum.Enum):
+	excel = "EXCELOPENXML"
+
+
+class _CsvExportFormat(enum.Enum):
+	"""
+	Private until checked against a captured backoffice export: the CSV
+	renderer may flatten data regions rather than keep the sheet's cell grid
+	that reports._csv_rows() assumes.
+	"""
+	csv = "CSV"
+
+
 class BackofficeSession(object):
 
 	ROOT = "https://my.us.veezi.com{0}"
 	LOGIN_ROOT = "https://my.veezi.com{0}"
 	MAX_BOR_DAYS = 365242
+	SESSION_CHUNK_SIZE = 1 << 16
+	FILMS_CHUNK_SIZE = 1 << 16
+	LOGIN_PATH = "/authentication/signin"
 	_REPORT_PATTERN = re.compile(r'"ExportUrlBase"\:(?P<value>"[^"]+")')
 
-	@classmethod
-	def _url(cls, path, root = None):
-		r = root or cls.ROOT
+	def _url(self, path, root = None):
+		r = root or self.root
 		return r.format(path)
 
 	@classmethod
-	def login(cls, username, password, http = None):
+	def login(cls, username, password, http = None, lazy = False, cookie_path = None, **kwargs):
+		"""
+		With `lazy`, nothing is sent until the first request.  With
+		`cookie_path`, the authenticated cookies are saved to and reused from
+		that file, so processes sharing a credential only log in when the
+		saved session has expired.
+		"""
 		http = http or transport.HttpSession()
-		result = cls(http)
-		result._login(username, password)
+		result = cls(http, **kwargs)
+		result.set_credentials(username, password, cookie_path)
+		if not lazy:
+			result._ensure_login()
 		return result
 
-	def __init__(self, http):
+	def __init__(self, http, root = None, login_root = None, spill_bytes = buffers.SPILL_BYTES,
+			parse_workers = 1, min_segment_rows = reportpool.MIN_SEGMENT_ROWS):
 		self.http = http
+		self.root = root or self.ROOT
+		self.login_root = login_root or self.LOGIN_ROOT
+		self.spill_bytes = spill_bytes
+		self.parse_workers = parse_workers
+		self.min_segment_rows = min_segment_rows
+		self.download_buffers = buffers.BufferPool()
+		self.report_stats = collections.deque(maxlen = 100)
+		self._credentials = None
+		self._cookie_store = None
+		self._auth_lock = threading.Lock()
+		self._auth_version = None
+		self._authenticated = False
+
+	def set_credentials(self, username, password, cookie_path = None):
+		self._credentials = (username, password)
+		self._cookie_store = cookiestore.CookieStore(cookie_path) if cookie_path else None
+		self._authenticated = False
+
+	def _login_request(self, username, password):
+		return self._url(self.LOGIN_PATH, root = self.login_root), dict(
+			Username = username,
+			Password = password,
+			ReturnUrl = "/"
+		)
 
 	def _login(self, username, password):
-		self.http.post(self._url("/authentication/signin", root = self.LOGIN_ROOT),
-			data = dict(
-				Username = username,
-				Password = password,
-				ReturnUrl = "/"
-			)
-		)
+		url, data = self._login_request(username, password)
+		self.http.post(url, data = data)
+
+	def _authenticate(self):
+		self._login(*self._credentials)
+		if self._cookie_store is not None:
+			self._auth_version = self._cookie_store.save(self.http.cookies)
+		else:
+			self._auth_version = (self._auth_version or 0) + 1
+
+	def _ensure_login(self):
+		if self._credentials is None or self._authenticated:
+			return
+
+		with self._auth_lock:
+			if self._authenticated:
+				return
+			if self._cookie_store is None:
+				self._authenticate()
+			else:
+				with self._cookie_store.lock():
+					self._auth_version = self._cookie_store.load(self.http.cookies)
+					if self._auth_version is None:
+						self._authenticate()
+			self._authenticated = True
+
+	def _reauthenticate(self, stale_version):
+		with self._auth_lock:
+			if self._auth_version != stale_version:
+				return
+			if self._cookie_store is None:
+				self._authenticate()
+				return
+
+			with self._cookie_store.lock():
+				version = self._cookie_store.version()
+				if version is not None and version != stale_version:
+					self._auth_version = self._cookie_store.load(self.http.cookies)
+				if self._auth_version == stale_version:
+					self._authenticate()
+
+	def _is_login_redirect(self, r):
+		if urllib.parse.urlparse(r.url).path.lower().startswith(self.LOGIN_PATH):
+			return True
+		return r.is_redirect and self.LOGIN_PATH in r.headers.get("Location", "").lower()
+
+	def _request(self, method, url, **kwargs):
+		self._ensure_login()
+		auth_version = self._auth_version
+		r = self.http.request(method, url, **kwargs)
+
+		if self._credentials is not None and self._is_login_redirect(r):
+			r.close()
+			self._login_expired(method, url)
+			self._reauthenticate(auth_version)
+			r = self.http.request(method, url, **kwargs)
+		return r
+
+	def _login_expired(self, method, url):
+		log.info("Backoffice session expired, logging in again")
+		for collector in getattr(self.http, "collectors", ()):
+			collector.request_retried(method.upper(), metrics.endpoint(url), "login expired")
+
+	def _get(self, url, **kwargs):
+		return self._request("GET", url, **kwargs)
+
+	def _post(self, url, **kwargs):
+		return self._request("POST", url, **kwargs)
 
 	def sitedetail(self, site_id = DEFAULT_SITE_ID):
-		r = self.http.get(self._url("/programming/getsitedetail/{0}".format(site_id)))
+		r = self._get(self._url("/programming/getsitedetail/{0}".format(site_id)))
 		j = json.loads(r.text)
 		return j
 
-	def sessions(self, start_date, days = None, site_id = DEFAULT_SITE_ID):
+	def _sessions_request(self, start_date, days, site_id):
 		days = days if days is not None else self.MAX_BOR_DAYS
-		r = self.http.post(
-			self._url("/programming/getsessionview/{0}".format(site_id)),
-			data = dict(
-				startDate = start_date.isoformat(),
-				days = days,
-				siteId = site_id
-			)
+		return self._url("/programming/getsessionview/{0}".format(site_id)), dict(
+			startDate = start_date.isoformat(),
+			days = days,
+			siteId = site_id
 		)
-		j = json.loads(r.text)
-		return j["sessions"]
 
-	def showtimes(self, *args, **kwargs):
-		sessions = self.sessions(*args, **kwargs)
+	def _iter_session_window(self, start_date, days = None, site_id = DEFAULT_SITE_ID):
+		url, data = self._sessions_request(start_date, days, site_id)
+		# getsessionview only reads, so it is safe to retry despite being a POST.
+		r = self._post(url, data = data, stream = True, idempotent = True)
+		try:
+			for session in jsonstream.iter_array_items(r.iter_content(chunk_size = self.SESSION_CHUNK_SIZE), "sessions"):
+				yield session
+		finally:
+			r.close()
+
+	def _session_windows(self, start_date, end_date, window_days):
+		if end_date is None:
+			return [(start_date, None)]
+
+		days = (end_date - start_date).days
+		if days <= 0 or not window_days:
+			# A same-day range is still one window of `days = 0`, as the backoffice accepts it.
+			return [(start_date, days)]
+		return [
+			(start_date + datetime.timedelta(days = offset), min(window_days, days - offset))
+			for offset in range(0, days, window_days)
+		]
+
+	def iter_sessions(self, start_date, end_date = None, window_days = None, site_id = DEFAULT_SITE_ID):
+		for window_start, days in self._session_windows(start_date, end_date, window_days):
+			for session in self._iter_session_window(window_start, days, site_id):
+				yield session
+
+	def sessions(self, start_date, days = None, site_id = DEFAULT_SITE_ID):
+		return list(self._iter_session_window(start_date, days, site_id))
+
+	def _showtimes_by_film_id(self, sessions):
 		showtimes_by_film_id = dict()
 
 		for showtime in sessions:
@@ -112,239 +249,145 @@ class BackofficeSession(object):
 			except KeyError:
 				film_showtimes = showtimes_by_film_id[film_id] = []
 			film_showtimes.append(showtime)
-			showtime["start"] = dateutil.parser.parse(showtime["start"])
+			showtime["start"] = dates.parse_datetime(showtime["start"])
 
 		for film_id in showtimes_by_film_id.keys():
-			showtimes_by_film_id[film_id].sort(cmp = lambda x,y: cmp(x["start"], y["start"]))
+			showtimes_by_film_id[film_id].sort(key = lambda showtime: showtime["start"])
 
 		return showtimes_by_film_id
 
+	def showtimes(self, *args, **kwargs):
+		return self._showtimes_by_film_id(self._iter_session_window(*args, **kwargs))
+
+	def iter_films(self, max_pages = None):
+		url = self._url("/films/index")
+		pages = 0
+		while url and (max_pages is None or pages < max_pages):
+			r = self._get(url, stream = True)
+			parser = filmindex.FilmTableParser()
+			charset = "charset=" in r.headers.get("Content-Type", "").lower()
+			decoder = codecs.getincrementaldecoder(r.encoding if charset else "utf-8")("replace")
+			try:
+				for chunk in r.iter_content(chunk_size = self.FILMS_CHUNK_SIZE):
+					parser.feed(decoder.decode(chunk))
+					for film in parser.films():
+						yield film
+				parser.feed(decoder.decode(b"", final = True))
+				parser.close()
+				for film in parser.films():
+					yield film
+			finally:
+				r.close()
+
+			pages += 1
+			url = urllib.parse.urljoin(r.url, parser.next_url) if parser.next_url else None
+
 	def films(self):
-		r = self.http.get(self._url("/films/index"))
-		s = bs4.BeautifulSoup(r.text)
-		trs = s.find("tbody").find_all("tr")
-		films = []
-
-		for tr in trs:
-			link = tr.find("a")
-			edit_url = link["href"]
-			tds = tr.find_all("td")
-
-			films.append(dict(
-				title = link.text,
-				edit_url = edit_url,
-				session = edit_url.split("/")[-1],
-				distributor_name = tds[1].text,
-				release_date = datetime.datetime.strptime(tr.find("td", class_="date").text, "%m/%d/%Y"),
-				genre = tds[3].text,
-				is_active = tds[4].text.strip() == "Active"
-			))
-
-		return films
-
-	def distributors_by_film_and_ticket_type_report(self, start_date, end_date,
-			distributor_id = "", film_id = "", exclude_complimentaries = False,
+		return list(self.iter_films())
+
+	def _dbfattr_params(self, start_date, end_date, *args, **kwargs):
+		return dict(
+			self._dbfattr_filter_params(*args, **kwargs),
+			P193_From = start_date.strftime("%Y-%m-%d"),
+			P193_To = end_date.strftime("%Y-%m-%d"),
+		)
+
+	@staticmethod
+	def _dbfattr_filter_params(distributor_id = "", film_id = "", exclude_complimentaries = False,
 			new_page_for_each = NewPageForEach.nothing, detail_level = DetailLevel.showtime_by_ticket_type,
 			multi_feature_revenue = MultiFeatureRevenue.full_revenue_per_film, site_id = DEFAULT_SITE_ID):
-
-		dbfattr = self._report_workbook(
-			Reports.distributors_by_film_and_ticket_type,
-			dict(
-				P193_From = start_date.strftime("%Y-%m-%d"),
-				P193_To = end_date.strftime("%Y-%m-%d"),
-				P194 = site_id,
-				P199 = distributor_id,
-				P198 = film_id,
-				P195 = "Y" if exclude_complimentaries else "N",
-				P196 = new_page_for_each.value,
-				P197 = detail_level.value,
-				P1251 = multi_feature_revenue.value
-			)
+		return dict(
+			P194 = site_id,
+			P199 = distributor_id,
+			P198 = film_id,
+			P195 = "Y" if exclude_complimentaries else "N",
+			P196 = new_page_for_each.value,
+			P197 = detail_level.value,
+			P1251 = multi_feature_revenue.value
 		)
 
-		param_keys = [
-			'REPORT DATE RANGE',
-			'DISTRIBUTOR',
-			'FILM',
-			'MULTI/DOUBLE FEATURE',
-		]
+	def iter_distributors_by_film_and_ticket_type_report(self, start_date, end_date,
+			distributor_id = "", film_id = "", exclude_complimentaries = False,
+			new_page_for_each = NewPageForEach.nothing, detail_level = DetailLevel.showtime_by_ticket_type,
+			multi_feature_revenue = MultiFeatureRevenue.full_revenue_per_film, site_id = DEFAULT_SITE_ID,
+			xlsx_backend = reports.XlsxBackend.native, export_format = ExportFormat.excel, tracer = None):
 
-		report_keys = [
-			'SALES',
-			'REFUNDS',
-			'ADMITS',
-			'GROSS PRICE',
-			'NET PRICE',
-			'NET TOTAL',
-			'TAX TOTAL',
-			'GROSS TOTAL'
-		]
+		dbfattr = self._report_export(
+			Reports.distributors_by_film_and_ticket_type,
+			self._dbfattr_params(start_date, end_date, distributor_id, film_id, exclude_complimentaries,
+				new_page_for_each, detail_level, multi_feature_revenue, site_id),
+			export_format
+		)
 
-		engagements = dict()
-
-		with dbfattr as wb:
-			ws = wb["Sheet1"]
-
-			report_name = ws.rows[0][1].value
-			site_name = ws.rows[0][12].value
-			param_key_offsets = self._get_offsets(ws.rows[3], param_keys)
-			param_key_values = self._get_cell_values(ws.rows[4], param_key_offsets)
-
-			report_key_offsets = self._get_offsets(ws.rows[9], report_keys)
-			rows_it = more_itertools.peekable(ws.rows)
-			more_itertools.consume(rows_it, 11)
-
-			while rows_it.peek(None) is not None:
-				distrib_row = next(rows_it)
-				_log_row_type("DISTRIBUTOR", distrib_row)
-
-				distrib_name, film_name = distrib_row[0].value.split("  -  ", 1)
-				end_film_value = "{0} total".format(film_name)
-				end_distrib_value = "{0} total".format(distrib_name)
-
-				while rows_it.peek()[0].value != end_film_value:
-					site_screen_row = next(rows_it)
-					_log_row_type("SITE & SCREEN", site_screen_row)
-
-					site_screen_value = site_screen_row[0].value
-					site_name, screen_name = site_screen_value.split("  -  ", 1)
-					end_site_value = "{0} total".format(site_screen_value)
-
-					showtimes = []
-
-					while rows_it.peek()[0].value != end_site_value:
-						showdate_row = next(rows_it)
-						_log_row_type("SHOWDATE", showdate_row)
-
-						showdate_value = showdate_row[0].value
-						end_showdate_value = "{0} total".format(showdate_value)
-						showdate_dt = dateutil.parser.parse(showdate_value)
-
-						while rows_it.peek()[0].value != end_showdate_value:
-							showtime_row = next(rows_it)
-							_log_row_type("SHOWTIME", showtime_row)
-
-							showtime_value = showtime_row[0].value
-							full_showtime_value = "{0} {1}".format(showdate_value, showtime_value)
-							end_showtime_value = "{0} total".format(showtime_value)
-							full_showtime_dt = dateutil.parser.parse(full_showtime_value)
-
-							tickets = dict()
-
-							while rows_it.peek()[0].value != end_showtime_value:
-								tt_row = next(rows_it)
-								_log_row_type("TICKET TYPE", tt_row)
-
-								tt_name = tt_row[0].value
-								if tt_name is not None:
-									tickets[tt_name] = dict(
-										name = tt_name,
-										sales = self._get_cell_value(tt_row, report_key_offsets, 'SALES'),
-										refunds = self._get_cell_value(tt_row, report_key_offsets, 'REFUNDS'),
-										admits = self._get_cell_value(tt_row, report_key_offsets, 'ADMITS'),
-										gross_price = self._get_cell_value(tt_row, report_key_offsets, 'GROSS PRICE'),
-										net_price = self._get_cell_value(tt_row, report_key_offsets, 'NET PRICE'),
-										net_total = self._get_cell_value(tt_row, report_key_offsets, 'NET TOTAL'),
-										tax_total = self._get_cell_value(tt_row, report_key_offsets, 'TAX TOTAL'),
-										gross_total = self._get_cell_value(tt_row, report_key_offsets, 'GROSS TOTAL')
-									)
-							end_showtime_row = next(rows_it)
-							_log_row_type("END SHOWTIME", end_showtime_row)
-
-							showtimes.append(dict(
-								screen_name = screen_name,
-								showtime = full_showtime_dt,
-								tickets = tickets
-							))
-
-						end_showdate_row = next(rows_it)
-						_log_row_type("END SHOWDATE", end_showdate_row)
-
-					engagement_key = (site_name, film_name)
-
-					try:
-						engagement = engagements[engagement_key]
-					except KeyError:
-						engagement = engagements[engagement_key] = dict(
-							site_name = site_name,
-							film_name = film_name,
-							distributor_name = distrib_name,
-							showtimes = showtimes,
-						)
-
-					end_site_row = next(rows_it)
-					_log_row_type("END SITE", end_site_row)
-
-				end_film_row = next(rows_it)
-				_log_row_type("END FILM", end_film_row)
-
-				if rows_it.peek()[0].value == end_distrib_value:
-					end_distrib_row = next(rows_it)
-					_log_row_type("END DISTRIBUTOR", end_distrib_row)
-
-					# consume any blank rows
-					while True:
-						post_distrib_row = rows_it.peek(False)
-						if post_distrib_row != False:
-							if not filter(None, [c.value for c in post_distrib_row]):
-								blank_row = next(rows_it)
-								_log_row_type("BLANK", blank_row)
-								continue
-						break
-
-		return engagements
-
-	def _get_offsets(self, row, expect_keys):
-		cells_i = more_itertools.peekable(enumerate(row))
-		expect_keys_i = more_itertools.peekable(expect_keys)
-		offsets = dict()
-		end = object()
-
-		while cells_i.peek(end) != end:
-			i, cell = next(cells_i)
-			if expect_keys_i.peek(end) == cell.value:
-				expect_key = next(expect_keys_i)
-				offsets[expect_key] = i
-
-		return offsets
-
-	def _get_cell_values(self, row, offsets):
-		values = dict()
-		for offset_key, offset_value in offsets.items():
-			values[offset_key] = row[offset_value].value
-		return values
-
-	def _get_cell_value(self, row, offsets, name):
-		return row[offsets[name]].value
+		with dbfattr as (export, stats):
+			parse_seconds = 0.0
+			started = time.time()
+			for engagement in self._export_engagements(export, export_format, xlsx_backend, tracer):
+				parse_seconds += time.time() - started
+				yield engagement
+				started = time.time()
+			stats["parse_seconds"] = parse_seconds + time.time() - started
+			log.debug("report {0}: {1}".format(Reports.distributors_by_film_and_ticket_type.name, stats))
+			self._record_report_stages(stats)
+
+	def distributors_by_film_and_ticket_type_report(self, *args, **kwargs):
+		return reports.merge_engagements(
+			dict(),
+			self.iter_distributors_by_film_and_ticket_type_report(*args, **kwargs)
+		)
 
-	@contextlib.contextmanager
-	def _report_workbook(self, report, user_params):
+	def _record_report_stages(self, stats):
+		collectors = getattr(self.http, "collectors", ())
+		for stage in ("launch", "response", "download", "parse"):
+			seconds = stats.get(stage + "_seconds")
+			if seconds is not None:
+				metrics.record_stage(collectors, "report." + stage, seconds)
+
+	def _export_engagements(self, export, export_format, xlsx_backend = reports.XlsxBackend.native, tracer = None):
+		# Row tracing and the openpyxl backend only exist in the serial parser.
+		if self.parse_workers > 1 and tracer is None:
+			if export_format == _CsvExportFormat.csv:
+				return reportpool._csv_engagements(export, self.parse_workers, self.min_segment_rows)
+			if xlsx_backend == reports.XlsxBackend.native:
+				return reportpool.xlsx_engagements(export, self.parse_workers, self.min_segment_rows)
+		return reports.iter_engagements(self._export_rows(export, export_format, xlsx_backend), tracer)
+
+	def _export_rows(self, export, export_format, xlsx_backend = reports.XlsxBackend.native):
+		if export_format == _CsvExportFormat.csv:
+			return reports._csv_rows(export)
+		return reports.xlsx_rows(export, xlsx_backend)
+
+	def _report_launch_request(self, report, user_params):
 		params = dict(reportId = report.value)
 		params.update(user_params)
+		return self._url("/webforms/reportlauncher.aspx"), params
 
-		r = self.http.post(
-			self._url("/webforms/reportlauncher.aspx"),
-			params = params
-		)
-
+	def _report_export_request(self, launcher_text, export_format = ExportFormat.excel):
 		export_url_base = json.loads(
-			self._REPORT_PATTERN.search(r.text).group("value")
+			self._REPORT_PATTERN.search(launcher_text).group("value")
 		)
 		export_url_base_p = urllib.parse.urlparse(export_url_base)
 		export_url_base_params = urllib.parse.parse_qs(export_url_base_p.query, True)
-		export_url_base_params["Format"] = "EXCELOPENXML"
-
-		with tempfile.NamedTemporaryFile(prefix = export_url_base_params["FileName"][0], mode = 'r+b') as erf:
-			e = self.http.get(
-				self._url(export_url_base_p.path),
-				params = export_url_base_params,
-				stream = True
-			)
-
-			for chunk in e.iter_content(chunk_size = 4096):
-				if chunk:
-					erf.write(chunk)
-					erf.flush()
-
-			workbook = openpyxl.load_workbook(erf)
-			yield workbook
+		export_url_base_params["Format"] = export_format.value
+		return self._url(export_url_base_p.path), export_url_base_params
+
+	@contextlib.contextmanager
+	def _report_export(self, report, user_params, export_format = ExportFormat.excel):
+		stats = dict(report = report.name, format = export_format.name)
+		started = time.time()
+		url, params = self._report_launch_request(report, user_params)
+		r = self._post(url, params = params)
+		export_url, export_params = self._report_export_request(r.text, export_format)
+		stats["launch_seconds"] = time.time() - started
+
+		started = time.time()
+		e = self._get(
+			export_url,
+			params = export_params,
+			stream = True
+		)
+		stats["response_seconds"] = time.time() - started
+
+		with buffers.download(e, self.download_buffers, self.spill_bytes, stats = stats) as erf:
+			self.report_stats.append(stats)
+			yield erf, stats
@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+buffers.py
+"""
+
+import contextlib
+import io
+import mmap
+import tempfile
+import threading
+import time
+
+
+DOWNLOAD_CHUNK_SIZE = 1 << 20
+SPILL_BYTES = 64 << 20
+
+
+class MemoryFile(io.RawIOBase):
+	"""
+	Read-only, seekable file over a buffer (bytes, bytearray or mmap).  The
+	buffer is wrapped, not copied; read() returns a copy of the range it
+	reads, while getbuffer() and readinto() avoid the intermediate bytes.
+	"""
+
+	def __init__(self, buffer, size = None):
+		self._view = memoryview(buffer)
+		if size is not None:
+			self._view = self._view[:size]
+		self._position = 0
+
+	def readable(self):
+		return True
+
+	def seekable(self):
+		return True
+
+	def getbuffer(self):
+		return self._view
+
+	def __len__(self):
+		return len(self._view)
+
+	def tell(self):
+		return self._position
+
+	def seek(self, offset, whence = io.SEEK_SET):
+		if whence == io.SEEK_SET:
+			position = offset
+		elif whence == io.SEEK_CUR:
+			position = self._position + offset
+		elif whence == io.SEEK_END:
+			position = len(self._view) + offset
+		else:
+			raise ValueError("invalid whence ({0})".format(whence))
+		if position < 0:
+			raise ValueError("negative seek position {0}".format(position))
+		self._position = position
+		return position
+
+	def read(self, size = -1):
+		start = self._position
+		end = len(self._view) if size is None or size < 0 else min(start + size, len(self._view))
+		self._position = max(start, end)
+		return self._view[start:end].tobytes()
+
+	def readall(self):
+		return self.read()
+
+	def readinto(self, b):
+		data = self._view[self._position:self._position + len(b)]
+		b[:len(data)] = data
+		self._position += len(data)
+		return len(data)
+
+	def close(self):
+		if not self.closed:
+			self._view.release()
+		super(MemoryFile, self).close()
+
+
+class BufferPool(object):
+	"""
+	Thread-safe pool of bytearrays that keep their size between downloads, so
+	steady-state report downloads do not reallocate.
+	"""
+
+	def __init__(self, max_buffers = 4):
+		self.max_buffers = max_buffers
+		self._buffers = []
+		self._lock = threading.Lock()
+
+	def acquire(self):
+		with self._lock:
+			if self._buffers:
+				return self._buffers.pop()
+		return bytearray()
+
+	def release(self, buffer):
+		with self._lock:
+			if len(self._buffers) < self.max_buffers:
+				self._buffers.append(buffer)
+
+
+def _content_length(response):
+	try:
+		return int(response.headers.get("Content-Length"))
+	except (TypeError, ValueError):
+		return None
+
+@contextlib.contextmanager
+def download(response, pool = None, spill_bytes = SPILL_BYTES, chunk_size = DOWNLOAD_CHUNK_SIZE, stats = None):
+	"""
+	Reads a streamed response body into a pooled buffer, or into a memory
+	mapped temporary file once it exceeds `spill_bytes`, and yields it as a
+	MemoryFile.  Content-Encoding is decoded.  `stats`, if given, is updated
+	with bytes, download_seconds, bytes_per_second and spilled.
+	"""
+	started = time.time()
+	pool = pool or BufferPool(max_buffers = 0)
+	buffer = pool.acquire()
+	spill = None
+	size = 0
+
+	try:
+		content_length = _content_length(response)
+		if content_length is not None and content_length > spill_bytes:
+			spill = tempfile.TemporaryFile()
+		elif content_length is not None and content_length > len(buffer):
+			# Replace rather than extend the pooled buffer, which would
+			# allocate a zeroed temporary as large as the missing part.
+			buffer = bytearray(content_length)
+
+		for chunk in response.iter_content(chunk_size = chunk_size):
+			if spill is None and size + len(chunk) > spill_bytes:
+				spill = tempfile.TemporaryFile()
+				spill.write(memoryview(buffer)[:size])
+			if spill is not None:
+				spill.write(chunk)
+			else:
+				buffer[size:size + len(chunk)] = chunk
+			size += len(chunk)
+
+		if spill is not None:
+			spill.flush()
+			mapped = mmap.mmap(spill.fileno(), 0, access = mmap.ACCESS_READ) if size else b""
+		else:
+			mapped = buffer
+
+		if stats is not None:
+			seconds = time.time() - started
+			stats.update(
+				bytes = size,
+				download_seconds = seconds,
+				bytes_per_second = size / seconds if seconds else 0.0,
+				spilled = spill is not None,
+			)
+
+		fileobj = MemoryFile(mapped, size)
+		try:
+			yield fileobj
+		finally:
+			fileobj.close()
+			if isinstance(mapped, mmap.mmap):
+				mapped.close()
+	finally:
+		response.close()
+		if spill is not None:
+			spill.close()
+		pool.release(buffer)
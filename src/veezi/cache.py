@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+cache.py
+"""
+
+import collections
+import threading
+import time
+
+
+class CacheEntry(object):
+	__slots__ = ("value", "expires", "etag", "last_modified")
+
+	def __init__(self, value, expires, etag = None, last_modified = None):
+		self.value = value
+		self.expires = expires
+		self.etag = etag
+		self.last_modified = last_modified
+
+	def is_fresh(self, now = None):
+		return (now or time.time()) < self.expires
+
+	def conditional_headers(self):
+		headers = dict()
+		if self.etag:
+			headers["If-None-Match"] = self.etag
+		if self.last_modified:
+			headers["If-Modified-Since"] = self.last_modified
+		return headers
+
+
+class ResponseCache(object):
+	"""
+	Thread-safe LRU cache of decoded API responses with a TTL per entry.
+	Expired entries are kept until evicted so that they can be revalidated
+	with their ETag or Last-Modified value instead of refetched.
+	"""
+
+	def __init__(self, max_entries = 1024):
+		self.max_entries = max_entries
+		self._entries = collections.OrderedDict()
+		self._lock = threading.Lock()
+		self.reset_stats()
+
+	def reset_stats(self):
+		self.hits = 0
+		self.misses = 0
+		self.revalidations = 0
+		self.evictions = 0
+
+	def lookup(self, key):
+		with self._lock:
+			entry = self._entries.get(key)
+			if entry is not None:
+				self._entries.move_to_end(key)
+				if entry.is_fresh():
+					self.hits += 1
+					return entry
+			self.misses += 1
+			return entry
+
+	def store(self, key, value, ttl, etag = None, last_modified = None):
+		with self._lock:
+			self._entries[key] = CacheEntry(value, time.time() + ttl, etag, last_modified)
+			self._entries.move_to_end(key)
+			while len(self._entries) > self.max_entries:
+				self._entries.popitem(last = False)
+				self.evictions += 1
+
+	def revalidated(self, key, ttl):
+		with self._lock:
+			entry = self._entries.get(key)
+			if entry is not None:
+				entry.expires = time.time() + ttl
+				self.revalidations += 1
+			return entry
+
+	def invalidate(self, key = None):
+		with self._lock:
+			if key is None:
+				self._entries.clear()
+			else:
+				self._entries.pop(key, None)
+
+	def stats(self):
+		with self._lock:
+			lookups = self.hits + self.misses
+			return dict(
+				hits = self.hits,
+				misses = self.misses,
+				revalidations = self.revalidations,
+				evictions = self.evictions,
+				hit_rate = float(self.hits) / lookups if lookups else 0.0,
+				entries = len(self._entries),
+				max_entries = self.max_entries,
+			)
+
+
+_shared_cache = None
+_shared_cache_lock = threading.Lock()
+
+def shared():
+	"""
+	The process-wide ResponseCache that API clients use by default.
+	"""
+	global _shared_cache
+	with _shared_cache_lock:
+		if _shared_cache is None:
+			_shared_cache = ResponseCache()
+		return _shared_cache
@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+columnar.py
+"""
+
+import numpy
+
+
+CATEGORY_COLUMNS = (
+	"site_name",
+	"distributor_name",
+	"film_name",
+	"screen_name",
+	"ticket_type",
+)
+
+COUNT_COLUMNS = (
+	"sales",
+	"refunds",
+	"admits",
+)
+
+AMOUNT_COLUMNS = (
+	"gross_price",
+	"net_price",
+	"net_total",
+	"tax_total",
+	"gross_total",
+)
+
+SUM_COLUMNS = COUNT_COLUMNS + ("net_total", "tax_total", "gross_total")
+
+TIME_BUCKETS = dict(
+	showtime = "datetime64[s]",
+	hour = "datetime64[h]",
+	day = "datetime64[D]",
+	month = "datetime64[M]",
+	year = "datetime64[Y]",
+)
+
+
+class _Builder(object):
+	def __init__(self):
+		self.labels = dict((column, dict()) for column in CATEGORY_COLUMNS)
+		self.codes = dict((column, []) for column in CATEGORY_COLUMNS)
+		self.values = dict((column, []) for column in COUNT_COLUMNS + AMOUNT_COLUMNS)
+		self.showtimes = []
+
+	def _code(self, column, label):
+		labels = self.labels[column]
+		return labels.setdefault(label, len(labels))
+
+	def add(self, showtime, tickets, **categories):
+		show_codes = [
+			(self.codes[column], self._code(column, categories.get(column)))
+			for column in CATEGORY_COLUMNS if column != "ticket_type"
+		]
+		ticket_codes = self.codes["ticket_type"]
+		for ticket in tickets:
+			for codes, code in show_codes:
+				codes.append(code)
+			ticket_codes.append(self._code("ticket_type", ticket["name"]))
+			for column, values in self.values.items():
+				values.append(ticket.get(column) or 0)
+			self.showtimes.append(showtime)
+
+	def build(self):
+		return TicketSalesTable(
+			showtime = numpy.array(self.showtimes, dtype = "datetime64[s]"),
+			codes = dict(
+				(column, numpy.array(codes, dtype = numpy.int32))
+				for column, codes in self.codes.items()
+			),
+			labels = dict(
+				(column, _labels(labels))
+				for column, labels in self.labels.items()
+			),
+			values = dict(
+				(column, numpy.array(values, dtype = numpy.int64 if column in COUNT_COLUMNS else numpy.float64))
+				for column, values in self.values.items()
+			),
+		)
+
+def _labels(labels):
+	result = numpy.empty(len(labels), dtype = object)
+	for label, code in labels.items():
+		result[code] = label
+	return result
+
+
+class TicketSalesTable(object):
+	"""
+	Box office data with one row per showtime and ticket type.  Names are
+	stored as integer codes into per-column label arrays and numbers as
+	typed arrays, so rollups run as a handful of vectorized passes.
+	"""
+
+	def __init__(self, showtime, codes, labels, values):
+		self.showtime = showtime
+		self.codes = codes
+		self.labels = labels
+		self.values = values
+
+	@classmethod
+	def from_report(cls, report):
+		builder = _Builder()
+		for engagement in report.values():
+			for show in engagement["showtimes"]:
+				builder.add(show["showtime"], show["tickets"].values(),
+					site_name = engagement["site_name"],
+					distributor_name = engagement["distributor_name"],
+					film_name = engagement["film_name"],
+					screen_name = show["screen_name"],
+				)
+		return builder.build()
+
+	@classmethod
+	def from_query(cls, result):
+		builder = _Builder()
+		for (site_id, screen_id, showtime), show in result["shows"].items():
+			film = result["films"].get(show.get("film_id"), dict())
+			site_name = result["sites"].get(site_id, dict()).get("name")
+			screen_name = result["screens"].get(screen_id, dict()).get("name")
+			builder.add(showtime, show["boxoffice"].values(),
+				site_name = site_name,
+				distributor_name = film.get("distributor_name"),
+				film_name = film.get("name"),
+				screen_name = screen_name,
+			)
+		return builder.build()
+
+	def __len__(self):
+		return len(self.showtime)
+
+	def __getitem__(self, column):
+		if column in self.codes:
+			return self.labels[column][self.codes[column]]
+		if column in self.values:
+			return self.values[column]
+		if column in TIME_BUCKETS:
+			return self.showtime.astype(TIME_BUCKETS[column])
+		raise KeyError(column)
+
+	def columns(self):
+		return ("showtime",) + CATEGORY_COLUMNS + COUNT_COLUMNS + AMOUNT_COLUMNS
+
+	def _group_codes(self, column):
+		if column in self.codes:
+			return self.codes[column], self.labels[column]
+		if column in TIME_BUCKETS:
+			labels, codes = numpy.unique(self[column], return_inverse = True)
+			return codes, labels
+		raise KeyError(column)
+
+	def rollup(self, by, values = SUM_COLUMNS):
+		"""
+		Sums `values` over every distinct combination of the `by` columns,
+		which may be category columns or one of the TIME_BUCKETS.  Returns a
+		dict of equal-length arrays ordered by the group keys.
+		"""
+		if isinstance(by, str):
+			by = (by,)
+
+		groups = [self._group_codes(column) for column in by]
+		key = numpy.zeros(len(self), dtype = numpy.int64)
+		for codes, labels in groups:
+			key = key * len(labels) + codes
+
+		keys, inverse = numpy.unique(key, return_inverse = True)
+		result = dict()
+		remainder = keys
+		for column, (codes, labels) in reversed(list(zip(by, groups))):
+			remainder, group_codes = numpy.divmod(remainder, len(labels))
+			result[column] = labels[group_codes]
+
+		for column in values:
+			totals = numpy.bincount(inverse, weights = self.values[column], minlength = len(keys))
+			result[column] = totals.round().astype(numpy.int64) if column in COUNT_COLUMNS else totals
+
+		return dict((column, result[column]) for column in tuple(by) + tuple(values))
@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+cookiestore.py
+"""
+
+import contextlib
+import http.cookiejar
+import os
+import tempfile
+import threading
+
+try:
+	import fcntl
+except ImportError:
+	fcntl = None
+
+from . import loggers
+
+
+log = loggers.getLogger(__name__)
+
+
+class CookieStore(object):
+	"""
+	A cookie jar persisted to `path` so that an authenticated backoffice
+	session can be shared by every process using the same credential.
+	`lock()` serialises logins across threads and, where fcntl is available,
+	across processes.  Versions identify a saved jar, so a worker that hit
+	an expired session can tell whether another worker has already logged
+	in again since it last loaded the jar.
+	"""
+
+	def __init__(self, path):
+		self.path = path
+		self.lock_path = path + ".lock"
+		self._lock = threading.RLock()
+
+	@contextlib.contextmanager
+	def lock(self):
+		with self._lock:
+			if fcntl is None:
+				yield
+				return
+			with open(self.lock_path, "a") as lock_file:
+				fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+				try:
+					yield
+				finally:
+					fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+	def version(self):
+		try:
+			st = os.stat(self.path)
+		except OSError:
+			return None
+		return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+	def load(self, cookies):
+		"""
+		Copies the saved cookies into `cookies` and returns the loaded version,
+		or None if there is no usable saved jar.
+		"""
+		version = self.version()
+		if version is None:
+			return None
+
+		jar = http.cookiejar.LWPCookieJar(self.path)
+		try:
+			jar.load(ignore_discard = True, ignore_expires = False)
+		except (OSError, http.cookiejar.LoadError) as e:
+			log.warning("Ignoring unreadable cookie jar {0}: {1}".format(self.path, e))
+			return None
+
+		for cookie in jar:
+			cookies.set_cookie(cookie)
+		return version
+
+	def save(self, cookies):
+		directory = os.path.dirname(os.path.abspath(self.path))
+		if not os.path.isdir(directory):
+			os.makedirs(directory)
+
+		fd, temp_path = tempfile.mkstemp(dir = directory, suffix = ".tmp")
+		os.close(fd)
+		try:
+			jar = http.cookiejar.LWPCookieJar(temp_path)
+			for cookie in cookies:
+				jar.set_cookie(cookie)
+			jar.save(ignore_discard = True, ignore_expires = False)
+			os.chmod(temp_path, 0o600)
+			os.replace(temp_path, self.path)
+		finally:
+			if os.path.exists(temp_path):
+				os.remove(temp_path)
+		return self.version()
@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+dates.py
+"""
+
+import datetime
+import threading
+
+
+class DateTimeParser(object):
+	"""
+	Parses the handful of date and time layouts Veezi emits.  Each value is
+	tried against known strptime formats, most recently successful first,
+	and only handed to dateutil when none of them match.  Parsed values are
+	memoized, since report show dates and show times repeat on every row.
+	A parser is safe to share between threads.
+	"""
+
+	DATE_FORMATS = [
+		"%A, %B %d, %Y",
+		"%A, %d %B %Y",
+		"%A %d %B %Y",
+		"%d %B %Y",
+		"%B %d, %Y",
+		"%m/%d/%Y",
+		"%Y-%m-%d",
+	]
+
+	TIME_FORMATS = [
+		"%I:%M %p",
+		"%I:%M:%S %p",
+		"%H:%M",
+		"%H:%M:%S",
+	]
+
+	DATETIME_FORMATS = [
+		"%Y-%m-%dT%H:%M:%S",
+		"%Y-%m-%dT%H:%M:%S.%f",
+		"%Y-%m-%d %H:%M:%S",
+	]
+
+	MAX_CACHE_SIZE = 1 << 16
+
+	def __init__(self):
+		self._formats = dict(
+			date = list(self.DATE_FORMATS),
+			time = list(self.TIME_FORMATS),
+			datetime = list(self.DATETIME_FORMATS),
+		)
+		self._caches = dict(date = dict(), time = dict(), datetime = dict())
+		self._lock = threading.Lock()
+		self.reset_stats()
+
+	def reset_stats(self):
+		self.hits = 0
+		self.misses = 0
+		self.fallbacks = 0
+
+	def stats(self):
+		lookups = self.hits + self.misses
+		return dict(
+			hits = self.hits,
+			misses = self.misses,
+			fallbacks = self.fallbacks,
+			hit_rate = float(self.hits) / lookups if lookups else 0.0,
+			cached = dict((kind, len(cache)) for kind, cache in self._caches.items()),
+		)
+
+	def clear(self):
+		for cache in self._caches.values():
+			cache.clear()
+
+	def date(self, value):
+		return self._lookup("date", value)
+
+	def time(self, value):
+		return self._lookup("time", value)
+
+	def datetime(self, value):
+		return self._lookup("datetime", value)
+
+	def showtime(self, showdate_value, showtime_value):
+		return datetime.datetime.combine(self.date(showdate_value), self.time(showtime_value))
+
+	def _lookup(self, kind, value):
+		cache = self._caches[kind]
+		try:
+			result = cache[value]
+		except KeyError:
+			with self._lock:
+				self.misses += 1
+		else:
+			with self._lock:
+				self.hits += 1
+			return result
+
+		result = self._parse(kind, value)
+		if len(cache) >= self.MAX_CACHE_SIZE:
+			cache.clear()
+		cache[value] = result
+		return result
+
+	def _parse(self, kind, value):
+		formats = self._formats[kind]
+		for fmt in tuple(formats):
+			try:
+				dt = datetime.datetime.strptime(value, fmt)
+			except ValueError:
+				continue
+			with self._lock:
+				if formats[0] != fmt:
+					formats.remove(fmt)
+					formats.insert(0, fmt)
+			break
+		else:
+			with self._lock:
+				self.fallbacks += 1
+			import dateutil.parser
+
+			dt = dateutil.parser.parse(value, default = datetime.datetime(1900, 1, 1))
+
+		if kind == "date":
+			return dt.date()
+		elif kind == "time":
+			return dt.timetz()
+		return dt
+
+
+default_parser = DateTimeParser()
+
+parse_date = default_parser.date
+parse_time = default_parser.time
+parse_datetime = default_parser.datetime
+parse_showtime = default_parser.showtime
+stats = default_parser.stats
@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+filmindex.py
+"""
+
+import collections
+import datetime
+import html.parser
+
+
+RELEASE_DATE_FORMAT = "%m/%d/%Y"
+
+
+class FilmTableParser(html.parser.HTMLParser):
+	"""
+	Streaming parser for the backoffice film index.  Only the rows of the
+	table body are collected; everything else is skipped as it is read.
+	Completed films are queued as they close, so they can be taken with
+	`films()` after each `feed()`.  `next_url` is the href of a rel="next"
+	pagination link, if the page has one.
+	"""
+
+	def __init__(self):
+		html.parser.HTMLParser.__init__(self, convert_charrefs = True)
+		self.next_url = None
+		self._films = collections.deque()
+		self._in_tbody = False
+		self._row = None
+		self._cell = None
+		self._link = None
+
+	def handle_starttag(self, tag, attrs):
+		if tag == "a":
+			attrs = dict(attrs)
+			if attrs.get("rel") == "next" and attrs.get("href"):
+				self.next_url = attrs["href"]
+			if self._row is not None and self._row["link"] is None:
+				self._link = []
+				self._row["link"] = (attrs.get("href"), self._link)
+		elif tag == "tbody":
+			self._in_tbody = True
+		elif not self._in_tbody:
+			return
+		elif tag == "tr":
+			self._row = dict(cells = [], date = None, link = None)
+		elif tag == "td" and self._row is not None:
+			self._cell = []
+			self._row["cells"].append(self._cell)
+			if "date" in (dict(attrs).get("class") or "").split() and self._row["date"] is None:
+				self._row["date"] = self._cell
+
+	def handle_endtag(self, tag):
+		if tag == "a":
+			self._link = None
+		elif tag == "td":
+			self._cell = None
+		elif tag == "tr" and self._row is not None:
+			self._films.append(self._film(self._row))
+			self._row = None
+		elif tag == "tbody":
+			self._in_tbody = False
+
+	def handle_data(self, data):
+		if self._cell is not None:
+			self._cell.append(data)
+		if self._link is not None:
+			self._link.append(data)
+
+	def _film(self, row):
+		edit_url, title = row["link"]
+		cells = ["".join(cell) for cell in row["cells"]]
+		return dict(
+			title = "".join(title),
+			edit_url = edit_url,
+			session = edit_url.split("/")[-1],
+			distributor_name = cells[1],
+			release_date = datetime.datetime.strptime("".join(row["date"]), RELEASE_DATE_FORMAT),
+			genre = cells[3],
+			is_active = cells[4].strip() == "Active"
+		)
+
+	def films(self):
+		while self._films:
+			yield self._films.popleft()
+
+
+def parse_films(text):
+	parser = FilmTableParser()
+	parser.feed(text)
+	parser.close()
+	return list(parser.films())
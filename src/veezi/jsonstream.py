@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+jsonstream.py
+"""
+
+import codecs
+import json
+import re
+
+
+_WHITESPACE = re.compile(r"[\s,]*")
+
+_decoder = json.JSONDecoder()
+
+
+def _array_start(key):
+	return re.compile(r'"{0}"\s*:\s*\['.format(re.escape(key)))
+
+def iter_array_items(chunks, key, encoding = "utf-8"):
+	"""
+	Yields the items of the JSON array stored under `key` as they arrive
+	from an iterable of byte chunks, without holding the whole document as
+	text or as objects.  Only the array is decoded; the rest of the document
+	is skipped.
+	"""
+	decoder = codecs.getincrementaldecoder(encoding)(errors = "strict")
+	array_start = _array_start(key)
+	chunks = iter(chunks)
+	text = ""
+	position = None
+	done = False
+
+	while True:
+		if not done:
+			try:
+				chunk = next(chunks)
+			except StopIteration:
+				text += decoder.decode(b"", final = True)
+				done = True
+			else:
+				text += decoder.decode(chunk)
+
+		if position is None:
+			match = array_start.search(text)
+			if match is None:
+				if done:
+					raise ValueError("No {0!r} array in the response.".format(key))
+				continue
+			position = match.end()
+
+		while True:
+			position = _WHITESPACE.match(text, position).end()
+			if position == len(text):
+				break
+			if text[position] == "]":
+				return
+			try:
+				item, end = _decoder.raw_decode(text, position)
+			except ValueError:
+				if done:
+					raise
+				break
+			if end == len(text) and not done:
+				# A number or literal at the end of the buffer may continue in the next chunk.
+				break
+			position = end
+			yield item
+
+		if done:
+			raise ValueError("Unterminated {0!r} array in the response.".format(key))
+
+		text = text[position:]
+		position = 0
@@ -5,33 +5,154 @@ libveezi.py
 """
 
 import collections
+import concurrent.futures
 import datetime
-import dateutil.parser
+import functools
 
 from .constants import DEFAULT_SITE_ID
 from . import backoffice
+from . import dates
+from . import metrics
+from . import records
+from . import reports
 
 
 class VeeziClient(object):
 	# CINEMA_EPOCH = datetime.datetime(1895, 12, 28, 6)
 	CINEMA_EPOCH = datetime.datetime(1900, 1, 1, 6)
 
-	def __init__(self, backoffice_session, api_session):
+	def __init__(self, backoffice_session, api_session, report_window_days = None, report_workers = 4,
+			parallel_fetch = False, report_cache = None, compact = False, session_window_days = None,
+			site_apis = None, site_workers = 4, collectors = None):
 		self.backoffice_session = backoffice_session
 		self.api_session = api_session
+		self.report_window_days = report_window_days
+		self.report_workers = report_workers
+		self.parallel_fetch = parallel_fetch
+		self.report_cache = report_cache
+		self.compact = compact
+		self.session_window_days = session_window_days
+		self.site_apis = site_apis or dict()
+		self.site_workers = site_workers
+		if collectors is None:
+			# Report stages to whatever is already watching the backoffice's requests.
+			collectors = getattr(getattr(backoffice_session, "http", None), "collectors", ())
+		self.collectors = list(collectors)
 
-	def _box_office_report(self, start_date, end_date):
-		start_date = start_date or self.CINEMA_EPOCH
-		return self.backoffice_session.distributors_by_film_and_ticket_type_report(
-			start_date,
-			end_date or datetime.datetime.now()
+	def _partition_offset(self, date, window_days):
+		return (date - self.CINEMA_EPOCH.date()).days % window_days
+
+	def _report_windows(self, start_date, end_date, window_days, aligned = False):
+		window_start = start_date
+		while window_start.date() <= end_date.date():
+			window_end = window_start + datetime.timedelta(days = window_days - 1)
+			if aligned:
+				window_end -= datetime.timedelta(days = self._partition_offset(window_start.date(), window_days))
+			window_end = min(window_end, end_date)
+			yield window_start, window_end
+			window_start = window_end + datetime.timedelta(days = 1)
+
+	def _is_cached_partition(self, window_start, window_end):
+		partition_days = self.report_cache.partition_days if self.report_cache is not None else None
+		return partition_days is not None \
+			and self._partition_offset(window_start.date(), partition_days) == 0 \
+			and (window_end.date() - window_start.date()).days == partition_days - 1
+
+	def _box_office_windows(self, start_date, end_date, window_days = None):
+		"""
+		Splits a report range into (start, end, cached) windows.  With a report
+		cache, the settled days go into cache partitions and only whole
+		partitions are cached; the unsettled rest, like the whole range without
+		a cache, is split into `window_days` windows, or fetched as one.
+		"""
+		window_days = window_days or self.report_window_days
+		windows = []
+		if self.report_cache is not None:
+			last_settled = self.report_cache.last_settled_date()
+			if start_date.date() <= last_settled:
+				settled_end = min(end_date, datetime.datetime.combine(last_settled, datetime.time()))
+				for window_start, window_end in self._report_windows(start_date, settled_end,
+						self.report_cache.partition_days, aligned = True):
+					windows.append((window_start, window_end, self._is_cached_partition(window_start, window_end)))
+			if end_date.date() <= last_settled:
+				return windows
+			start_date = max(start_date, datetime.datetime.combine(last_settled + datetime.timedelta(days = 1),
+				datetime.time()))
+
+		if not window_days:
+			return windows + [(start_date, end_date, False)]
+		return windows + [
+			(window_start, window_end, False)
+			for window_start, window_end in self._report_windows(start_date, end_date, window_days)
+		]
+
+	def _report_cache_params(self, site_id = DEFAULT_SITE_ID, **report_params):
+		# Every report parameter but the dates, as sent to the backoffice.
+		return dict(
+			backoffice.BackofficeSession._dbfattr_filter_params(site_id = site_id, **report_params),
+			report = backoffice.Reports.distributors_by_film_and_ticket_type.name,
+			root = getattr(self.backoffice_session, "root", None),
+		)
+
+	def _window_report(self, window, site_id = DEFAULT_SITE_ID, report_params = None):
+		window_start, window_end, cached = window
+		report_params = report_params or dict()
+		fetch = functools.partial(
+			self.backoffice_session.distributors_by_film_and_ticket_type_report,
+			window_start,
+			window_end,
+			site_id = site_id,
+			**report_params
 		)
 
-	def _sites(self):
-		site_response = self.api_session.site()
+		if not cached:
+			return fetch()
+		return self.report_cache.fetch(self._report_cache_params(site_id, **report_params), window_start,
+			window_end, fetch)
+
+	def _report_range(self, start_date, end_date):
+		return start_date or self.CINEMA_EPOCH, end_date or datetime.datetime.now()
+
+	def _merge_window_reports(self, window_reports):
+		engagements = dict()
+		for window_engagements in window_reports:
+			reports.merge_engagements(engagements, window_engagements.values())
+		return engagements
+
+	def _is_bounded(self, start_date, end_date, bounded = None):
+		# Only ranges the caller bounded are windowed; the default range spans centuries.
+		if bounded is None:
+			bounded = start_date is not None and end_date is not None
+		return bounded
+
+	def _box_office_report(self, start_date, end_date, window_days = None, workers = None,
+			site_id = DEFAULT_SITE_ID, bounded = None, **report_params):
+		"""
+		`report_params` are the report's filters (distributor_id, film_id,
+		detail_level and so on), passed on to every report request.
+		"""
+		bounded = self._is_bounded(start_date, end_date, bounded)
+		start_date, end_date = self._report_range(start_date, end_date)
+		windows = self._box_office_windows(start_date, end_date, window_days) if bounded else []
+
+		if len(windows) <= 1 and not any(cached for window_start, window_end, cached in windows):
+			return self.backoffice_session.distributors_by_film_and_ticket_type_report(
+				start_date,
+				end_date,
+				site_id = site_id,
+				**report_params
+			)
+
+		with concurrent.futures.ThreadPoolExecutor(workers or self.report_workers) as executor:
+			return self._merge_window_reports(executor.map(
+				lambda window: self._window_report(window, site_id, report_params),
+				windows
+			))
+
+	def _sites(self, site_response, site_id = DEFAULT_SITE_ID):
 		return {
-			DEFAULT_SITE_ID : dict(
-				id = DEFAULT_SITE_ID,
+			site_id : dict(
+				id = site_id,
 				name = site_response["Name"],
 				short_name = site_response["ShortName"],
 				legal_name = site_response["LegalName"],
@@ -69,11 +190,10 @@ class VeeziClient(object):
 				result[screen_id] = site
 		return result
 
-	def _screens(self, sites_by_screen_id):
-		screens = self.api_session.screen()
+	def _screens(self, screen_response, sites_by_screen_id):
 		result = dict()
 
-		for screen in screens:
+		for screen in screen_response:
 			result[screen["Id"]] = dict(
 				site_id = sites_by_screen_id[screen["Id"]]["id"],
 				id = screen["Id"],
@@ -93,20 +213,119 @@ class VeeziClient(object):
 			result[screen["name"]] = screen
 		return result
 
-	def _show(self, tickets = None):
+	def _show(self, tickets = None, compact = False):
+		if compact:
+			return records.Show(records.BoxOffice(tickets))
 		return dict(boxoffice = tickets or dict())
 
-	def query(self, start_date = None, end_date = None):
+	def _query_range(self, start_date, end_date):
 		start_date = start_date or self.CINEMA_EPOCH
 		if not end_date:
 			end_date = start_date + datetime.timedelta(days = backoffice.BackofficeSession.MAX_BOR_DAYS)
+		return start_date, end_date
+
+	def _fetch_concurrently(self, fetches):
+		"""
+		Runs `fetches` on a thread each and returns their results, raising the
+		first error as soon as it happens.  Threads can't be interrupted, so
+		fetches already running when another fails carry on in the background
+		until their request completes; only then are their threads and
+		connections released.
+		"""
+		executor = concurrent.futures.ThreadPoolExecutor(len(fetches))
+		futures = []
+		try:
+			for fetch in fetches:
+				futures.append(executor.submit(fetch))
+			done, pending = concurrent.futures.wait(futures, return_when = concurrent.futures.FIRST_EXCEPTION)
+			for future in futures:
+				if future in done and future.exception() is not None:
+					raise future.exception()
+			return [future.result() for future in futures]
+		finally:
+			# Raise the first error without waiting for the fetches still running.
+			for future in futures:
+				future.cancel()
+			executor.shutdown(wait = False)
+
+	def _site_api(self, site_id):
+		if site_id in self.site_apis:
+			return self.site_apis[site_id]
+		if site_id == DEFAULT_SITE_ID:
+			return self.api_session
+		# API access tokens are per site, so another site's API would mislabel this one's shows.
+		raise ValueError("No API session for site {0}; pass one in site_apis.".format(site_id))
+
+	def _merge_site_results(self, site_results):
+		result = dict(films = dict(), shows = dict(), sites = dict(), screens = dict())
+		for site_result in site_results:
+			for key, values in result.items():
+				values.update(site_result[key])
+		return result
+
+	def query(self, start_date = None, end_date = None, report_window_days = None, report_workers = None,
+			parallel = None, compact = None, site_ids = None, site_workers = None):
+		bounded = self._is_bounded(start_date, end_date)
+		start_date, end_date = self._query_range(start_date, end_date)
+		query_site = functools.partial(self._query_site,
+			start_date = start_date,
+			end_date = end_date,
+			bounded = bounded,
+			report_window_days = report_window_days,
+			report_workers = report_workers,
+			parallel = parallel,
+			compact = compact
+		)
+
+		with metrics.timed(self.collectors, "query"):
+			if site_ids is None:
+				return query_site(DEFAULT_SITE_ID)
+
+			for site_id in site_ids:
+				self._site_api(site_id)
+			with concurrent.futures.ThreadPoolExecutor(site_workers or self.site_workers) as executor:
+				return self._merge_site_results(executor.map(query_site, site_ids))
+
+	def _query_site(self, site_id, start_date, end_date, report_window_days = None, report_workers = None,
+			parallel = None, compact = None, bounded = True):
+		if parallel is None:
+			parallel = self.parallel_fetch
+
+		site_api = self._site_api(site_id)
+		fetches = [
+			site_api.site,
+			site_api.screen,
+			functools.partial(self._box_office_report,
+				start_date = start_date,
+				end_date = end_date,
+				window_days = report_window_days,
+				workers = report_workers,
+				site_id = site_id,
+				bounded = bounded
+			),
+			functools.partial(self.backoffice_session.iter_sessions, start_date, end_date,
+				window_days = self.session_window_days, site_id = site_id),
+		]
+
+		with metrics.timed(self.collectors, "fetch"):
+			if parallel:
+				fetches[-1] = lambda iter_sessions = fetches[-1]: list(iter_sessions())
+				site_response, screen_response, bor, sessions = self._fetch_concurrently(fetches)
+			else:
+				site_response, screen_response, bor, sessions = [fetch() for fetch in fetches]
+
+		# Serial queries stream the sessions, so their download is part of the join.
+		with metrics.timed(self.collectors, "join"):
+			return self._join(site_response, screen_response, bor, sessions, compact, site_id)
+
+	def _join(self, site_response, screen_response, bor, sessions, compact = None, site_id = DEFAULT_SITE_ID):
+		if compact is None:
+			compact = self.compact
 
-		sites = self._sites()
+		sites = self._sites(site_response, site_id)
 		sites_by_screen_id = self._sites_by_screen_id(sites)
-		screens = self._screens(sites_by_screen_id)
+		screens = self._screens(screen_response, sites_by_screen_id)
 		screens_by_name = self._screens_by_name(screens)
-		bor = self._box_office_report(start_date = start_date, end_date = end_date)
-		sessions = self.backoffice_session.sessions(start_date, days = (end_date - start_date).days)
 
 		film_names_by_show_key = dict()
 		distrib_names_by_show_key = dict()
@@ -119,21 +338,21 @@ class VeeziClient(object):
 				site_id = sites_by_screen_id[screen_id]["id"]
 				show_key = (site_id, screen_id, show["showtime"])
 
-				shows[show_key] = self._show(tickets = show["tickets"])
+				shows[show_key] = self._show(tickets = show["tickets"], compact = compact)
 				film_names_by_show_key[show_key] = film_name
 				distrib_names_by_show_key[show_key] = engagement["distributor_name"]
 
 		for session in sessions:
 			screen_id = session["screenId"]
 			site_id = sites_by_screen_id[screen_id]["id"]
-			showtime = dateutil.parser.parse(session["start"])
+			showtime = dates.parse_datetime(session["start"])
 			show_key = (site_id, screen_id, showtime)
 			film_id = session["filmId"]
 
 			try:
 				show = shows[show_key]
 			except KeyError:
-				show = shows[show_key] = self._show()
+				show = shows[show_key] = self._show(compact = compact)
 			else:
 				film_name = film_names_by_show_key[show_key]
 				distributor_name = distrib_names_by_show_key[show_key]
@@ -7,18 +7,25 @@ loggers.py
 import os
 import json
 import logging
-import logging.config
 
 
-def _configure():
-	log_cfg = os.getenv("LOG_CFG", 'logging.json')
+logging.getLogger("veezi").addHandler(logging.NullHandler())
+
+def configure(path = None, level = logging.DEBUG):
+	"""
+	Configures logging from the dictConfig JSON file at `path`, defaulting
+	to $LOG_CFG or logging.json, or with basicConfig at `level` if there is
+	no such file.  Importing veezi never does this; applications and scripts
+	call it when they want the package's previous logging setup.
+	"""
+	log_cfg = path or os.getenv("LOG_CFG", 'logging.json')
 	if os.path.exists(log_cfg):
+		import logging.config
+
 		with open(log_cfg, "rt") as f:
 			config = json.load(f)
 			logging.config.dictConfig(config)
 	else:
-		logging.basicConfig(level = logging.DEBUG)
-
-_configure()
+		logging.basicConfig(level = level)
 
-getLogger = logging.getLogger
\ No newline at end of file
+getLogger = logging.getLogger
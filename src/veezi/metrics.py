@@ -0,0 +1,313 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+metrics.py
+"""
+
+import bisect
+import collections
+import contextlib
+import logging
+import re
+import socket
+import threading
+import time
+import urllib.parse
+
+from . import loggers
+
+
+log = loggers.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_ID_SEGMENT = re.compile(r"^(?!v\d+$).*\d")
+_STATSD_SEPARATOR = re.compile(r"[./]+")
+_STATSD_INVALID = re.compile(r"[^A-Za-z0-9_]+")
+
+
+def endpoint(url):
+	"""
+	The path of `url` with identifier segments (anything but an API version
+	that contains a digit) replaced by ":id", so that requests for different sessions, films or
+	sites are counted under one endpoint.
+	"""
+	path = urllib.parse.urlsplit(url).path or "/"
+	return "/".join(":id" if _ID_SEGMENT.search(segment) else segment for segment in path.split("/"))
+
+def body_size(body):
+	if body is None:
+		return 0
+	if isinstance(body, str):
+		return len(body.encode("utf-8"))
+	try:
+		return len(body)
+	except TypeError:
+		return 0
+
+def response_size(response, stream = False):
+	"""
+	Bytes of response body on the wire: the Content-Length, which is the
+	compressed size of a compressed body, or failing that the length of the
+	content unless it is streamed and has not been read yet.
+	"""
+	try:
+		return int(response.headers.get("Content-Length"))
+	except (TypeError, ValueError):
+		return 0 if stream else len(response.content)
+
+
+class Collector(object):
+	"""
+	Receives instrumentation events from HttpSession and VeeziClient.  The
+	methods do nothing; subclasses override the events they care about.
+	They are called on the requesting thread and should not block.
+	"""
+
+	def request_started(self, method, endpoint):
+		pass
+
+	def request_finished(self, method, endpoint, status, seconds, bytes_sent, bytes_received):
+		"""
+		`status` is None when the request raised.
+		"""
+		pass
+
+	def request_retried(self, method, endpoint, reason):
+		pass
+
+	def stage_finished(self, stage, seconds):
+		pass
+
+
+def record_stage(collectors, stage, seconds):
+	for collector in collectors:
+		collector.stage_finished(stage, seconds)
+
+@contextlib.contextmanager
+def timed(collectors, stage):
+	if not collectors:
+		yield
+		return
+	started = time.perf_counter()
+	try:
+		yield
+	finally:
+		record_stage(collectors, stage, time.perf_counter() - started)
+
+
+class Histogram(object):
+	"""
+	Counts observations into fixed buckets; quantiles are reported as the
+	upper bound of the bucket they fall in.
+	"""
+
+	def __init__(self, buckets = LATENCY_BUCKETS):
+		self.buckets = tuple(buckets)
+		self.counts = [0] * (len(self.buckets) + 1)
+		self.count = 0
+		self.sum = 0.0
+		self.min = None
+		self.max = None
+
+	def observe(self, value):
+		self.counts[bisect.bisect_left(self.buckets, value)] += 1
+		self.count += 1
+		self.sum += value
+		self.min = value if self.min is None else min(self.min, value)
+		self.max = value if self.max is None else max(self.max, value)
+
+	def quantile(self, q):
+		if not self.count:
+			return None
+		rank = q * self.count
+		seen = 0
+		for i, count in enumerate(self.counts):
+			seen += count
+			if seen >= rank and count:
+				return min(self.buckets[i], self.max) if i < len(self.buckets) else self.max
+		return self.max
+
+	def to_dict(self):
+		return dict(
+			count = self.count,
+			sum = self.sum,
+			mean = self.sum / self.count if self.count else None,
+			min = self.min,
+			max = self.max,
+			p50 = self.quantile(0.5),
+			p90 = self.quantile(0.9),
+			p99 = self.quantile(0.99),
+			buckets = [
+				(bound, count)
+				for bound, count in zip(self.buckets + (float("inf"),), self.counts)
+				if count
+			],
+		)
+
+
+class _EndpointStats(object):
+	def __init__(self, buckets):
+		self.latency = Histogram(buckets)
+		self.statuses = collections.Counter()
+		self.errors = 0
+		self.retries = 0
+		self.bytes_sent = 0
+		self.bytes_received = 0
+
+	def to_dict(self):
+		return dict(
+			count = self.latency.count,
+			errors = self.errors,
+			retries = self.retries,
+			statuses = dict(self.statuses),
+			bytes_sent = self.bytes_sent,
+			bytes_received = self.bytes_received,
+			latency = self.latency.to_dict(),
+		)
+
+
+class Metrics(Collector):
+	"""
+	Thread-safe in-memory collector: per-endpoint latency histograms, status
+	codes, bytes and retries, requests in flight and stage timings.
+	`summary()` returns them as a dict of plain values.
+	"""
+
+	def __init__(self, buckets = LATENCY_BUCKETS):
+		self.buckets = buckets
+		self._lock = threading.Lock()
+		self.reset()
+
+	def reset(self):
+		with self._lock:
+			self._endpoints = dict()
+			self._stages = dict()
+			self.in_flight = 0
+			self.max_in_flight = 0
+
+	def _endpoint(self, method, endpoint):
+		key = "{0} {1}".format(method, endpoint)
+		try:
+			return self._endpoints[key]
+		except KeyError:
+			stats = self._endpoints[key] = _EndpointStats(self.buckets)
+			return stats
+
+	def request_started(self, method, endpoint):
+		with self._lock:
+			self.in_flight += 1
+			self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+	def request_finished(self, method, endpoint, status, seconds, bytes_sent, bytes_received):
+		with self._lock:
+			self.in_flight -= 1
+			stats = self._endpoint(method, endpoint)
+			stats.latency.observe(seconds)
+			if status is None:
+				stats.errors += 1
+			else:
+				stats.statuses[status] += 1
+			stats.bytes_sent += bytes_sent
+			stats.bytes_received += bytes_received
+
+	def request_retried(self, method, endpoint, reason):
+		with self._lock:
+			self._endpoint(method, endpoint).retries += 1
+
+	def stage_finished(self, stage, seconds):
+		with self._lock:
+			try:
+				histogram = self._stages[stage]
+			except KeyError:
+				histogram = self._stages[stage] = Histogram(self.buckets)
+			histogram.observe(seconds)
+
+	def summary(self):
+		with self._lock:
+			endpoints = dict((key, stats.to_dict()) for key, stats in self._endpoints.items())
+			return dict(
+				requests = dict(
+					count = sum(stats["count"] for stats in endpoints.values()),
+					errors = sum(stats["errors"] for stats in endpoints.values()),
+					retries = sum(stats["retries"] for stats in endpoints.values()),
+					bytes_sent = sum(stats["bytes_sent"] for stats in endpoints.values()),
+					bytes_received = sum(stats["bytes_received"] for stats in endpoints.values()),
+					in_flight = self.in_flight,
+					max_in_flight = self.max_in_flight,
+				),
+				endpoints = endpoints,
+				stages = dict((stage, histogram.to_dict()) for stage, histogram in self._stages.items()),
+			)
+
+
+class RequestTracer(Collector):
+	"""
+	Logs every request and stage as it finishes.
+	"""
+
+	def __init__(self, logger = None, level = logging.DEBUG):
+		self.logger = logger or log
+		self.level = level
+
+	def request_finished(self, method, endpoint, status, seconds, bytes_sent, bytes_received):
+		if self.logger.isEnabledFor(self.level):
+			self.logger.log(self.level, "{0} {1} {2} {3:.3f}s sent={4} received={5}".format(
+				method, endpoint, status or "error", seconds, bytes_sent, bytes_received))
+
+	def request_retried(self, method, endpoint, reason):
+		self.logger.log(self.level, "{0} {1} retrying: {2}".format(method, endpoint, reason))
+
+	def stage_finished(self, stage, seconds):
+		self.logger.log(self.level, "stage {0} {1:.3f}s".format(stage, seconds))
+
+
+class StatsdSink(Collector):
+	"""
+	Sends timings, counters and the in-flight gauge to a statsd daemon over
+	UDP.  Sending never raises; lost packets are lost metrics.
+	"""
+
+	def __init__(self, host = "127.0.0.1", port = 8125, prefix = "veezi"):
+		self.address = (host, port)
+		self.prefix = prefix
+		self.in_flight = 0
+		self._lock = threading.Lock()
+		self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+	def _name(self, *parts):
+		segments = _STATSD_SEPARATOR.split(".".join((self.prefix,) + parts))
+		return ".".join(filter(None, (_STATSD_INVALID.sub("_", segment).strip("_") for segment in segments)))
+
+	def _send(self, *lines):
+		try:
+			self._socket.sendto("\n".join(lines).encode("ascii"), self.address)
+		except OSError as e:
+			log.debug("statsd send failed: {0}".format(e))
+
+	def _in_flight(self, delta):
+		with self._lock:
+			self.in_flight += delta
+			return self.in_flight
+
+	def request_started(self, method, endpoint):
+		self._send("{0}:{1}|g".format(self._name("http.in_flight"), self._in_flight(1)))
+
+	def request_finished(self, method, endpoint, status, seconds, bytes_sent, bytes_received):
+		name = self._name("http", method.lower(), endpoint)
+		self._send(
+			"{0}:{1}|g".format(self._name("http.in_flight"), self._in_flight(-1)),
+			"{0}.latency:{1:.3f}|ms".format(name, seconds * 1000.0),
+			"{0}.status.{1}:1|c".format(name, status or "error"),
+			"{0}.bytes_sent:{1}|c".format(name, bytes_sent),
+			"{0}.bytes_received:{1}|c".format(name, bytes_received),
+		)
+
+	def request_retried(self, method, endpoint, reason):
+		self._send("{0}.retries:1|c".format(self._name("http", method.lower(), endpoint)))
+
+	def stage_finished(self, stage, seconds):
+		self._send("{0}:{1:.3f}|ms".format(self._name("stage", stage), seconds * 1000.0))
+
+	def close(self):
+		self._socket.close()
@@ -0,0 +1,207 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+records.py
+"""
+
+import collections.abc
+import sys
+import threading
+
+
+TICKET_FIELDS = (
+	"sales",
+	"refunds",
+	"admits",
+	"gross_price",
+	"net_price",
+	"net_total",
+	"tax_total",
+	"gross_total",
+)
+
+SHOW_FIELDS = (
+	"boxoffice",
+	"advance_revenue",
+	"cleanup_duration",
+	"code",
+	"complimentaries",
+	"distributor_share",
+	"film_id",
+	"finish",
+	"id",
+	"intermission",
+	"is_stopped",
+	"language_id",
+	"play_through_group_code",
+	"price_card_id",
+	"sales_types",
+	"seats",
+	"seats_available",
+	"seats_held",
+	"seats_house",
+	"seats_sold",
+	"status",
+	"show_number",
+	"show_type",
+	"start",
+	"validation_errors",
+	"site_id",
+	"screen_id",
+)
+
+_INTERNED_SHOW_FIELDS = frozenset([
+	"language_id",
+	"play_through_group_code",
+	"status",
+	"show_type",
+])
+
+
+class TicketTypes(object):
+	"""
+	Process-wide registry that maps ticket type names to small integer
+	codes, so each ticket line stores an int rather than its own name.
+	Codes differ between processes, so ticket lines pickle by name.
+	"""
+
+	def __init__(self):
+		self._codes = dict()
+		self._names = []
+		self._lock = threading.Lock()
+
+	def code(self, name):
+		try:
+			return self._codes[name]
+		except KeyError:
+			with self._lock:
+				if name not in self._codes:
+					self._codes[name] = len(self._names)
+					self._names.append(name)
+				return self._codes[name]
+
+	def name(self, code):
+		return self._names[code]
+
+	def __len__(self):
+		return len(self._names)
+
+
+ticket_types = TicketTypes()
+
+
+class _Record(collections.abc.Mapping):
+	__slots__ = ()
+
+	_FIELDS = ()
+
+	def __getitem__(self, key):
+		if key not in self._FIELDS:
+			raise KeyError(key)
+		try:
+			return getattr(self, key)
+		except AttributeError:
+			raise KeyError(key)
+
+	def __iter__(self):
+		for field in self._FIELDS:
+			if hasattr(self, field):
+				yield field
+
+	def __len__(self):
+		return sum(1 for field in self)
+
+	def __repr__(self):
+		return "{0}({1!r})".format(type(self).__name__, self.to_dict())
+
+	def to_dict(self):
+		return dict(
+			(key, value.to_dict() if isinstance(value, (_Record, BoxOffice)) else value)
+			for key, value in self.items()
+		)
+
+
+class TicketLine(_Record):
+	__slots__ = ("code",) + TICKET_FIELDS
+
+	_FIELDS = ("name",) + TICKET_FIELDS
+
+	def __init__(self, ticket):
+		self.code = ticket_types.code(ticket["name"])
+		for field in TICKET_FIELDS:
+			if field in ticket:
+				setattr(self, field, ticket[field])
+
+	@property
+	def name(self):
+		return ticket_types.name(self.code)
+
+	def __reduce__(self):
+		return (TicketLine, (self.to_dict(),))
+
+
+class BoxOffice(collections.abc.Mapping):
+	"""
+	Ticket lines of one show, keyed by ticket type name.
+	"""
+
+	__slots__ = ("_lines",)
+
+	def __init__(self, tickets = None):
+		self._lines = tuple(TicketLine(ticket) for ticket in (tickets or dict()).values())
+
+	def __getitem__(self, name):
+		for line in self._lines:
+			if line.name == name:
+				return line
+		raise KeyError(name)
+
+	def __iter__(self):
+		for line in self._lines:
+			yield line.name
+
+	def __len__(self):
+		return len(self._lines)
+
+	def __repr__(self):
+		return "BoxOffice({0!r})".format(self.to_dict())
+
+	def to_dict(self):
+		return dict((line.name, line.to_dict()) for line in self._lines)
+
+
+class Show(_Record):
+	"""
+	Slotted stand-in for the show dicts built by VeeziClient.query.  Fields
+	that have not been set are absent, as they would be from the dict.
+	"""
+
+	__slots__ = SHOW_FIELDS
+
+	_FIELDS = SHOW_FIELDS
+
+	def __init__(self, boxoffice = None):
+		self.boxoffice = boxoffice if boxoffice is not None else BoxOffice()
+
+	def __setitem__(self, key, value):
+		if key not in SHOW_FIELDS:
+			raise KeyError(key)
+		if key in _INTERNED_SHOW_FIELDS and isinstance(value, str):
+			value = sys.intern(value)
+		setattr(self, key, value)
+
+	def update(self, values):
+		for key, value in values.items():
+			self[key] = value
+
+
+def compact_show(show):
+	result = Show(BoxOffice(show.get("boxoffice")))
+	result.update(dict((k, v) for k, v in show.items() if k != "boxoffice"))
+	return result
+
+def compact(result):
+	return dict(
+		result,
+		shows = dict((show_key, compact_show(show)) for show_key, show in result["shows"].items())
+	)
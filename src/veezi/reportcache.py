@@ -0,0 +1,187 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+reportcache.py
+"""
+
+import datetime
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+import threading
+
+from . import loggers
+
+
+log = loggers.getLogger(__name__)
+
+
+class ReportCache(object):
+	"""
+	On-disk cache of parsed report partitions.  Each partition holds the
+	engagements for one date window of one report, keyed by the report's
+	non-date parameters.  Box office figures stop changing once a day has
+	settled, so only partitions ending at least `settle_days` ago are cached;
+	anything more recent is always fetched.  The least recently used
+	partitions are evicted once the cache grows past `max_bytes`.
+	"""
+
+	SUFFIX = ".pickle"
+	# Part of every key; bump it when the parsed engagements change shape, so
+	# that partitions pickled by an older parser are never served.
+	SCHEMA_VERSION = 1
+
+	def __init__(self, path, settle_days = 7, max_bytes = 1 << 30, partition_days = 30):
+		self.path = path
+		self.settle_days = settle_days
+		self.max_bytes = max_bytes
+		self.partition_days = partition_days
+		self.hits = 0
+		self.misses = 0
+		self.bypasses = 0
+		self.stores = 0
+		self.evictions = 0
+		self._lock = threading.Lock()
+
+		if not os.path.isdir(path):
+			os.makedirs(path)
+		self._bytes = sum(size for path, size, mtime in self._entries())
+
+	def params_key(self, params):
+		key = json.dumps(dict(params, schema_version = self.SCHEMA_VERSION), sort_keys = True, default = str)
+		return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+	def last_settled_date(self, today = None):
+		today = today or datetime.date.today()
+		return today - datetime.timedelta(days = self.settle_days)
+
+	def is_settled(self, end_date, today = None):
+		if isinstance(end_date, datetime.datetime):
+			end_date = end_date.date()
+		return end_date <= self.last_settled_date(today)
+
+	def get(self, params, start_date, end_date):
+		if not self.is_settled(end_date):
+			with self._lock:
+				self.bypasses += 1
+			return None
+
+		engagements = self._read(self._partition_path(params, start_date, end_date))
+
+		with self._lock:
+			if engagements is not None:
+				self.hits += 1
+			else:
+				self.misses += 1
+		return engagements
+
+	def put(self, params, start_date, end_date, engagements):
+		if self.is_settled(end_date):
+			self._write(self._partition_path(params, start_date, end_date), engagements)
+
+	def fetch(self, params, start_date, end_date, fetch):
+		engagements = self.get(params, start_date, end_date)
+		if engagements is None:
+			engagements = fetch()
+			self.put(params, start_date, end_date, engagements)
+		return engagements
+
+	def stats(self):
+		with self._lock:
+			lookups = self.hits + self.misses
+			return dict(
+				hits = self.hits,
+				misses = self.misses,
+				bypasses = self.bypasses,
+				stores = self.stores,
+				evictions = self.evictions,
+				hit_rate = float(self.hits) / lookups if lookups else 0.0,
+				entries = len(list(self._entries())),
+				bytes = self._bytes,
+				max_bytes = self.max_bytes,
+			)
+
+	def evict(self):
+		with self._lock:
+			self._evict()
+
+	def clear(self):
+		with self._lock:
+			for path, size, mtime in self._entries():
+				os.remove(path)
+			self._bytes = 0
+
+	def _partition_path(self, params, start_date, end_date):
+		return os.path.join(
+			self.path,
+			self.params_key(params),
+			"{0}-{1}{2}".format(start_date.strftime("%Y%m%d"), end_date.strftime("%Y%m%d"), self.SUFFIX)
+		)
+
+	def _entries(self):
+		for directory in os.listdir(self.path):
+			directory = os.path.join(self.path, directory)
+			if os.path.isdir(directory):
+				for name in os.listdir(directory):
+					if name.endswith(self.SUFFIX):
+						path = os.path.join(directory, name)
+						try:
+							st = os.stat(path)
+						except OSError:
+							continue
+						yield path, st.st_size, st.st_mtime
+
+	def _read(self, partition_path):
+		try:
+			with open(partition_path, "rb") as f:
+				engagements = pickle.load(f)
+		except (IOError, OSError):
+			return None
+		except Exception as e:
+			log.warning("Discarding unreadable report partition {0}: {1}".format(partition_path, e))
+			return None
+
+		try:
+			os.utime(partition_path, None)
+		except OSError:
+			pass
+		return engagements
+
+	def _write(self, partition_path, engagements):
+		directory = os.path.dirname(partition_path)
+		if not os.path.isdir(directory):
+			try:
+				os.makedirs(directory)
+			except OSError:
+				if not os.path.isdir(directory):
+					raise
+
+		fd, temp_path = tempfile.mkstemp(dir = directory, suffix = ".tmp")
+		with os.fdopen(fd, "wb") as f:
+			pickle.dump(engagements, f, pickle.HIGHEST_PROTOCOL)
+		size = os.path.getsize(temp_path)
+
+		with self._lock:
+			try:
+				self._bytes -= os.path.getsize(partition_path)
+			except OSError:
+				pass
+			os.replace(temp_path, partition_path)
+			self._bytes += size
+			self.stores += 1
+
+			if self._bytes > self.max_bytes:
+				self._evict()
+
+	def _evict(self):
+		for path, size, mtime in sorted(self._entries(), key = lambda entry: entry[2]):
+			if self._bytes <= self.max_bytes:
+				break
+			try:
+				os.remove(path)
+			except OSError:
+				continue
+			self._bytes -= size
+			self.evictions += 1
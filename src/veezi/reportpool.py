@@ -0,0 +1,248 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+reportpool.py
+"""
+
+import concurrent.futures
+import concurrent.futures.process
+import csv
+import html
+import io
+import os
+import re
+
+from . import loggers
+from . import reports
+from . import xlsx
+
+
+log = loggers.getLogger(__name__)
+
+MIN_SEGMENT_ROWS = 20000
+SEGMENTS_PER_WORKER = 4
+
+_NAME = rb"(?:[\w.-]+:)?"
+_ROOT = re.compile(rb"<([A-Za-z_][\w.:-]*)[^>]*>")
+_SHEET_DATA = re.compile(rb"<" + _NAME + rb"sheetData[\s>/]")
+_SHEET_DATA_END = re.compile(rb"</" + _NAME + rb"sheetData>")
+# A row's start tag and, unless the row is empty, its first cell.
+_ROW = re.compile(
+	rb"<" + _NAME + rb"row(\s[^>]*?)?(?:/>|>\s*(?:<" + _NAME + rb"c(\s[^>]*?)?(?:/>|>(.*?)</" + _NAME + rb"c>))?)",
+	re.S
+)
+_ROW_TAG = re.compile(rb"<" + _NAME + rb"row[\s>/]")
+_ROW_NUMBER = re.compile(rb'\sr="(\d+)"')
+_CELL_REF = re.compile(rb'\sr="([A-Z]+)')
+_CELL_TYPE = re.compile(rb'\st="(\w+)"')
+_VALUE = re.compile(rb"<" + _NAME + rb"v>(.*?)</" + _NAME + rb"v>", re.S)
+_TEXT = re.compile(rb"<" + _NAME + rb"t(?:\s[^>]*)?>(.*?)</" + _NAME + rb"t>", re.S)
+
+
+def _unescape(value):
+	return html.unescape(value.decode("utf-8"))
+
+def _film_starts(labels):
+	"""
+	Tracks the report's block structure from the label column alone, as the
+	parser does, and yields the index of every row that opens a film.  The
+	parser carries no state from one film into the next, so the body can
+	be cut before any of these rows.
+	"""
+	stack = []
+	end_distrib_value = None
+	for index, label in enumerate(labels):
+		if stack and label == stack[-1]:
+			stack.pop()
+		elif stack:
+			if len(stack) < 4:
+				stack.append("{0} total".format(label))
+		elif label is None:
+			continue
+		elif label == end_distrib_value:
+			end_distrib_value = None
+		else:
+			distrib_name, film_name = label.split("  -  ", 1)
+			end_distrib_value = "{0} total".format(distrib_name)
+			stack.append("{0} total".format(film_name))
+			yield index
+
+def _cuts(film_starts, body_rows, workers, min_segment_rows):
+	segment_rows = max(min_segment_rows, body_rows // (workers * SEGMENTS_PER_WORKER) + 1)
+	cuts = []
+	last_row = 0
+	for row in film_starts:
+		if row - last_row >= segment_rows and body_rows - row >= segment_rows // 2:
+			cuts.append(row)
+			last_row = row
+	return cuts
+
+
+class _XlsxBody(object):
+	def __init__(self, fileobj, sheet_name, min_rows = 0):
+		reader = xlsx.SheetReader(fileobj, sheet_name)
+		try:
+			self.header = reports.parse_header(reader)
+			self.xml = reader.sheet_xml()
+			self.shared_strings = reader.shared_strings
+		finally:
+			reader.close()
+
+		self.rows = []
+		self._labels = []
+		if len(_ROW_TAG.findall(self.xml)) < min_rows:
+			# Too small to be worth splitting; skip indexing the rows.
+			return
+
+		root = _ROOT.search(self.xml)
+		self.prefix = root.group(0)
+		self.suffix = b"</" + root.group(1) + b">"
+		self.start = _SHEET_DATA.search(self.xml).end()
+		self.end = _SHEET_DATA_END.search(self.xml, self.start).start()
+
+		next_row = 1
+		for match in _ROW.finditer(self.xml, self.start, self.end):
+			row_attrs, cell_attrs, content = match.groups()
+			number = _ROW_NUMBER.search(row_attrs) if row_attrs else None
+			row_number = int(number.group(1)) if number else next_row
+			next_row = row_number + 1
+			if row_number > reports.HEADER_ROWS:
+				self.rows.append((row_number, match.start()))
+				self._labels.append(self._label(cell_attrs or b"", content))
+
+	def _label(self, attrs, content):
+		ref = _CELL_REF.search(attrs)
+		if ref is not None and ref.group(1) != b"A":
+			return None
+		return self._value(attrs, content)
+
+	def _value(self, attrs, content):
+		if content is None:
+			return None
+		cell_type = _CELL_TYPE.search(attrs)
+		cell_type = cell_type.group(1) if cell_type else None
+		if cell_type == b"inlineStr":
+			texts = _TEXT.findall(content)
+			return "".join(_unescape(text) for text in texts) if texts else None
+
+		value = _VALUE.search(content)
+		if value is None:
+			return None
+		text = _unescape(value.group(1))
+		if cell_type is None or cell_type == b"n":
+			return xlsx._cast_number(text)
+		if cell_type == b"s":
+			return self.shared_strings[int(text)]
+		if cell_type == b"b":
+			return bool(int(text))
+		return text
+
+	def labels(self):
+		return iter(self._labels)
+
+	def segments(self, cuts):
+		rows = self.rows + [(None, self.end)]
+		for start, end in zip([0] + cuts, cuts + [len(self.rows)]):
+			first_row = rows[start][0] or reports.HEADER_ROWS + 1
+			yield ("xlsx", self.prefix + self.xml[rows[start][1]:rows[end][1]] + self.suffix, first_row)
+
+
+class _CsvBody(object):
+	def __init__(self, fileobj, encoding):
+		text = fileobj.read().decode(encoding)
+		self.lines = list(io.StringIO(text, newline = ""))
+		self.rows = []
+
+		reader = csv.reader(self.lines)
+		header_rows = []
+		line = 0
+		for row in reader:
+			if len(header_rows) < reports.HEADER_ROWS:
+				header_rows.append(reports._csv_record(row))
+			else:
+				self.rows.append(((row[0] or None) if row else None, line))
+			line = reader.line_num
+		self.header = reports.parse_header(iter(header_rows))
+		self.end = len(self.lines)
+
+	def labels(self):
+		for label, line in self.rows:
+			yield label
+
+	def segments(self, cuts):
+		rows = self.rows + [(None, self.end)]
+		for start, end in zip([0] + cuts, cuts + [len(self.rows)]):
+			yield ("csv", "".join(self.lines[rows[start][1]:rows[end][1]]), None)
+
+
+_worker_shared_strings = None
+
+def _init_worker(shared_strings):
+	global _worker_shared_strings
+	_worker_shared_strings = shared_strings
+
+def _parse_segment(segment, report_key_offsets):
+	kind, payload, first_row = segment
+	if kind == "xlsx":
+		rows = xlsx.SheetReader.fragment(payload, _worker_shared_strings, first_row)
+		report_key_offsets = reports.select_report_columns(rows, report_key_offsets)
+	else:
+		rows = reports._csv_records(io.StringIO(payload, newline = ""))
+	return list(reports.iter_body_engagements(rows, report_key_offsets))
+
+def _parse(body, cuts, workers):
+	segments = list(body.segments(cuts))
+	log.debug("Parsing {0} report rows in {1} segments".format(len(body.rows), len(segments)))
+
+	with concurrent.futures.ProcessPoolExecutor(min(workers, len(segments)),
+			initializer = _init_worker, initargs = (getattr(body, "shared_strings", None),)) as executor:
+		results = executor.map(_parse_segment, segments, [body.header["report_key_offsets"]] * len(segments))
+		return [engagement for engagements in results for engagement in engagements]
+
+def _engagements(make_body, serial, workers, min_segment_rows):
+	workers = workers or os.cpu_count() or 1
+	if workers < 2:
+		return serial()
+
+	try:
+		body = make_body(2 * min_segment_rows)
+		if len(body.rows) < 2 * min_segment_rows:
+			return serial()
+		cuts = _cuts(_film_starts(body.labels()), len(body.rows), workers, min_segment_rows)
+		if not cuts:
+			return serial()
+		return iter(_parse(body, cuts, workers))
+	except (concurrent.futures.process.BrokenProcessPool, OSError) as e:
+		# Only the pool is retried serially; errors in the report itself propagate.
+		log.warning("Parallel report parse failed, parsing serially: {0!r}".format(e))
+		return serial()
+
+def xlsx_engagements(fileobj, workers = None, min_segment_rows = MIN_SEGMENT_ROWS, sheet_name = "Sheet1"):
+	"""
+	Parses an XLSX export like reports.iter_engagements(reports.xlsx_rows(...))
+	but across a pool of `workers` processes, defaulting to one per CPU.
+	The sheet is cut at film boundaries into segments of at least
+	`min_segment_rows` rows; each segment is decoded and parsed in a worker
+	and the engagements come back in sheet order, exactly as the serial
+	parser yields them.  Reports too small to split are parsed serially, as
+	are reports whose worker processes can't be started or die; errors in
+	the report itself are raised as they are.  The decompressed sheet is
+	held in memory while parsing.
+	"""
+	def serial():
+		fileobj.seek(0)
+		return reports.iter_engagements(reports.xlsx_rows(fileobj, sheet_name = sheet_name))
+
+	return _engagements(lambda min_rows: _XlsxBody(fileobj, sheet_name, min_rows), serial, workers,
+		min_segment_rows)
+
+def _csv_engagements(fileobj, workers = None, min_segment_rows = MIN_SEGMENT_ROWS, encoding = "utf-8-sig"):
+	"""
+	The CSV counterpart of xlsx_engagements; private, like
+	reports._csv_rows().
+	"""
+	def serial():
+		fileobj.seek(0)
+		return reports.iter_engagements(reports._csv_rows(fileobj, encoding))
+
+	return _engagements(lambda min_rows: _CsvBody(fileobj, encoding), serial, workers, min_segment_rows)
@@ -0,0 +1,342 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+reports.py
+"""
+
+import csv
+import enum
+import io
+import itertools
+import logging
+import re
+
+from . import dates
+from . import loggers
+from . import xlsx
+
+
+log = loggers.getLogger(__name__)
+
+HEADER_ROWS = 11
+
+PARAM_KEYS = [
+	'REPORT DATE RANGE',
+	'DISTRIBUTOR',
+	'FILM',
+	'MULTI/DOUBLE FEATURE',
+]
+
+REPORT_KEYS = [
+	'SALES',
+	'REFUNDS',
+	'ADMITS',
+	'GROSS PRICE',
+	'NET PRICE',
+	'NET TOTAL',
+	'TAX TOTAL',
+	'GROSS TOTAL'
+]
+
+class _FormattedRow(object):
+	__slots__ = ("row",)
+
+	def __init__(self, row):
+		self.row = row
+
+	def __str__(self):
+		return " | ".join(str(v) for v in self.row)
+
+
+class RowTracer(object):
+	"""
+	Logs the rows the report parser classifies, as "<ROW TYPE>: <cells>".
+	Only every `every`th row is traced, and rows are formatted only if the
+	logger would emit them.  Parsers trace nothing unless given a tracer.
+	"""
+
+	def __init__(self, every = 1, logger = None, level = logging.DEBUG):
+		self.every = max(1, int(every))
+		self.logger = logger or log
+		self.level = level
+		self.rows = 0
+		self.traced = 0
+
+	def trace(self, row_type, row):
+		self.rows += 1
+		if (self.rows - 1) % self.every:
+			return
+		if self.logger.isEnabledFor(self.level):
+			self.traced += 1
+			self.logger.log(self.level, "%s: %s", row_type, _FormattedRow(row))
+
+def _untraced(row_type, row):
+	pass
+
+def _value(row, offset):
+	return row[offset] if offset < len(row) else None
+
+def _get_offsets(row, expect_keys):
+	import more_itertools
+
+	cells_i = more_itertools.peekable(enumerate(row))
+	expect_keys_i = more_itertools.peekable(expect_keys)
+	offsets = dict()
+	end = object()
+
+	while cells_i.peek(end) != end:
+		i, value = next(cells_i)
+		if expect_keys_i.peek(end) == value:
+			expect_key = next(expect_keys_i)
+			offsets[expect_key] = i
+
+	return offsets
+
+def _get_values(row, offsets):
+	values = dict()
+	for offset_key, offset_value in offsets.items():
+		values[offset_key] = _value(row, offset_value)
+	return values
+
+
+class XlsxBackend(enum.Enum):
+	native = "native"
+	openpyxl = "openpyxl"
+
+
+def iter_openpyxl_rows(fileobj, sheet_name = "Sheet1"):
+	import openpyxl
+
+	wb = openpyxl.load_workbook(fileobj, read_only = True)
+	for row in wb[sheet_name].iter_rows():
+		yield tuple(c.value for c in row)
+
+def xlsx_rows(fileobj, backend = XlsxBackend.native, sheet_name = "Sheet1"):
+	if backend == XlsxBackend.native:
+		try:
+			return xlsx.SheetReader(fileobj, sheet_name)
+		except KeyError as e:
+			log.warning("Falling back to openpyxl: {0}".format(e))
+			fileobj.seek(0)
+	return iter_openpyxl_rows(fileobj, sheet_name)
+
+_NUMBER_PATTERN = re.compile(r"^-?(\d+\.?\d*|\.\d+)([eE][-+]?\d+)?$")
+
+def _csv_value(value):
+	if value == "":
+		return None
+	if _NUMBER_PATTERN.match(value):
+		return xlsx._cast_number(value)
+	return value
+
+def _csv_rows(fileobj, encoding = "utf-8-sig"):
+	"""
+	Streams rows from a CSV export laid out like the report's sheet.  Empty
+	cells become None and numeric cells past the label column become numbers,
+	matching what the xlsx readers return.
+
+	The layout is assumed, not verified against a captured export (see
+	backoffice._CsvExportFormat).
+	"""
+	text = io.TextIOWrapper(fileobj, encoding = encoding, newline = "")
+	try:
+		for row in _csv_records(text):
+			yield row
+	finally:
+		text.detach()
+
+def _csv_record(row):
+	return tuple(
+		(value or None) if offset == 0 else _csv_value(value)
+		for offset, value in enumerate(row)
+	)
+
+def _csv_records(lines):
+	for row in csv.reader(lines):
+		yield _csv_record(row)
+
+def parse_header(rows):
+	header_rows = list(itertools.islice(rows, HEADER_ROWS))
+	if len(header_rows) < HEADER_ROWS:
+		raise ValueError("Report ended within its header.")
+
+	param_key_offsets = _get_offsets(header_rows[3], PARAM_KEYS)
+
+	return dict(
+		report_name = _value(header_rows[0], 1),
+		site_name = _value(header_rows[0], 12),
+		params = _get_values(header_rows[4], param_key_offsets),
+		report_key_offsets = _get_offsets(header_rows[9], REPORT_KEYS),
+	)
+
+
+class DistributorsByFilmAndTicketTypeParser(object):
+	"""
+	Incremental parser for the body of a distributors by film and ticket type
+	report.  Rows are fed one at a time as tuples of cell values; every
+	"<label> total" row closes the innermost open block, and closing a film
+	returns that film's engagements so they can be released immediately.
+	"""
+
+	def __init__(self, report_key_offsets, tracer = None):
+		self.report_key_offsets = report_key_offsets
+		self._trace = tracer.trace if tracer is not None else _untraced
+		self._stack = []
+		self._end_distrib_value = None
+		self._distrib_name = None
+		self._film_name = None
+		self._film_engagements = None
+		self._site_name = None
+		self._screen_name = None
+		self._showdate_value = None
+		self._showtime_dt = None
+		self._tickets = None
+
+	def feed(self, row):
+		value = row[0] if row else None
+		stack = self._stack
+
+		if stack and value == stack[-1]:
+			stack.pop()
+			return self._close(len(stack), row)
+
+		depth = len(stack)
+
+		if depth == 0:
+			self._open_film(row, value)
+		elif depth == 1:
+			self._open_site_screen(row, value)
+		elif depth == 2:
+			self._open_showdate(row, value)
+		elif depth == 3:
+			self._open_showtime(row, value)
+		else:
+			self._ticket_type(row, value)
+
+		return ()
+
+	def close(self):
+		if self._stack:
+			raise ValueError("Report ended before \"{0}\".".format(self._stack[-1]))
+
+	def _open_film(self, row, value):
+		if value is None and not any(row):
+			self._trace("BLANK", row)
+			return
+
+		if value == self._end_distrib_value:
+			self._trace("END DISTRIBUTOR", row)
+			self._end_distrib_value = None
+			return
+
+		self._trace("DISTRIBUTOR", row)
+		self._distrib_name, self._film_name = value.split("  -  ", 1)
+		self._end_distrib_value = "{0} total".format(self._distrib_name)
+		self._film_engagements = dict()
+		self._stack.append("{0} total".format(self._film_name))
+
+	def _open_site_screen(self, row, value):
+		self._trace("SITE & SCREEN", row)
+		self._site_name, self._screen_name = value.split("  -  ", 1)
+
+		engagement_key = (self._site_name, self._film_name)
+		if engagement_key not in self._film_engagements:
+			self._film_engagements[engagement_key] = dict(
+				site_name = self._site_name,
+				film_name = self._film_name,
+				distributor_name = self._distrib_name,
+				showtimes = [],
+			)
+		self._stack.append("{0} total".format(value))
+
+	def _open_showdate(self, row, value):
+		self._trace("SHOWDATE", row)
+		self._showdate_value = value
+		self._stack.append("{0} total".format(value))
+
+	def _open_showtime(self, row, value):
+		self._trace("SHOWTIME", row)
+		self._showtime_dt = dates.parse_showtime(self._showdate_value, value)
+		self._tickets = dict()
+		self._stack.append("{0} total".format(value))
+
+	def _ticket_type(self, row, value):
+		self._trace("TICKET TYPE", row)
+		if value is not None:
+			offsets = self.report_key_offsets
+			self._tickets[value] = dict(
+				name = value,
+				sales = _value(row, offsets['SALES']),
+				refunds = _value(row, offsets['REFUNDS']),
+				admits = _value(row, offsets['ADMITS']),
+				gross_price = _value(row, offsets['GROSS PRICE']),
+				net_price = _value(row, offsets['NET PRICE']),
+				net_total = _value(row, offsets['NET TOTAL']),
+				tax_total = _value(row, offsets['TAX TOTAL']),
+				gross_total = _value(row, offsets['GROSS TOTAL'])
+			)
+
+	def _close(self, depth, row):
+		if depth == 3:
+			self._trace("END SHOWTIME", row)
+			engagement = self._film_engagements[(self._site_name, self._film_name)]
+			engagement["showtimes"].append(dict(
+				screen_name = self._screen_name,
+				showtime = self._showtime_dt,
+				tickets = self._tickets
+			))
+			self._tickets = None
+		elif depth == 2:
+			self._trace("END SHOWDATE", row)
+		elif depth == 1:
+			self._trace("END SITE", row)
+		else:
+			self._trace("END FILM", row)
+			engagements = list(self._film_engagements.values())
+			self._film_engagements = None
+			return engagements
+
+		return ()
+
+
+def select_report_columns(rows, report_key_offsets):
+	"""
+	Restricts `rows` to the label and report columns if the reader supports
+	it, returning the report key offsets within the selected columns.
+	"""
+	select = getattr(rows, "select", None)
+	if select is None:
+		return report_key_offsets
+
+	columns = sorted(set([0]).union(report_key_offsets.values()))
+	select(columns)
+	return dict(
+		(key, columns.index(offset)) for key, offset in report_key_offsets.items()
+	)
+
+def iter_engagements(rows, tracer = None):
+	rows = iter(rows)
+	header = parse_header(rows)
+	report_key_offsets = select_report_columns(rows, header["report_key_offsets"])
+	for engagement in iter_body_engagements(rows, report_key_offsets, tracer):
+		yield engagement
+
+def iter_body_engagements(rows, report_key_offsets, tracer = None):
+	parser = DistributorsByFilmAndTicketTypeParser(report_key_offsets, tracer)
+
+	for row in rows:
+		for engagement in parser.feed(row):
+			yield engagement
+
+	parser.close()
+
+def merge_engagements(engagements, new_engagements):
+	for new_engagement in new_engagements:
+		engagement_key = (new_engagement["site_name"], new_engagement["film_name"])
+		try:
+			engagement = engagements[engagement_key]
+		except KeyError:
+			engagements[engagement_key] = new_engagement
+		else:
+			engagement["showtimes"].extend(new_engagement["showtimes"])
+	return engagements
@@ -0,0 +1,185 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+seats.py
+"""
+
+import asyncio
+import datetime
+import threading
+
+from .constants import DEFAULT_SITE_ID
+from . import dates
+from . import loggers
+from . import sync
+
+
+log = loggers.getLogger(__name__)
+
+WATCHED_FIELDS = ("seatsSold", "seatsAvailable", "seatsHeld", "seatsHouse", "sessionStatus", "isStopped")
+SNAPSHOT_FIELDS = ("id", "screenId", "filmId", "start", "finish", "seats") + WATCHED_FIELDS
+
+# Seconds between polls by how soon the next show starts; IDLE_INTERVAL beyond.
+POLL_INTERVALS = (
+	(datetime.timedelta(minutes = 30), 15),
+	(datetime.timedelta(hours = 2), 60),
+	(datetime.timedelta(hours = 6), 180),
+)
+IDLE_INTERVAL = 600
+
+
+def _delta(added = None, updated = None, removed = None):
+	return dict(added = added or dict(), updated = updated or dict(), removed = removed or dict())
+
+
+class SeatWatcher(object):
+	"""
+	Polls seat occupancy of the sessions that are still open or start within
+	`lookahead`, keeps the latest state of each in `snapshot` (keyed by
+	session id) and hands what changed to every subscriber as a delta of
+	added, updated and removed sessions, the same shape VeeziSync returns.
+	Sessions are removed once they finish.
+
+	One watcher serves any number of subscribers: callbacks registered with
+	`subscribe()`, or async iterators from `changes()`.  Callbacks run on
+	the polling thread and should hand the delta off rather than block.
+	`start()` polls in a background thread, sooner the closer the next show
+	is (see POLL_INTERVALS); `poll()` polls once.
+	"""
+
+	def __init__(self, backoffice_session, site_id = DEFAULT_SITE_ID, lookahead = datetime.timedelta(hours = 12),
+			show_length = datetime.timedelta(hours = 3), sales_grace = datetime.timedelta(minutes = 30),
+			intervals = POLL_INTERVALS, idle_interval = IDLE_INTERVAL):
+		self.backoffice_session = backoffice_session
+		self.site_id = site_id
+		self.lookahead = lookahead
+		self.show_length = show_length
+		self.sales_grace = sales_grace
+		self.intervals = intervals
+		self.idle_interval = idle_interval
+		self.snapshot = dict()
+		self.polls = 0
+		self._subscribers = []
+		self._lock = threading.RLock()
+		self._stopping = threading.Event()
+		self._thread = None
+
+	def __enter__(self):
+		self.start()
+		return self
+
+	def __exit__(self, *exc_info):
+		self.stop()
+
+	def _window(self, now):
+		start_date = datetime.datetime.combine((now - self.show_length).date(), datetime.time())
+		end_date = datetime.datetime.combine((now + self.lookahead).date(), datetime.time()) \
+			+ datetime.timedelta(days = 1)
+		return start_date, end_date
+
+	def _times(self, session):
+		start = dates.parse_datetime(session["start"])
+		finish = dates.parse_datetime(session["finish"]) if session.get("finish") else start + self.show_length
+		return start, finish
+
+	def _is_watched(self, session, now):
+		start, finish = self._times(session)
+		return finish > now and start <= now + self.lookahead
+
+	def fetch(self, now = None):
+		now = now or datetime.datetime.now()
+		start_date, end_date = self._window(now)
+		fresh = dict()
+		for session in self.backoffice_session.iter_sessions(start_date, end_date, site_id = self.site_id):
+			if self._is_watched(session, now):
+				fresh[session["id"]] = dict((field, session.get(field)) for field in SNAPSHOT_FIELDS)
+		return fresh
+
+	def poll(self, now = None):
+		"""
+		Fetches the watched sessions, updates the snapshot and notifies the
+		subscribers if anything changed.  Returns the delta.
+		"""
+		fresh = self.fetch(now)
+		with self._lock:
+			delta = sync._diff(self.snapshot, fresh)
+			self.snapshot = fresh
+			self.polls += 1
+			if any(delta.values()):
+				self._emit(delta)
+		return delta
+
+	def _emit(self, delta):
+		for callback in list(self._subscribers):
+			try:
+				callback(delta)
+			except Exception:
+				log.exception("Seat watcher subscriber {0!r} failed".format(callback))
+
+	def subscribe(self, callback):
+		with self._lock:
+			self._subscribers.append(callback)
+		return callback
+
+	def unsubscribe(self, callback):
+		with self._lock:
+			self._subscribers.remove(callback)
+
+	async def changes(self, initial = True):
+		"""
+		Yields deltas as they are polled, starting with the current snapshot
+		as `added` if `initial`.
+		"""
+		loop = asyncio.get_running_loop()
+		queue = asyncio.Queue()
+
+		def callback(delta):
+			loop.call_soon_threadsafe(queue.put_nowait, delta)
+
+		with self._lock:
+			if initial and self.snapshot:
+				queue.put_nowait(_delta(added = dict(self.snapshot)))
+			self.subscribe(callback)
+		try:
+			while True:
+				yield await queue.get()
+		finally:
+			self.unsubscribe(callback)
+
+	def interval(self, now = None):
+		"""
+		Seconds until the next poll: the interval for the soonest show that
+		starts, or started less than `sales_grace` ago.
+		"""
+		now = now or datetime.datetime.now()
+		with self._lock:
+			starts = [self._times(session)[0] for session in self.snapshot.values()]
+		leads = [max(start - now, datetime.timedelta(0)) for start in starts if start >= now - self.sales_grace]
+		if leads:
+			lead = min(leads)
+			for threshold, seconds in self.intervals:
+				if lead <= threshold:
+					return seconds
+		return self.idle_interval
+
+	def run(self):
+		while not self._stopping.is_set():
+			try:
+				self.poll()
+				interval = self.interval()
+			except Exception:
+				log.exception("Seat watcher poll failed")
+				interval = self.intervals[0][1] if self.intervals else self.idle_interval
+			self._stopping.wait(interval)
+
+	def start(self):
+		self._stopping.clear()
+		self._thread = threading.Thread(target = self.run, name = "veezi-seat-watcher")
+		self._thread.daemon = True
+		self._thread.start()
+
+	def stop(self):
+		self._stopping.set()
+		if self._thread is not None:
+			self._thread.join()
+			self._thread = None
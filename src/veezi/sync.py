@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+sync.py
+"""
+
+import datetime
+
+
+def _diff(old, new, keys = None):
+	keys = set(old).union(new) if keys is None else keys
+	delta = dict(added = dict(), updated = dict(), removed = dict())
+
+	for key in keys:
+		if key not in new:
+			if key in old:
+				delta["removed"][key] = old[key]
+		elif key not in old:
+			delta["added"][key] = new[key]
+		elif old[key] != new[key]:
+			delta["updated"][key] = new[key]
+
+	return delta
+
+def _tickets(shows):
+	tickets = dict()
+	for show_key, show in shows.items():
+		for name, ticket in show["boxoffice"].items():
+			tickets[(show_key, name)] = ticket
+	return tickets
+
+
+class VeeziSync(object):
+	"""
+	Maintains a local copy of VeeziClient.query results and keeps it current
+	by re-querying only the open window: from `reopen_days` before the last
+	sync's watermark to `lookahead_days` past now.  Each sync returns what
+	changed in that window as added, updated and removed shows, films and
+	ticket lines.  Pass a previous `result` and `watermark` to resume.
+	"""
+
+	def __init__(self, client, start_date = None, reopen_days = 7, lookahead_days = 365,
+			result = None, watermark = None, **query_kwargs):
+		self.client = client
+		self.start_date = start_date or client.CINEMA_EPOCH
+		self.reopen_days = reopen_days
+		self.lookahead_days = lookahead_days
+		self.result = result or dict(films = dict(), shows = dict(), sites = dict(), screens = dict())
+		self.watermark = watermark
+		self.query_kwargs = query_kwargs
+
+	def _window(self, now):
+		if self.watermark is None:
+			window_start = self.start_date
+		else:
+			reopen_date = (min(self.watermark, now) - datetime.timedelta(days = self.reopen_days)).date()
+			window_start = max(self.start_date, datetime.datetime.combine(reopen_date, datetime.time()))
+
+		days = (now.date() - window_start.date()).days + self.lookahead_days
+		return window_start, window_start + datetime.timedelta(days = days)
+
+	def sync(self, now = None):
+		now = now or datetime.datetime.now()
+		window_start, window_end = self._window(now)
+		fresh = self.client.query(window_start, window_end, **self.query_kwargs)
+
+		shows = self.result["shows"]
+		window_show_keys = set(
+			show_key for show_key in shows
+			if window_start <= show_key[2] < window_end
+		)
+		window_show_keys.update(fresh["shows"])
+
+		old_shows = dict((k, shows[k]) for k in window_show_keys if k in shows)
+		show_delta = _diff(old_shows, fresh["shows"], window_show_keys)
+		ticket_delta = _diff(_tickets(old_shows), _tickets(fresh["shows"]))
+
+		for show_key in show_delta["removed"]:
+			del shows[show_key]
+		shows.update(fresh["shows"])
+
+		films = dict(self.result["films"])
+		films.update(fresh["films"])
+		film_ids = set(show.get("film_id") for show in shows.values())
+		films = dict((film_id, film) for film_id, film in films.items() if film_id in film_ids)
+		film_delta = _diff(self.result["films"], films)
+
+		self.result["films"] = films
+		self.result["sites"] = fresh["sites"]
+		self.result["screens"] = fresh["screens"]
+		self.watermark = now
+
+		return dict(
+			window = (window_start, window_end),
+			shows = show_delta,
+			films = film_delta,
+			tickets = ticket_delta,
+		)
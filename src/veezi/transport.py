@@ -4,16 +4,145 @@
 transport.py
 """
 
+import email.utils
+import os
+import random
+import threading
+import time
+
 import requests
+import requests.adapters
+
+from . import loggers
+from . import metrics
+
+
+log = loggers.getLogger(__name__)
+
+IDEMPOTENT_METHODS = frozenset(["GET", "HEAD", "OPTIONS", "PUT", "DELETE", "TRACE"])
+RETRY_STATUSES = frozenset([429, 500, 502, 503, 504])
+RETRY_EXCEPTIONS = (requests.exceptions.ConnectionError, requests.exceptions.Timeout)
+
+
+def _retry_after_seconds(value):
+	try:
+		return float(value)
+	except ValueError:
+		pass
+	try:
+		return email.utils.parsedate_to_datetime(value).timestamp() - time.time()
+	except (TypeError, ValueError):
+		return 0.0
 
 
 class HttpSession(requests.Session):
+	"""
+	The session every API and backoffice call goes through.
+
+	Connections are kept alive in pools of up to `pool_maxsize` per host, for
+	up to `pool_connections` hosts.  Idempotent requests, and any request
+	made with `idempotent = True`, are retried up to `retries` times on
+	connection errors, timeouts and RETRY_STATUSES, sleeping a random time
+	of up to `backoff` * 2 ** attempt seconds (capped at `max_backoff`, and
+	at least any Retry-After the server sends).  gzip is negotiated for
+	every request and decoded transparently.
+
+	Each request attempt is reported to `collectors` (see metrics.Collector)
+	with its endpoint, status, latency to the response headers and bytes
+	transferred; each retry is reported as well.
+	"""
+
 	_VERIFY = False
 	#_VERIFY = True
 	_PROXIES = dict()
 	#_PROXIES = dict(http = "http://localhost:8888", https = "https://localhost:8888")
 
-	def request(self, *args, **kwargs):
+	def __init__(self, collectors = None, pool_connections = 10, pool_maxsize = 16, retries = 3,
+			backoff = 0.5, max_backoff = 30.0):
+		super(HttpSession, self).__init__()
+		self.collectors = list(collectors or [])
+		self.retries = retries
+		self.backoff = backoff
+		self.max_backoff = max_backoff
+		self.headers["Accept-Encoding"] = "gzip, deflate"
+
+		adapter = requests.adapters.HTTPAdapter(pool_connections = pool_connections, pool_maxsize = pool_maxsize)
+		self.mount("https://", adapter)
+		self.mount("http://", adapter)
+
+	def _retry_delay(self, attempt, r = None):
+		delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+		retry_after = r.headers.get("Retry-After") if r is not None else None
+		if retry_after:
+			delay = max(delay, min(self.max_backoff, _retry_after_seconds(retry_after)))
+		return delay
+
+	def _retried(self, method, url, attempt, reason, r = None):
+		delay = self._retry_delay(attempt, r)
+		log.info("{0} {1} failed ({2}), retrying in {3:.2f}s".format(method, url, reason, delay))
+		endpoint = metrics.endpoint(url)
+		for collector in self.collectors:
+			collector.request_retried(method, endpoint, reason)
+		time.sleep(delay)
+
+	def request(self, method, url, *args, **kwargs):
 		kwargs.setdefault("verify", self._VERIFY)
 		kwargs.setdefault("proxies", self._PROXIES)
-		return super(HttpSession, self).request(*args, **kwargs)
+		method = method.upper()
+		retries = self.retries if kwargs.pop("idempotent", method in IDEMPOTENT_METHODS) else 0
+
+		attempt = 0
+		while True:
+			try:
+				r = self._request(method, url, *args, **kwargs)
+			except RETRY_EXCEPTIONS as e:
+				if attempt >= retries:
+					raise
+				self._retried(method, url, attempt, type(e).__name__)
+			else:
+				if r.status_code not in RETRY_STATUSES or attempt >= retries:
+					return r
+				r.close()
+				self._retried(method, url, attempt, r.status_code, r)
+			attempt += 1
+
+	def _request(self, method, url, *args, **kwargs):
+		if not self.collectors:
+			return super(HttpSession, self).request(method, url, *args, **kwargs)
+
+		endpoint = metrics.endpoint(url)
+		for collector in self.collectors:
+			collector.request_started(method, endpoint)
+
+		status = None
+		bytes_sent = bytes_received = 0
+		started = time.perf_counter()
+		try:
+			r = super(HttpSession, self).request(method, url, *args, **kwargs)
+			status = r.status_code
+			bytes_sent = metrics.body_size(r.request.body)
+			bytes_received = metrics.response_size(r, kwargs.get("stream", False))
+			return r
+		finally:
+			seconds = time.perf_counter() - started
+			for collector in self.collectors:
+				collector.request_finished(method, endpoint, status, seconds, bytes_sent, bytes_received)
+
+
+_shared = dict()
+_shared_lock = threading.Lock()
+
+def shared_session(**kwargs):
+	"""
+	The process-wide HttpSession, created with `kwargs` on first use, so that
+	every client in the process draws on one set of connection pools.  A
+	forked child gets a session of its own rather than its parent's sockets.
+	Don't log different backoffice accounts in through it: they would share
+	one cookie jar.
+	"""
+	with _shared_lock:
+		session = _shared.get(os.getpid())
+		if session is None:
+			_shared.clear()
+			session = _shared[os.getpid()] = HttpSession(**kwargs)
+		return session
@@ -0,0 +1,266 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+xlsx.py
+"""
+
+import collections
+import io
+import posixpath
+import zipfile
+
+from xml.etree import ElementTree
+
+
+_MAIN_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+_REL_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+_PKG_REL_NS = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+
+_SHEET = _MAIN_NS + "sheet"
+_ROW = _MAIN_NS + "row"
+_C = _MAIN_NS + "c"
+_SI = _MAIN_NS + "si"
+_T = _MAIN_NS + "t"
+_R = _MAIN_NS + "r"
+_V = _MAIN_NS + "v"
+_RELATIONSHIP = _PKG_REL_NS + "Relationship"
+
+_DIGITS = "0123456789"
+_CHUNK_SIZE = 1 << 16
+
+
+def _cast_number(value):
+	if "." in value or "E" in value or "e" in value:
+		return float(value)
+	return int(value)
+
+def _text(elem):
+	text = elem.findtext(_T)
+	if text is None:
+		text = "".join(r.findtext(_T) or "" for r in elem.iter(_R))
+	return text
+
+
+class SheetReader(object):
+	"""
+	Reads the cell values of one worksheet straight out of an XLSX package,
+	yielding a tuple per row as the sheet XML is parsed.  Number formats are
+	not applied, so values are the strings, numbers and booleans stored in
+	the sheet.  Calling `select(columns)` restricts subsequent rows to those
+	column offsets, in the order given, and skips decoding every other cell.
+	"""
+
+	def __init__(self, fileobj, sheet_name = "Sheet1"):
+		self._zip = zipfile.ZipFile(fileobj)
+		self._sheet_path = self._resolve_sheet(sheet_name)
+		self._shared_strings = self._read_shared_strings()
+		self._init_rows(self._zip.open(self._sheet_path))
+
+	def __iter__(self):
+		return self
+
+	def __next__(self):
+		pending = self._pending
+		while not pending:
+			if self._sheet is None:
+				raise StopIteration
+			self._read()
+		return pending.popleft()
+
+	next = __next__
+
+	@classmethod
+	def fragment(cls, xml, shared_strings, first_row = 1):
+		"""
+		A reader over a standalone piece of sheet XML, such as a run of <row>
+		elements wrapped in the worksheet's root tag, numbering rows from
+		`first_row`.
+		"""
+		reader = cls.__new__(cls)
+		reader._zip = None
+		reader._shared_strings = shared_strings
+		reader._init_rows(io.BytesIO(xml))
+		reader._target._next_row = first_row
+		return reader
+
+	def _init_rows(self, sheet):
+		self._columns = None
+		self._column_list = None
+		self._column_cache = dict()
+		self._pending = collections.deque()
+		self._target = _SheetTarget(self, self._pending)
+		self._parser = ElementTree.XMLParser(target = self._target)
+		self._sheet = sheet
+
+	@property
+	def shared_strings(self):
+		return self._shared_strings
+
+	def sheet_xml(self):
+		with self._zip.open(self._sheet_path) as f:
+			return f.read()
+
+	def select(self, columns):
+		self._column_list = list(columns)
+		if self._columns is None:
+			pending = [self._project(row) for row in self._pending]
+			self._pending.clear()
+			self._pending.extend(pending)
+		self._columns = dict((column, i) for i, column in enumerate(self._column_list))
+
+	def close(self):
+		if self._sheet is not None:
+			self._sheet.close()
+			self._sheet = None
+		if self._zip is not None:
+			self._zip.close()
+
+	def _project(self, row):
+		return tuple(row[c] if c < len(row) else None for c in self._column_list)
+
+	def _read(self):
+		chunk = self._sheet.read(_CHUNK_SIZE)
+		if chunk:
+			self._parser.feed(chunk)
+		else:
+			self._parser.close()
+			self._sheet.close()
+			self._sheet = None
+
+	def _resolve_sheet(self, sheet_name):
+		with self._zip.open("xl/workbook.xml") as f:
+			workbook = ElementTree.parse(f)
+		with self._zip.open("xl/_rels/workbook.xml.rels") as f:
+			rels = ElementTree.parse(f)
+
+		targets = dict((r.get("Id"), r.get("Target")) for r in rels.iter(_RELATIONSHIP))
+
+		for sheet in workbook.iter(_SHEET):
+			if sheet.get("name") == sheet_name:
+				target = targets[sheet.get(_REL_NS + "id")]
+				if target.startswith("/"):
+					return target[1:]
+				return posixpath.normpath(posixpath.join("xl", target))
+
+		raise KeyError("There is no worksheet named {0!r}.".format(sheet_name))
+
+	def _read_shared_strings(self):
+		try:
+			f = self._zip.open("xl/sharedStrings.xml")
+		except KeyError:
+			return []
+
+		shared_strings = []
+		with f:
+			for event, elem in ElementTree.iterparse(f):
+				if elem.tag == _SI:
+					shared_strings.append(_text(elem))
+					elem.clear()
+		return shared_strings
+
+	def _column(self, ref):
+		letters = ref.rstrip(_DIGITS)
+		try:
+			return self._column_cache[letters]
+		except KeyError:
+			column = 0
+			for letter in letters:
+				column = column * 26 + ord(letter) - 64
+			column = self._column_cache[letters] = column - 1
+			return column
+
+
+class _SheetTarget(object):
+	"""
+	Parser target that turns worksheet XML into row tuples without building
+	an element tree.  Cells outside the reader's selected columns are never
+	decoded.
+	"""
+
+	def __init__(self, reader, rows):
+		self.reader = reader
+		self.rows = rows
+		self._next_row = 1
+		self._row_columns = None
+		self._values = None
+		self._next_column = 0
+		self._position = None
+		self._type = None
+		self._text = None
+
+	def start(self, tag, attrib):
+		if tag == _C:
+			ref = attrib.get("r")
+			column = self.reader._column(ref) if ref else self._next_column
+			self._next_column = column + 1
+
+			columns = self._row_columns
+			if columns is None:
+				self._position = column
+			else:
+				self._position = columns.get(column)
+			self._type = attrib.get("t")
+		elif tag == _V or tag == _T:
+			if self._position is not None:
+				self._text = []
+		elif tag == _ROW:
+			r = attrib.get("r")
+			row_number = int(r) if r else self._next_row
+			while self._next_row < row_number:
+				self.rows.append(self._empty_row())
+				self._next_row += 1
+			self._next_row = row_number + 1
+
+			columns = self._row_columns = self.reader._columns
+			self._values = [None] * len(columns) if columns is not None else []
+			self._next_column = 0
+
+	def data(self, data):
+		if self._text is not None:
+			self._text.append(data)
+
+	def end(self, tag):
+		if tag == _V or tag == _T:
+			if self._text is not None:
+				self._set_value("".join(self._text))
+				self._text = None
+		elif tag == _C:
+			self._position = None
+		elif tag == _ROW:
+			row = tuple(self._values)
+			if self._row_columns is not self.reader._columns:
+				row = self.reader._project(row)
+			self.rows.append(row)
+			self._values = None
+
+	def close(self):
+		pass
+
+	def _set_value(self, text):
+		t = self._type
+		if t is None or t == "n":
+			value = _cast_number(text)
+		elif t == "s":
+			value = self.reader._shared_strings[int(text)]
+		elif t == "b":
+			value = bool(int(text))
+		elif t == "inlineStr":
+			previous = self._get_value()
+			value = text if previous is None else previous + text
+		else:
+			value = text
+
+		position = self._position
+		values = self._values
+		if position >= len(values):
+			values.extend([None] * (position + 1 - len(values)))
+		values[position] = value
+
+	def _get_value(self):
+		position = self._position
+		values = self._values
+		return values[position] if position < len(values) else None
+
+	def _empty_row(self):
+		columns = self.reader._columns
+		return (None,) * len(columns) if columns is not None else ()
@@ -0,0 +1,665 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+fixtures.py
+
+Stand-in server, synthetic sites and the data shared by the tests.
+"""
+
+import collections
+import csv
+import datetime
+import gzip
+import hashlib
+import html
+import http.cookies
+import http.server
+import io
+import itertools
+import json
+import re
+import socketserver
+import threading
+import time
+import urllib.parse
+
+from veezi import reports
+from veezi.constants import DEFAULT_SITE_ID
+
+
+REPORT_COLUMNS = 13
+REPORT_KEY_OFFSET = 5
+
+TICKET_FIELDS = [
+	"sales",
+	"refunds",
+	"admits",
+	"gross_price",
+	"net_price",
+	"net_total",
+	"tax_total",
+	"gross_total",
+]
+
+SHOWDATE_FORMAT = "%A, %B %d, %Y"
+SHOWTIME_FORMAT = "%I:%M %p"
+
+
+def _row(*values):
+	return tuple(values) + (None,) * (REPORT_COLUMNS - len(values))
+
+def report_rows(engagements, site_name = "Stand-in Cinema", start_date = None, end_date = None):
+	"""
+	Lays engagements out the way the distributors by film and ticket type
+	report does, so that parsing the rows gives the engagements back.
+	Engagements are expected to be grouped by distributor.
+	"""
+	date_range = ""
+	if start_date and end_date:
+		date_range = "{0} - {1}".format(start_date.strftime("%Y-%m-%d"), end_date.strftime("%Y-%m-%d"))
+
+	rows = [_row() for i in range(reports.HEADER_ROWS)]
+	rows[0] = _row(None, "Distributors by Film and Ticket Type", *([None] * 10 + [site_name]))
+	rows[3] = _row(*reports.PARAM_KEYS)
+	rows[4] = _row(date_range, "All", "All", "Full")
+	rows[9] = _row(*([None] * REPORT_KEY_OFFSET + reports.REPORT_KEYS))
+
+	films = collections.OrderedDict()
+	for engagement in engagements:
+		film_key = (engagement["distributor_name"], engagement["film_name"])
+		films.setdefault(film_key, []).append(engagement)
+
+	for distrib_name, film_keys in itertools.groupby(films, key = lambda film_key: film_key[0]):
+		for film_key in film_keys:
+			film_name = film_key[1]
+			rows.append(_row("{0}  -  {1}".format(distrib_name, film_name)))
+
+			for engagement in films[film_key]:
+				for screen_name, showtimes in itertools.groupby(engagement["showtimes"], key = lambda s: s["screen_name"]):
+					site_screen_value = "{0}  -  {1}".format(engagement["site_name"], screen_name)
+					rows.append(_row(site_screen_value))
+
+					for showdate, day_showtimes in itertools.groupby(showtimes, key = lambda s: s["showtime"].date()):
+						showdate_value = showdate.strftime(SHOWDATE_FORMAT)
+						rows.append(_row(showdate_value))
+
+						for showtime in day_showtimes:
+							showtime_value = showtime["showtime"].strftime(SHOWTIME_FORMAT)
+							rows.append(_row(showtime_value))
+							for ticket in showtime["tickets"].values():
+								rows.append(_row(ticket["name"], *(
+									[None] * (REPORT_KEY_OFFSET - 1) + [ticket[f] for f in TICKET_FIELDS]
+								)))
+							rows.append(_row("{0} total".format(showtime_value)))
+
+						rows.append(_row("{0} total".format(showdate_value)))
+
+					rows.append(_row("{0} total".format(site_screen_value)))
+
+			rows.append(_row("{0} total".format(film_name)))
+
+		rows.append(_row("{0} total".format(distrib_name)))
+		rows.append(_row())
+
+	return rows
+
+def report_workbook(rows):
+	import openpyxl
+
+	wb = openpyxl.Workbook(write_only = True)
+	ws = wb.create_sheet(title = "Sheet1")
+	for row in rows:
+		ws.append(row)
+
+	f = io.BytesIO()
+	wb.save(f)
+	return f.getvalue()
+
+def report_csv(rows):
+	"""
+	The rows in the layout reports.csv_rows() expects, which is assumed
+	rather than copied from a real export.
+	"""
+	f = io.StringIO()
+	writer = csv.writer(f)
+	for row in rows:
+		writer.writerow(["" if value is None else value for value in row])
+	return f.getvalue().encode("utf-8-sig")
+
+def films_index_html(films, next_url = None):
+	"""
+	Renders film dicts, shaped like BackofficeSession.films() results, as a
+	backoffice film index page with an optional rel="next" pagination link.
+	"""
+	rows = []
+	for film in films:
+		rows.append((
+			'<tr class="film">'
+			'<td><a href="{edit_url}"><span>{title}</span></a></td>'
+			'<td>{distributor_name}</td>'
+			'<td class="date">{release_date}</td>'
+			'<td>{genre}</td>'
+			'<td>\n\t{status}\n</td>'
+			'<td><a href="{edit_url}/delete">Delete</a></td>'
+			'</tr>'
+		).format(
+			edit_url = html.escape(film["edit_url"]),
+			title = html.escape(film["title"]),
+			distributor_name = html.escape(film["distributor_name"]),
+			release_date = film["release_date"].strftime("%m/%d/%Y"),
+			genre = html.escape(film["genre"]),
+			status = "Active" if film["is_active"] else "Inactive",
+		))
+
+	pagination = ""
+	if next_url:
+		pagination = '<ul class="pagination"><li class="PagedList-skipToNext"><a href="{0}" rel="next">&raquo;</a></li></ul>'.format(
+			html.escape(next_url)
+		)
+
+	return (
+		'<!DOCTYPE html><html><head><title>Films</title>'
+		'<script>var x = "<tr><td>not a film</td></tr>";</script></head>'
+		'<body><div id="nav"><a href="/">Home</a></div>'
+		'<table class="table"><thead><tr><th>Title</th><th>Distributor</th><th>Release</th>'
+		'<th>Genre</th><th>Status</th><th></th></tr></thead>'
+		'<tbody>{0}</tbody></table>{1}</body></html>'
+	).format("".join(rows), pagination)
+
+def _site(site_name, screen_ids):
+	return dict(
+		Name = site_name,
+		ShortName = site_name.split()[0],
+		LegalName = "{0} Ltd".format(site_name),
+		Screens = [dict(Id = screen_id) for screen_id in screen_ids],
+		Address1 = "1 Main St",
+		Address2 = None,
+		Country = "US",
+		Postcode = "00000",
+		Phone1 = "555-0100",
+		Phone2 = None,
+		Fax = None,
+		ReceiptMessage1 = "Thanks",
+		ReceiptMessage2 = None,
+		ReceiptMessage3 = None,
+		ReceiptMessage4 = None,
+		ReceiptMessage5 = None,
+		ReceiptMessage6 = None,
+		TicketMessage1 = None,
+		TicketMessage2 = None,
+		NationalCode = None,
+		TimeZoneIdentifier = "America/New_York",
+		SalesTaxRegistration = None,
+	)
+
+def _screen(screen_id):
+	return dict(Id = screen_id, Name = "Screen {0}".format(screen_id), ScreenNumber = str(screen_id),
+		Attributes = [], HasCustomLayout = False, TotalSeats = 120, WheelchairSeats = 2, HouseSeats = 0)
+
+def _session(session_id, screen_id, film_id, showtime, seats_sold):
+	return dict(
+		advanceRevenue = 0, cleanupDuration = 15, code = "S{0}".format(session_id), complimentaries = "N",
+		distributorShare = 0.5, filmId = film_id, finish = (showtime + datetime.timedelta(hours = 2)).isoformat(),
+		id = session_id, intermission = 0, isStopped = False, languageId = "en", playThruGroupCode = None,
+		priceCardId = 1, salesTypes = ["POS", "WWW"], seats = 120, seatsAvailable = 120 - seats_sold,
+		seatsHeld = 0, seatsHouse = 0, seatsSold = seats_sold, sessionStatus = "O", showNumber = 1,
+		showType = "P", start = showtime.isoformat(), validationErrors = [], screenId = screen_id,
+	)
+
+def synthetic_site(distributors = 5, films_per_distributor = 4, screens = 6, days = 30, shows_per_day = 4,
+		ticket_types = 5, start_date = datetime.datetime(2015, 1, 1), site_name = "Stand-in Cinema"):
+	"""
+	Generates a consistent site: API site and screen responses, getsessionview
+	sessions and the box office engagements for the same shows.  Every screen
+	runs `shows_per_day` shows a day, rotating through the films, and every
+	show sells each of `ticket_types` ticket types.
+	"""
+	screen_ids = list(range(1, screens + 1))
+	films = [
+		("Distributor {0}".format(d), "Film {0}-{1}".format(d, f), "ST{0:03d}{1:03d}".format(d, f))
+		for d in range(distributors)
+		for f in range(films_per_distributor)
+	]
+	ticket_names = ["Ticket {0}".format(t) for t in range(ticket_types)]
+
+	showtimes = dict()
+	sessions = []
+	for day in range(days):
+		for screen_id in screen_ids:
+			for slot in range(shows_per_day):
+				n = len(sessions)
+				distributor_name, film_name, film_id = films[(day * screens * shows_per_day + n) % len(films)]
+				showtime = start_date + datetime.timedelta(days = day, hours = 12 + 3 * slot)
+				tickets = collections.OrderedDict()
+				for t, name in enumerate(ticket_names):
+					sold = (n + t) % 9
+					price = 8.0 + t
+					tickets[name] = dict(
+						name = name, sales = sold, refunds = 0, admits = sold, gross_price = price,
+						net_price = price * 0.9, net_total = price * 0.9 * sold, tax_total = price * 0.1 * sold,
+						gross_total = price * sold,
+					)
+				showtimes.setdefault((distributor_name, film_name), []).append(dict(
+					screen_name = "Screen {0}".format(screen_id),
+					showtime = showtime,
+					tickets = tickets,
+				))
+				sessions.append(_session(n, screen_id, film_id, showtime, sum(t["admits"] for t in tickets.values())))
+
+	engagements = []
+	for distributor_name, film_name, film_id in films:
+		film_showtimes = showtimes.get((distributor_name, film_name))
+		if film_showtimes:
+			engagements.append(dict(
+				site_name = site_name,
+				film_name = film_name,
+				distributor_name = distributor_name,
+				showtimes = sorted(film_showtimes, key = lambda s: (int(s["screen_name"].split()[1]), s["showtime"])),
+			))
+
+	return dict(
+		site = _site(site_name, screen_ids),
+		screens = [_screen(screen_id) for screen_id in screen_ids],
+		sessions = sessions,
+		engagements = engagements,
+	)
+
+def filter_engagements(engagements, start_date, end_date):
+	result = []
+	for engagement in engagements:
+		showtimes = [
+			s for s in engagement["showtimes"]
+			if start_date <= s["showtime"].date() <= end_date
+		]
+		if showtimes:
+			result.append(dict(engagement, showtimes = showtimes))
+	return result
+
+
+class _ThreadingHTTPServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+	daemon_threads = True
+
+
+class _StandInHandler(http.server.BaseHTTPRequestHandler):
+	protocol_version = "HTTP/1.1"
+
+	def do_GET(self):
+		self._handle("GET")
+
+	def do_POST(self):
+		self._handle("POST")
+
+	def _handle(self, method):
+		url = urllib.parse.urlparse(self.path)
+		length = int(self.headers.get("Content-Length") or 0)
+		body = self.rfile.read(length) if length else b""
+
+		status, headers, content = self.server.stand_in.handle(
+			method,
+			url.path,
+			urllib.parse.parse_qs(url.query, True),
+			urllib.parse.parse_qs(body.decode("utf-8"), True),
+			self.headers,
+		)
+
+		self.send_response(status)
+		for name, value in headers:
+			self.send_header(name, value)
+		self.send_header("Content-Length", str(len(content)))
+		self.end_headers()
+		self.wfile.write(content)
+
+	def log_message(self, format, *args):
+		pass
+
+
+class StandInServer(object):
+	"""
+	A local stand-in for the Veezi API and backoffice, serving the given
+	fixtures over HTTP with an optional per-request latency, optionally
+	gzipped and with failures injected by `fail_next()`.  Use `api_root`
+	and `root` to point VeeziApi and BackofficeSession at it.
+	"""
+
+	_ROUTES = [
+		("GET", r"/", "_index"),
+		("GET", r"/v1/site", "_api_site"),
+		("GET", r"/v1/screen", "_api_screen"),
+		("GET", r"/v1/session(?:/(?P<session_id>[^/]+))?", "_api_session"),
+		("GET", r"/v1/film/(?P<film_id>[^/]+)", "_api_film"),
+		("POST", r"/authentication/signin", "_signin"),
+		("GET", r"/authentication/signin", "_signin_page"),
+		("GET", r"/programming/getsitedetail/(?P<site_id>[^/]+)", "_sitedetail"),
+		("POST", r"/programming/getsessionview/(?P<site_id>[^/]+)", "_sessionview"),
+		("POST", r"/webforms/reportlauncher\.aspx", "_report_launcher"),
+		("GET", r"/Reserved\.ReportViewerWebControl\.axd", "_report_export"),
+		("GET", r"/films/index", "_films_index"),
+	]
+
+	def __init__(self, site = None, screens = None, sessions = None, engagements = None,
+			films = None, films_html = "", sitedetail = None, latency = 0, require_login = False, compress = False,
+			site_id = DEFAULT_SITE_ID):
+		self.site = site
+		self.site_id = site_id
+		self.screens = screens or []
+		self.sessions = sessions or []
+		self.engagements = engagements or []
+		self.films = films or dict()
+		self.films_html = films_html
+		self.sitedetail = sitedetail or dict()
+		self.latency = latency
+		self.require_login = require_login
+		self.compress = compress
+		self.login_token = 1
+		self._failures = []
+		self.requests = collections.Counter()
+		self._lock = threading.Lock()
+		self._report_sessions = dict()
+		self._server = None
+		self._thread = None
+
+	def __enter__(self):
+		self.start()
+		return self
+
+	def __exit__(self, *exc_info):
+		self.stop()
+
+	def start(self):
+		self._server = _ThreadingHTTPServer(("127.0.0.1", 0), _StandInHandler)
+		self._server.stand_in = self
+		self._thread = threading.Thread(target = self._server.serve_forever, kwargs = dict(poll_interval = 0.05))
+		self._thread.daemon = True
+		self._thread.start()
+
+	def stop(self):
+		self._server.shutdown()
+		self._server.server_close()
+		self._thread.join()
+
+	@property
+	def url(self):
+		return "http://127.0.0.1:{0}".format(self._server.server_address[1])
+
+	@property
+	def api_root(self):
+		return self.url + "/v1{0}"
+
+	@property
+	def root(self):
+		return self.url + "{0}"
+
+	def fail_next(self, count = 1, status = 503, path = None):
+		"""
+		Answers the next `count` requests (for `path`, if given) with `status`.
+		"""
+		with self._lock:
+			self._failures.append([path, status, count])
+
+	def _failure(self, path):
+		with self._lock:
+			for failure in self._failures:
+				failure_path, status, count = failure
+				if count and failure_path in (None, path):
+					failure[2] -= 1
+					return status
+		return None
+
+	def handle(self, method, path, query, form, headers):
+		with self._lock:
+			self.requests[(method, path)] += 1
+
+		if self.latency:
+			time.sleep(self.latency)
+
+		status = self._failure(path)
+		if status is not None:
+			return self._response("Unavailable", status = status)
+
+		status, response_headers, content = self._route(method, path, query, form, headers)
+		if self.compress and content and "gzip" in headers.get("Accept-Encoding", ""):
+			content = gzip.compress(content)
+			response_headers.append(("Content-Encoding", "gzip"))
+		return status, response_headers, content
+
+	def _route(self, method, path, query, form, headers):
+		if self.require_login and not self._logged_in(path, headers):
+			return self._response("", status = 302, headers = [
+				("Location", "/authentication/signin?ReturnUrl={0}".format(urllib.parse.quote(path))),
+			])
+
+		for route_method, pattern, name in self._ROUTES:
+			match = re.match(pattern + "$", path) if route_method == method else None
+			if match:
+				return getattr(self, name)(query, form, headers, **match.groupdict())
+
+		return self._response(b"Not Found", status = 404)
+
+	def _response(self, content, status = 200, content_type = "text/plain", headers = ()):
+		if not isinstance(content, bytes):
+			content = content.encode("utf-8")
+		return status, [("Content-Type", content_type)] + list(headers), content
+
+	def _json(self, value):
+		return self._response(json.dumps(value), content_type = "application/json; charset=utf-8")
+
+	def _api_json(self, value, headers):
+		content = json.dumps(value, sort_keys = True).encode("utf-8")
+		etag = '"{0}"'.format(hashlib.md5(content).hexdigest())
+		if headers.get("If-None-Match") == etag:
+			return self._response(b"", status = 304, headers = [("ETag", etag)])
+		return self._response(content, content_type = "application/json; charset=utf-8", headers = [("ETag", etag)])
+
+	def _index(self, query, form, headers):
+		return self._response("OK")
+
+	def _api_site(self, query, form, headers):
+		return self._api_json(self.site, headers)
+
+	def _api_screen(self, query, form, headers):
+		return self._api_json(self.screens, headers)
+
+	def _api_session(self, query, form, headers, session_id = None):
+		if session_id is None:
+			return self._api_json(self.sessions, headers)
+		for session in self.sessions:
+			if str(session["id"]) == session_id:
+				return self._api_json(session, headers)
+		return self._api_error(404, "No session with id {0}.".format(session_id))
+
+	def _api_film(self, query, form, headers, film_id):
+		try:
+			return self._api_json(self.films[film_id], headers)
+		except KeyError:
+			return self._api_error(404, "No film with id {0}.".format(film_id))
+
+	def _api_error(self, status, message):
+		# The API describes its errors in a JSON body, like its results.
+		return self._response(json.dumps(dict(Message = message)), status = status,
+			content_type = "application/json; charset=utf-8")
+
+	def expire_logins(self):
+		with self._lock:
+			self.login_token += 1
+
+	def _logged_in(self, path, headers):
+		if path.startswith("/v1/") or path.startswith("/authentication/"):
+			return True
+		cookies = http.cookies.SimpleCookie(headers.get("Cookie") or "")
+		return "standin" in cookies and cookies["standin"].value == str(self.login_token)
+
+	def _signin(self, query, form, headers):
+		return self._response("", status = 302, headers = [
+			("Location", "/"),
+			("Set-Cookie", "standin={0}; Path=/".format(self.login_token)),
+		])
+
+	def _signin_page(self, query, form, headers):
+		return self._response("<form></form>", content_type = "text/html")
+
+	def _unknown_site(self, site_id):
+		if str(site_id) != str(self.site_id):
+			return self._response("No site {0}".format(site_id), status = 404)
+		return None
+
+	def _sitedetail(self, query, form, headers, site_id):
+		return self._unknown_site(site_id) or self._json(self.sitedetail)
+
+	def _sessionview(self, query, form, headers, site_id):
+		unknown = self._unknown_site(site_id)
+		if unknown:
+			return unknown
+		start = datetime.datetime.strptime(form["startDate"][0][:19], "%Y-%m-%dT%H:%M:%S")
+		end = start + datetime.timedelta(days = int(form["days"][0]))
+		return self._json(dict(sessions = [
+			s for s in self.sessions
+			if start.isoformat() <= s["start"] < end.isoformat()
+		]))
+
+	def _report_launcher(self, query, form, headers):
+		with self._lock:
+			report_session = str(len(self._report_sessions))
+			self._report_sessions[report_session] = dict((k, v[0]) for k, v in query.items())
+
+		export_url_base = "/Reserved.ReportViewerWebControl.axd?ReportSession={0}&FileName=report&Format=".format(
+			report_session
+		)
+		return self._response(
+			'<script>var viewer = {{"ExportUrlBase":{0}}};</script>'.format(json.dumps(export_url_base)),
+			content_type = "text/html"
+		)
+
+	def _report_export(self, query, form, headers):
+		params = self._report_sessions[query["ReportSession"][0]]
+		unknown = self._unknown_site(params.get("P194"))
+		if unknown:
+			return unknown
+		start_date = datetime.datetime.strptime(params["P193_From"], "%Y-%m-%d").date()
+		end_date = datetime.datetime.strptime(params["P193_To"], "%Y-%m-%d").date()
+		rows = report_rows(filter_engagements(self.engagements, start_date, end_date),
+			start_date = start_date, end_date = end_date)
+		if query.get("Format") == ["CSV"]:
+			return self._response(report_csv(rows), content_type = "text/csv")
+		return self._response(
+			report_workbook(rows),
+			content_type = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+		)
+
+	def _films_index(self, query, form, headers):
+		films_html = self.films_html
+		if isinstance(films_html, (list, tuple)):
+			films_html = films_html[int(query.get("page", ["1"])[0]) - 1]
+		return self._response(films_html, content_type = "text/html; charset=utf-8")
+
+
+SITE = dict(
+	Name = "Test Cinema",
+	ShortName = "Test",
+	LegalName = "Test Cinema Ltd",
+	Screens = [dict(Id = 1), dict(Id = 2)],
+	Address1 = "1 Main St",
+	Address2 = None,
+	Country = "US",
+	Postcode = "00000",
+	Phone1 = "555-0100",
+	Phone2 = None,
+	Fax = None,
+	ReceiptMessage1 = "Thanks",
+	ReceiptMessage2 = None,
+	ReceiptMessage3 = None,
+	ReceiptMessage4 = None,
+	ReceiptMessage5 = None,
+	ReceiptMessage6 = None,
+	TicketMessage1 = None,
+	TicketMessage2 = None,
+	NationalCode = None,
+	TimeZoneIdentifier = "America/New_York",
+	SalesTaxRegistration = None,
+)
+
+SCREENS = [
+	dict(Id = id, Name = "Screen {0}".format(id), ScreenNumber = str(id), Attributes = [],
+		HasCustomLayout = False, TotalSeats = 100, WheelchairSeats = 2, HouseSeats = 0)
+	for id in (1, 2)
+]
+
+SHOWTIMES = [
+	(1, "Heat", "Fox", datetime.datetime(2015, 12, 1, 19, 0)),
+	(2, "Heat", "Fox", datetime.datetime(2015, 12, 9, 21, 30)),
+	(1, "Elf", "Warner", datetime.datetime(2015, 12, 20, 13, 0)),
+]
+
+
+def _api_session(id, screen_id, film_id, start):
+	return dict(
+		advanceRevenue = 0, cleanupDuration = 15, code = "S{0}".format(id), complimentaries = "Y",
+		distributorShare = 0, filmId = film_id, finish = None, id = id, intermission = 0,
+		isStopped = False, languageId = None, playThruGroupCode = None, priceCardId = 1,
+		salesTypes = [], seats = 100, seatsAvailable = 90, seatsHeld = 0, seatsHouse = 0,
+		seatsSold = 10, sessionStatus = "O", showNumber = 1, showType = "P",
+		start = start.isoformat(), validationErrors = [], screenId = screen_id,
+	)
+
+SESSIONS = [
+	_api_session(i, screen_id, film_name, showtime)
+	for i, (screen_id, film_name, distributor_name, showtime) in enumerate(SHOWTIMES)
+]
+
+
+class FakeApi(object):
+	def site(self):
+		return SITE
+
+	def screen(self):
+		return SCREENS
+
+
+class FakeBackoffice(object):
+	def __init__(self):
+		self.windows = []
+		self.lock = threading.Lock()
+
+	def distributors_by_film_and_ticket_type_report(self, start_date, end_date, **kwargs):
+		with self.lock:
+			self.windows.append((start_date.date(), end_date.date()))
+
+		engagements = dict()
+		for screen_id, film_name, distributor_name, showtime in SHOWTIMES:
+			if start_date.date() <= showtime.date() <= end_date.date():
+				engagement = engagements.setdefault(("Test Cinema", film_name), dict(
+					site_name = "Test Cinema",
+					film_name = film_name,
+					distributor_name = distributor_name,
+					showtimes = [],
+				))
+				engagement["showtimes"].append(dict(
+					screen_name = "Screen {0}".format(screen_id),
+					showtime = showtime,
+					tickets = dict(Adult = dict(name = "Adult", admits = 1)),
+				))
+		return engagements
+
+	def sessions(self, start_date, days = None, **kwargs):
+		return [dict(s) for s in SESSIONS]
+
+	def iter_sessions(self, start_date, end_date = None, **kwargs):
+		return iter(self.sessions(start_date))
+
+
+def engagements():
+	engagements = []
+	for screen_id, film_name, distributor_name, showtime in SHOWTIMES:
+		engagements.append(dict(
+			site_name = "Test Cinema",
+			film_name = film_name,
+			distributor_name = distributor_name,
+			showtimes = [dict(
+				screen_name = "Screen {0}".format(screen_id),
+				showtime = showtime,
+				tickets = dict(Adult = dict(
+					name = "Adult", sales = 2, refunds = 0, admits = 2, gross_price = 10.5,
+					net_price = 9.5, net_total = 19.0, tax_total = 2.0, gross_total = 21.0
+				)),
+			)],
+		))
+	return engagements
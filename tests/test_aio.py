@@ -0,0 +1,153 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+test_aio.py
+"""
+
+import asyncio
+import datetime
+import shutil
+import tempfile
+import unittest
+
+from veezi import api
+from veezi import backoffice
+from veezi import libveezi
+from veezi import reportcache
+from veezi import transport
+
+import fixtures
+
+try:
+	import aiohttp
+	from veezi import aio
+except ImportError:
+	aio = None
+
+
+@unittest.skipIf(aio is None, "aiohttp is not installed")
+class AsyncClientTest(unittest.TestCase):
+	start = datetime.datetime(2015, 12, 1)
+	end = datetime.datetime(2015, 12, 31)
+
+	def setUp(self):
+		self.server = fixtures.StandInServer(
+			site = fixtures.SITE,
+			screens = fixtures.SCREENS,
+			sessions = fixtures.SESSIONS,
+			engagements = fixtures.engagements(),
+		)
+		self.server.start()
+		self.addCleanup(self.server.stop)
+
+	def _sync_query(self, **kwargs):
+		http = transport.HttpSession()
+		client = libveezi.VeeziClient(
+			backoffice.BackofficeSession.login("user", "password", http = http,
+				root = self.server.root, login_root = self.server.root),
+			api.VeeziApi("token", http = http, root = self.server.api_root),
+			**kwargs
+		)
+		return client.query(self.start, self.end)
+
+	def _async_query(self, **kwargs):
+		async def query():
+			async with aio.AsyncHttpSession() as http:
+				client = aio.AsyncVeeziClient(
+					await aio.AsyncBackofficeSession.login("user", "password", http = http,
+						root = self.server.root, login_root = self.server.root),
+					aio.AsyncVeeziApi("token", http = http, root = self.server.api_root),
+					**kwargs
+				)
+				return await client.query(self.start, self.end)
+		return asyncio.run(query())
+
+	def test_query_matches_sync(self):
+		result = self._sync_query()
+		self.assertEqual(len(result["shows"]), 3)
+		self.assertEqual(result["shows"][(9999, 1, datetime.datetime(2015, 12, 1, 19))]["boxoffice"]["Adult"]["admits"], 2)
+		self.assertEqual(self._async_query(), result)
+
+	def test_windowed_query_matches_sync(self):
+		self.assertEqual(self._async_query(report_window_days = 7), self._sync_query())
+		self.assertEqual(self.server.requests[("POST", "/webforms/reportlauncher.aspx")], 6)
+
+	def test_windowed_sessions_match_sync(self):
+		result = self._async_query(session_window_days = 7)
+		self.assertEqual(self.server.requests[("POST", "/programming/getsessionview/9999")], 5)
+		self.assertEqual(result, self._sync_query())
+
+	def test_iter_report(self):
+		async def report():
+			async with aio.AsyncHttpSession() as http:
+				session = aio.AsyncBackofficeSession(http, root = self.server.root)
+				with self.assertRaises(NotImplementedError):
+					session._report_export(None, dict())
+				return [
+					engagement async for engagement in session.iter_distributors_by_film_and_ticket_type_report(
+						self.start, self.end)
+				]
+
+		sync_session = backoffice.BackofficeSession(transport.HttpSession(), root = self.server.root)
+		self.assertEqual(asyncio.run(report()),
+			list(sync_session.iter_distributors_by_film_and_ticket_type_report(self.start, self.end)))
+
+	def test_bulk_films(self):
+		self.server.films = dict(ST001 = dict(Id = "ST001", Title = "Heat"))
+
+		async def films():
+			async with aio.AsyncHttpSession() as http:
+				veezi_api = aio.AsyncVeeziApi("token", http = http, root = self.server.api_root, cache = False)
+				return await veezi_api.films(["ST001", "ST002"])
+
+		films = asyncio.run(films())
+		self.assertEqual(films, self.server.films)
+		self.assertEqual(films.errors["ST002"].response.status_code, 404)
+
+	def test_report_cache(self):
+		path = tempfile.mkdtemp()
+		self.addCleanup(shutil.rmtree, path)
+		cache = reportcache.ReportCache(path, partition_days = 7)
+
+		result = self._async_query(report_cache = cache)
+		self.assertEqual(self._async_query(report_cache = cache), result)
+		self.assertEqual(cache.stats()["hits"], cache.stats()["stores"])
+		self.assertEqual(result, self._sync_query())
+
+
+@unittest.skipIf(aio is None, "aiohttp is not installed")
+class AsyncLoginTest(unittest.TestCase):
+	start = datetime.datetime(2015, 12, 1)
+
+	def setUp(self):
+		self.server = fixtures.StandInServer(sessions = fixtures.SESSIONS, require_login = True)
+		self.server.start()
+		self.addCleanup(self.server.stop)
+
+	def _signins(self):
+		return self.server.requests[("POST", "/authentication/signin")]
+
+	def test_lazy_login_and_relogin(self):
+		async def sessions():
+			# The stand-in is served from an IP address, which aiohttp won't set cookies for by default.
+			async with aio.AsyncHttpSession(cookie_jar = aiohttp.CookieJar(unsafe = True)) as http:
+				session = await aio.AsyncBackofficeSession.login("user", "password", http = http, lazy = True,
+					root = self.server.root, login_root = self.server.root)
+				signins = self._signins()
+				first = await session.sessions(self.start, days = 30)
+				self.server.expire_logins()
+				second = await session.sessions(self.start, days = 30)
+				return signins, first, second
+
+		signins, first, second = asyncio.run(sessions())
+		self.assertEqual(signins, 0)
+		self.assertEqual(len(first), 3)
+		self.assertEqual(second, first)
+		self.assertEqual(self._signins(), 2)
+
+
+def main():
+	unittest.main()
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+test_api.py
+"""
+
+import json
+import time
+import unittest
+
+from veezi import api
+from veezi import cache
+
+import fixtures
+
+
+class VeeziApiCacheTest(unittest.TestCase):
+	def setUp(self):
+		self.server = fixtures.StandInServer(
+			site = fixtures.SITE,
+			screens = fixtures.SCREENS,
+			films = dict(ST001 = dict(Id = "ST001", Title = "Heat")),
+		)
+		self.server.start()
+		self.addCleanup(self.server.stop)
+
+	def _api(self, response_cache, **ttls):
+		return api.VeeziApi("token", root = self.server.api_root, cache = response_cache, ttls = ttls)
+
+	def test_uncached(self):
+		veezi_api = self._api(False)
+		self.assertEqual(veezi_api.site(), fixtures.SITE)
+		self.assertEqual(veezi_api.site(), fixtures.SITE)
+		self.assertEqual(self.server.requests[("GET", "/v1/site")], 2)
+
+	def test_shared_cache(self):
+		response_cache = cache.ResponseCache()
+		self.assertEqual(self._api(response_cache).site(), fixtures.SITE)
+		self.assertEqual(self._api(response_cache).site(), fixtures.SITE)
+		self.assertEqual(self.server.requests[("GET", "/v1/site")], 1)
+		self.assertEqual(response_cache.stats()["hits"], 1)
+		self.assertEqual(response_cache.stats()["misses"], 1)
+
+	def test_default_cache(self):
+		veezi_api = api.VeeziApi("token", root = self.server.api_root)
+		self.assertIs(veezi_api.cache, cache.shared())
+		veezi_api.site()
+		api.VeeziApi("token", root = self.server.api_root).site()
+		self.assertEqual(self.server.requests[("GET", "/v1/site")], 1)
+
+	def test_errors_are_not_cached(self):
+		class ErrorResponse(object):
+			status_code = 500
+			text = '{"Message": "An error has occurred."}'
+			headers = dict()
+
+		class ErrorHttp(object):
+			def get(self, url, **kwargs):
+				return ErrorResponse()
+
+		response_cache = cache.ResponseCache()
+		veezi_api = api.VeeziApi("token", http = ErrorHttp(), cache = response_cache)
+		veezi_api.site()
+		self.assertEqual(response_cache.stats()["entries"], 0)
+
+	def test_revalidation(self):
+		response_cache = cache.ResponseCache()
+		veezi_api = self._api(response_cache, film = 0.05)
+		film = veezi_api.film("ST001")
+		time.sleep(0.1)
+		self.assertEqual(veezi_api.film("ST001"), film)
+		self.assertEqual(self.server.requests[("GET", "/v1/film/ST001")], 2)
+		self.assertEqual(response_cache.stats()["revalidations"], 1)
+
+	def test_lru_eviction(self):
+		response_cache = cache.ResponseCache(max_entries = 1)
+		veezi_api = self._api(response_cache)
+		veezi_api.site()
+		veezi_api.screen()
+		veezi_api.site()
+		self.assertEqual(self.server.requests[("GET", "/v1/site")], 2)
+		self.assertEqual(response_cache.stats()["evictions"], 2)
+
+	def test_bulk_films(self):
+		response_cache = cache.ResponseCache()
+		veezi_api = self._api(response_cache)
+		veezi_api.film("ST001")
+
+		films = veezi_api.films(["ST001", "ST002", "ST001", "ST003", "ST002"])
+		self.assertEqual(films, dict(ST001 = dict(Id = "ST001", Title = "Heat")))
+		self.assertEqual(sorted(films.errors), ["ST002", "ST003"])
+		self.assertEqual(films.errors["ST002"].response.status_code, 404)
+		self.assertEqual(self.server.requests[("GET", "/v1/film/ST001")], 1)
+		self.assertEqual(self.server.requests[("GET", "/v1/film/ST002")], 1)
+
+	def test_bulk_films_json_errors(self):
+		films = self._api(False).films(["ST001", "ST002"])
+		self.assertEqual(list(films), ["ST001"])
+		self.assertEqual(list(films.errors), ["ST002"])
+		self.assertEqual(json.loads(films.errors["ST002"].response.text), dict(Message = "No film with id ST002."))
+
+
+def main():
+	unittest.main()
+
+if __name__ == "__main__":
+	main()
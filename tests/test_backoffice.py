@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+test_backoffice.py
+"""
+
+import datetime
+import os
+import shutil
+import tempfile
+import unittest
+
+from veezi import backoffice
+from veezi import transport
+
+import fixtures
+
+
+class SessionsTest(unittest.TestCase):
+	start = datetime.datetime(2015, 12, 1)
+	end = datetime.datetime(2015, 12, 31)
+
+	def setUp(self):
+		self.server = fixtures.StandInServer(sessions = fixtures.SESSIONS)
+		self.server.start()
+		self.addCleanup(self.server.stop)
+		self.session = backoffice.BackofficeSession(transport.HttpSession(), root = self.server.root)
+
+	def test_iter_sessions(self):
+		sessions = self.session.sessions(self.start, days = (self.end - self.start).days)
+		self.assertEqual(len(sessions), len(fixtures.SESSIONS))
+		self.assertEqual(list(self.session.iter_sessions(self.start, self.end)), sessions)
+
+		windowed = self.session.iter_sessions(self.start, self.end, window_days = 7)
+		self.assertEqual(list(windowed), sessions)
+		self.assertEqual(self.server.requests[("POST", "/programming/getsessionview/9999")], 7)
+
+	def test_same_day_sessions(self):
+		end = self.start + datetime.timedelta(hours = 23)
+		self.assertEqual(list(self.session.iter_sessions(self.start, end, window_days = 7)), [])
+		self.assertEqual(list(self.session.iter_sessions(self.start, end)), [])
+		self.assertEqual(self.server.requests[("POST", "/programming/getsessionview/9999")], 2)
+
+	def test_showtimes(self):
+		showtimes = self.session.showtimes(self.start, days = 30)
+		self.assertEqual(sum(len(s) for s in showtimes.values()), len(fixtures.SESSIONS))
+
+
+class LoginTest(unittest.TestCase):
+	start = datetime.datetime(2015, 12, 1)
+
+	def setUp(self):
+		self.server = fixtures.StandInServer(sessions = fixtures.SESSIONS, require_login = True)
+		self.server.start()
+		self.addCleanup(self.server.stop)
+		self.path = tempfile.mkdtemp()
+		self.addCleanup(shutil.rmtree, self.path)
+		self.cookie_path = os.path.join(self.path, "cookies.txt")
+
+	def _login(self, **kwargs):
+		return backoffice.BackofficeSession.login("user", "password", http = transport.HttpSession(),
+			root = self.server.root, login_root = self.server.root, **kwargs)
+
+	def _signins(self):
+		return self.server.requests[("POST", "/authentication/signin")]
+
+	def test_lazy_login(self):
+		session = self._login(lazy = True)
+		self.assertEqual(self._signins(), 0)
+		self.assertEqual(len(session.sessions(self.start, days = 30)), 3)
+		self.assertEqual(self._signins(), 1)
+
+	def test_relogin_on_redirect(self):
+		session = self._login()
+		self.server.expire_logins()
+		self.assertEqual(len(session.sessions(self.start, days = 30)), 3)
+		self.assertEqual(self._signins(), 2)
+
+	def test_shared_cookie_file(self):
+		first = self._login(lazy = True, cookie_path = self.cookie_path)
+		first.sessions(self.start, days = 30)
+		second = self._login(cookie_path = self.cookie_path)
+		self.assertEqual(len(second.sessions(self.start, days = 30)), 3)
+		self.assertEqual(self._signins(), 1)
+
+		self.server.expire_logins()
+		first.sessions(self.start, days = 30)
+		self.assertEqual(len(second.sessions(self.start, days = 30)), 3)
+		self.assertEqual(self._signins(), 2)
+
+
+def main():
+	unittest.main()
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+test_buffers.py
+"""
+
+import datetime
+import io
+import unittest
+
+from veezi import backoffice
+from veezi import buffers
+from veezi import transport
+
+import fixtures
+
+
+class FakeResponse(object):
+	def __init__(self, content, chunk_size, content_length = True):
+		self.content = content
+		self.chunk_size = chunk_size
+		self.headers = {"Content-Length": str(len(content))} if content_length else dict()
+		self.closed = False
+
+	def iter_content(self, chunk_size = 1):
+		for offset in range(0, len(self.content), self.chunk_size):
+			yield self.content[offset:offset + self.chunk_size]
+
+	def close(self):
+		self.closed = True
+
+
+class MemoryFileTest(unittest.TestCase):
+	def test_file_protocol(self):
+		fileobj = buffers.MemoryFile(bytearray(b"0123456789"), 8)
+		self.assertEqual(fileobj.read(3), b"012")
+		self.assertEqual(fileobj.seek(-2, io.SEEK_END), 6)
+		self.assertEqual(fileobj.read(), b"67")
+		self.assertEqual(fileobj.read(), b"")
+		fileobj.seek(1)
+		b = bytearray(4)
+		self.assertEqual(fileobj.readinto(b), 4)
+		self.assertEqual(b, bytearray(b"1234"))
+		fileobj.close()
+		self.assertTrue(fileobj.closed)
+
+
+class DownloadTest(unittest.TestCase):
+	content = bytes(range(256)) * 100
+
+	def _download(self, response, pool, **kwargs):
+		stats = dict()
+		with buffers.download(response, pool, stats = stats, **kwargs) as fileobj:
+			self.assertEqual(fileobj.read(), self.content)
+		self.assertTrue(response.closed)
+		self.assertEqual(stats["bytes"], len(self.content))
+		return stats
+
+	def test_pooled_buffer(self):
+		pool = buffers.BufferPool()
+		self.assertFalse(self._download(FakeResponse(self.content, 1000), pool)["spilled"])
+		buffer = pool.acquire()
+		self.assertEqual(len(buffer), len(self.content))
+		pool.release(buffer)
+
+		self._download(FakeResponse(self.content, 999, content_length = False), pool)
+		self.assertIs(pool.acquire(), buffer)
+
+	def test_spill(self):
+		pool = buffers.BufferPool()
+		self.assertTrue(self._download(FakeResponse(self.content, 1000), pool, spill_bytes = 5000)["spilled"])
+		self.assertTrue(self._download(FakeResponse(self.content, 1000, False), pool, spill_bytes = 5000)["spilled"])
+
+
+class ReportDownloadTest(unittest.TestCase):
+	def setUp(self):
+		self.server = fixtures.StandInServer(
+			site = fixtures.SITE,
+			screens = fixtures.SCREENS,
+			sessions = fixtures.SESSIONS,
+			engagements = fixtures.engagements(),
+		)
+		self.server.start()
+		self.addCleanup(self.server.stop)
+
+	def _report(self, spill_bytes = buffers.SPILL_BYTES, **kwargs):
+		session = backoffice.BackofficeSession(transport.HttpSession(), root = self.server.root,
+			spill_bytes = spill_bytes)
+		report = session.distributors_by_film_and_ticket_type_report(
+			datetime.datetime(2015, 12, 1),
+			datetime.datetime(2015, 12, 31),
+			**kwargs
+		)
+		return report, session.report_stats[-1]
+
+	def test_spilled_report_matches(self):
+		report, stats = self._report()
+		self.assertEqual(len(report), 2)
+		self.assertFalse(stats["spilled"])
+		for key in ("launch_seconds", "response_seconds", "download_seconds", "parse_seconds", "bytes_per_second"):
+			self.assertIn(key, stats)
+
+		spilled_report, stats = self._report(spill_bytes = 1024)
+		self.assertTrue(stats["spilled"])
+		self.assertEqual(spilled_report, report)
+
+	def test_csv_report_matches(self):
+		# Only checks the CSV path against the stand-in's assumed layout.
+		report, stats = self._report()
+		csv_report, stats = self._report(export_format = backoffice._CsvExportFormat.csv)
+		self.assertEqual(stats["format"], "csv")
+		self.assertEqual(csv_report, report)
+
+
+def main():
+	unittest.main()
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+test_columnar.py
+"""
+
+import collections
+import datetime
+import unittest
+
+from veezi import libveezi
+
+import fixtures
+
+try:
+	import numpy
+	from veezi import columnar
+except ImportError:
+	columnar = None
+
+
+@unittest.skipIf(columnar is None, "numpy is not installed")
+class TicketSalesTableTest(unittest.TestCase):
+	start = datetime.datetime(2015, 12, 1)
+	end = datetime.datetime(2015, 12, 31)
+
+	def _client(self):
+		return libveezi.VeeziClient(fixtures.FakeBackoffice(), fixtures.FakeApi())
+
+	def test_from_query(self):
+		result = self._client().query(self.start, self.end)
+		table = columnar.TicketSalesTable.from_query(result)
+		self.assertEqual(len(table), sum(len(show["boxoffice"]) for show in result["shows"].values()))
+
+		expected = collections.Counter()
+		for (site_id, screen_id, showtime), show in result["shows"].items():
+			film_name = result["films"][show["film_id"]]["name"]
+			for ticket in show["boxoffice"].values():
+				expected[(film_name, showtime.date())] += ticket["admits"]
+
+		rollup = table.rollup(("film_name", "day"), values = ("admits",))
+		self.assertEqual(
+			dict(
+				((film_name, day.item()), admits)
+				for film_name, day, admits in zip(rollup["film_name"], rollup["day"], rollup["admits"])
+			),
+			dict(expected)
+		)
+
+	def test_from_report(self):
+		report = self._client()._box_office_report(self.start, self.end)
+		table = columnar.TicketSalesTable.from_report(report)
+
+		rollup = table.rollup("film_name")
+		self.assertEqual(list(rollup), ["film_name"] + list(columnar.SUM_COLUMNS))
+		self.assertEqual(
+			dict(zip(rollup["film_name"], rollup["admits"].tolist())),
+			dict(
+				(film_name, sum(
+					ticket["admits"]
+					for show in engagement["showtimes"]
+					for ticket in show["tickets"].values()
+				))
+				for (site_name, film_name), engagement in report.items()
+			)
+		)
+		self.assertEqual(table["ticket_type"].tolist(), ["Adult"] * len(table))
+
+
+def main():
+	unittest.main()
+
+if __name__ == "__main__":
+	main()
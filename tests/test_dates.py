@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+test_dates.py
+"""
+
+import concurrent.futures
+import dateutil.parser
+import unittest
+
+from veezi import dates
+
+
+class DateTimeParserTest(unittest.TestCase):
+	def test_matches_dateutil(self):
+		parser = dates.DateTimeParser()
+		for showdate, showtime in [
+			("Tuesday, December 01, 2015", "7:00 PM"),
+			("Tuesday, 1 December 2015", "19:05"),
+			("12/01/2015", "11:30 AM"),
+			("1st of December, 2015", "7pm"),
+		]:
+			self.assertEqual(
+				parser.showtime(showdate, showtime),
+				dateutil.parser.parse("{0} {1}".format(showdate, showtime))
+			)
+
+		self.assertEqual(parser.datetime("2015-12-01T19:00:00"), dateutil.parser.parse("2015-12-01T19:00:00"))
+
+	def test_stats(self):
+		parser = dates.DateTimeParser()
+		for i in range(3):
+			parser.showtime("Tuesday, December 01, 2015", "7:00 PM")
+
+		stats = parser.stats()
+		self.assertEqual((stats["hits"], stats["misses"], stats["fallbacks"]), (4, 2, 0))
+		self.assertAlmostEqual(stats["hit_rate"], 4.0 / 6)
+
+	def test_threads(self):
+		parser = dates.DateTimeParser()
+		values = ["12/{0:02d}/2015".format(day) for day in range(1, 29)] \
+			+ ["2015-12-{0:02d}".format(day) for day in range(1, 29)] \
+			+ ["December {0:02d}, 2015".format(day) for day in range(1, 29)]
+		with concurrent.futures.ThreadPoolExecutor(8) as executor:
+			parsed = list(executor.map(parser.date, values * 20))
+
+		self.assertEqual(parsed, [dateutil.parser.parse(value).date() for value in values * 20])
+		self.assertEqual(sorted(parser._formats["date"]), sorted(dates.DateTimeParser.DATE_FORMATS))
+		stats = parser.stats()
+		self.assertEqual(stats["hits"] + stats["misses"], len(values) * 20)
+
+
+def main():
+	unittest.main()
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+test_filmindex.py
+"""
+
+import datetime
+import unittest
+
+from veezi import backoffice
+from veezi import filmindex
+from veezi import transport
+
+import fixtures
+
+
+def _films(count, offset = 0):
+	return [
+		dict(
+			title = "Film & Sequel {0} <Amélie>".format(i),
+			edit_url = "/films/edit/ST{0:05d}".format(i),
+			session = "ST{0:05d}".format(i),
+			distributor_name = "Distributor {0}".format(i % 7),
+			release_date = datetime.datetime(2015, 1, 1) + datetime.timedelta(days = i),
+			genre = "Drama",
+			is_active = i % 3 != 0,
+		)
+		for i in range(offset, offset + count)
+	]
+
+
+class FilmTableParserTest(unittest.TestCase):
+	def test_parse_films(self):
+		films = _films(5)
+		self.assertEqual(filmindex.parse_films(fixtures.films_index_html(films)), films)
+
+	def test_incremental_feed(self):
+		films = _films(5)
+		text = fixtures.films_index_html(films, next_url = "/films/index?page=2")
+		parser = filmindex.FilmTableParser()
+		parsed = []
+		for i in range(0, len(text), 17):
+			parser.feed(text[i:i + 17])
+			parsed.extend(parser.films())
+		parser.close()
+		self.assertEqual(parsed, films)
+		self.assertEqual(parser.next_url, "/films/index?page=2")
+
+
+class IterFilmsTest(unittest.TestCase):
+	def test_pagination(self):
+		pages = [_films(3), _films(3, offset = 3), _films(2, offset = 6)]
+		server = fixtures.StandInServer(films_html = [
+			fixtures.films_index_html(page, next_url = "/films/index?page={0}".format(i + 2) if i + 1 < len(pages) else None)
+			for i, page in enumerate(pages)
+		])
+		server.start()
+		self.addCleanup(server.stop)
+
+		session = backoffice.BackofficeSession(transport.HttpSession(), root = server.root)
+		self.assertEqual(session.films(), _films(8))
+		self.assertEqual(list(session.iter_films(max_pages = 1)), pages[0])
+		self.assertEqual(server.requests[("GET", "/films/index")], 4)
+
+
+def main():
+	unittest.main()
+
+if __name__ == "__main__":
+	main()
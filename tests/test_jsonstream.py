@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+test_jsonstream.py
+"""
+
+import json
+import unittest
+
+from veezi import jsonstream
+
+
+def _chunks(content, size):
+	return [content[i:i + size] for i in range(0, len(content), size)]
+
+
+class IterArrayItemsTest(unittest.TestCase):
+	document = dict(
+		status = "ok",
+		sessions = [
+			dict(id = 1, title = "Amélie", seats = [1, 2, 3]),
+			12345,
+			"]",
+			None,
+			dict(id = 2, nested = dict(sessions = [])),
+		],
+		trailer = True,
+	)
+
+	def test_chunk_sizes(self):
+		content = json.dumps(self.document, ensure_ascii = False).encode("utf-8")
+		for size in (1, 2, 7, 64, len(content)):
+			self.assertEqual(
+				list(jsonstream.iter_array_items(_chunks(content, size), "sessions")),
+				self.document["sessions"]
+			)
+
+	def test_empty_array(self):
+		self.assertEqual(list(jsonstream.iter_array_items([b'{"sessions" : [ ]}'], "sessions")), [])
+
+	def test_malformed(self):
+		with self.assertRaises(ValueError):
+			list(jsonstream.iter_array_items([b'{"films": []}'], "sessions"))
+		with self.assertRaises(ValueError):
+			list(jsonstream.iter_array_items([b'{"sessions": [{"id": 1}, {"id"'], "sessions"))
+
+
+def main():
+	unittest.main()
+
+if __name__ == "__main__":
+	main()
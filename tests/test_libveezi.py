@@ -0,0 +1,260 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+fixtures.py
+"""
+
+import datetime
+import pickle
+import shutil
+import tempfile
+import threading
+import unittest
+
+from veezi import api
+from veezi import backoffice
+from veezi import libveezi
+from veezi import records
+from veezi import reportcache
+from veezi import transport
+
+import fixtures
+
+
+class VeeziClientTest(unittest.TestCase):
+	start = datetime.datetime(2015, 12, 1)
+	end = datetime.datetime(2015, 12, 31)
+
+	def _client(self, **kwargs):
+		return libveezi.VeeziClient(fixtures.FakeBackoffice(), fixtures.FakeApi(), **kwargs)
+
+	def test_query(self):
+		result = self._client().query(self.start, self.end)
+		self.assertEqual(sorted(result["films"]), ["Elf", "Heat"])
+		self.assertEqual(len(result["shows"]), 3)
+		for show in result["shows"].values():
+			self.assertEqual(show["boxoffice"]["Adult"]["admits"], 1)
+
+	def test_compact_query(self):
+		result = self._client().query(self.start, self.end)
+		compact = self._client(compact = True).query(self.start, self.end)
+		self.assertEqual(compact, result)
+		self.assertEqual(records.compact(result), result)
+
+		show = next(iter(compact["shows"].values()))
+		self.assertIsInstance(show, records.Show)
+		self.assertFalse(hasattr(show, "__dict__"))
+		self.assertEqual(show["boxoffice"]["Adult"].name, "Adult")
+		self.assertEqual(show.to_dict(), result["shows"][next(iter(compact["shows"]))])
+
+	def test_compact_pickles_by_name(self):
+		result = self._client().query(self.start, self.end)
+		data = pickle.dumps(self._client(compact = True).query(self.start, self.end))
+
+		# Another process interns ticket types in its own order.
+		self.addCleanup(setattr, records, "ticket_types", records.ticket_types)
+		records.ticket_types = records.TicketTypes()
+		records.ticket_types.code("Child")
+		self.assertEqual(pickle.loads(data), result)
+
+	def test_windowed_report(self):
+		client = self._client(report_window_days = 7)
+		bor = client._box_office_report(self.start, self.end)
+
+		self.assertEqual(sorted(client.backoffice_session.windows)[0], (self.start.date(), datetime.date(2015, 12, 7)))
+		self.assertEqual(len(client.backoffice_session.windows), 5)
+		self.assertEqual(bor, self._client()._box_office_report(self.start, self.end))
+		self.assertEqual(len(bor[("Test Cinema", "Heat")]["showtimes"]), 2)
+		self.assertEqual(client.query(self.start, self.end), self._client().query(self.start, self.end))
+
+	def test_default_range_is_not_windowed(self):
+		client = self._client(report_window_days = 30)
+		result = client.query()
+		self.assertEqual(len(client.backoffice_session.windows), 1)
+		self.assertEqual(client.backoffice_session.windows[0][0], client.CINEMA_EPOCH.date())
+		self.assertEqual(len(result["shows"]), 3)
+
+		client = self._client(report_window_days = 30)
+		client.query(self.start)
+		self.assertEqual(len(client.backoffice_session.windows), 1)
+
+	def test_parallel_query(self):
+		# Both calls must be in flight at once to pass the barrier.
+		barrier = threading.Barrier(2, timeout = 5)
+
+		class OverlappingApi(fixtures.FakeApi):
+			def site(self):
+				barrier.wait()
+				return fixtures.SITE
+
+			def screen(self):
+				barrier.wait()
+				return fixtures.SCREENS
+
+		client = libveezi.VeeziClient(fixtures.FakeBackoffice(), OverlappingApi(), parallel_fetch = True)
+		result = client.query(self.start, self.end)
+		self.assertEqual(result, self._client().query(self.start, self.end))
+
+	def test_parallel_query_error(self):
+		release = threading.Event()
+		finished = threading.Event()
+		self.addCleanup(release.set)
+
+		class SlowApi(fixtures.FakeApi):
+			def site(self):
+				release.wait(10)
+				finished.set()
+				return fixtures.SITE
+
+		class FailingBackoffice(fixtures.FakeBackoffice):
+			def sessions(self, start_date, days = None, **kwargs):
+				raise IOError("sessions unavailable")
+
+		client = libveezi.VeeziClient(FailingBackoffice(), SlowApi())
+		with self.assertRaises(IOError):
+			client.query(self.start, self.end, parallel = True)
+		self.assertFalse(finished.is_set())
+
+	def test_report_cache(self):
+		path = tempfile.mkdtemp()
+		self.addCleanup(shutil.rmtree, path)
+
+		cache = reportcache.ReportCache(path, partition_days = 7)
+		client = self._client(report_cache = cache)
+		bor = client._box_office_report(self.start, self.end)
+		self.assertEqual(bor, self._client()._box_office_report(self.start, self.end))
+		self.assertEqual(cache.stats()["stores"], 3)
+
+		client = self._client(report_cache = cache)
+		self.assertEqual(client._box_office_report(self.start, self.end), bor)
+		self.assertEqual(len(client.backoffice_session.windows), 2)
+		self.assertEqual(cache.stats()["hits"], 3)
+
+		cache.max_bytes = cache.stats()["bytes"] // 2
+		cache.evict()
+		self.assertLessEqual(cache.stats()["bytes"], cache.max_bytes)
+		self.assertGreater(cache.stats()["evictions"], 0)
+
+	def test_report_cache_keys(self):
+		path = tempfile.mkdtemp()
+		self.addCleanup(shutil.rmtree, path)
+		cache = reportcache.ReportCache(path, partition_days = 7)
+
+		self._client(report_cache = cache)._box_office_report(self.start, self.end)
+		self._client(report_cache = cache)._box_office_report(self.start, self.end, film_id = "ST001")
+		self.assertEqual(cache.stats()["hits"], 0)
+		self._client(report_cache = cache)._box_office_report(self.start, self.end, film_id = "ST001")
+		self.assertEqual(cache.stats()["hits"], 3)
+
+		cache.SCHEMA_VERSION += 1
+		self._client(report_cache = cache)._box_office_report(self.start, self.end)
+		self.assertEqual(cache.stats()["hits"], 3)
+
+	def test_report_cache_fetches_unsettled_days_once(self):
+		path = tempfile.mkdtemp()
+		self.addCleanup(shutil.rmtree, path)
+
+		cache = reportcache.ReportCache(path, settle_days = 7, partition_days = 7)
+		today = datetime.datetime.combine(datetime.date.today(), datetime.time())
+		start = today - datetime.timedelta(days = 60)
+		end = today + datetime.timedelta(days = 30)
+		first_unsettled = (today - datetime.timedelta(days = 6)).date()
+
+		client = self._client(report_cache = cache)
+		client._box_office_report(start, end)
+		windows = sorted(client.backoffice_session.windows)
+		self.assertEqual(windows[-1], (first_unsettled, end.date()))
+		self.assertTrue(all(window_end < first_unsettled for window_start, window_end in windows[:-1]))
+
+		client = self._client(report_cache = cache)
+		client._box_office_report(start, end)
+		self.assertEqual(len(client.backoffice_session.windows), len(windows) - cache.stats()["stores"])
+		self.assertIn((first_unsettled, end.date()), client.backoffice_session.windows)
+
+		client = self._client(report_cache = cache)
+		client.query()
+		self.assertEqual(len(client.backoffice_session.windows), 1)
+
+	def test_multi_site_query(self):
+		class SiteApi(fixtures.FakeApi):
+			def __init__(self, offset):
+				self.offset = offset
+
+			def site(self):
+				return dict(fixtures.SITE, Name = "Cinema {0}".format(self.offset), Screens = [
+					dict(Id = screen["Id"] + self.offset) for screen in fixtures.SCREENS
+				])
+
+			def screen(self):
+				return [
+					dict(screen, Id = screen["Id"] + self.offset, Name = "Screen {0}".format(screen["Id"] + self.offset))
+					for screen in fixtures.SCREENS
+				]
+
+		class SiteBackoffice(fixtures.FakeBackoffice):
+			def distributors_by_film_and_ticket_type_report(self, start_date, end_date, site_id = None, **kwargs):
+				engagements = fixtures.FakeBackoffice.distributors_by_film_and_ticket_type_report(self, start_date, end_date)
+				for engagement in engagements.values():
+					for show in engagement["showtimes"]:
+						show["screen_name"] = "Screen {0}".format(int(show["screen_name"].split()[1]) + site_id)
+				return engagements
+
+			def iter_sessions(self, start_date, end_date = None, site_id = None, **kwargs):
+				with self.lock:
+					self.site_ids.append(site_id)
+				for session in self.sessions(start_date):
+					yield dict(session, screenId = session["screenId"] + site_id)
+
+		backoffice = SiteBackoffice()
+		backoffice.site_ids = []
+		client = libveezi.VeeziClient(backoffice, fixtures.FakeApi(), site_apis = dict((site_id, SiteApi(site_id)) for site_id in (10, 20)))
+		result = client.query(self.start, self.end, site_ids = [10, 20], site_workers = 2)
+
+		self.assertEqual(sorted(backoffice.site_ids), [10, 20])
+		self.assertEqual(sorted(result["sites"]), [10, 20])
+		self.assertEqual(sorted(result["screens"]), [11, 12, 21, 22])
+		self.assertEqual(sorted(result["films"]), ["Elf", "Heat"])
+		self.assertEqual(len(result["shows"]), 6)
+		self.assertEqual(result["shows"][(20, 21, fixtures.SHOWTIMES[0][3])]["film_id"], "Heat")
+
+	def test_unknown_site(self):
+		client = self._client(site_apis = dict([(10, fixtures.FakeApi())]))
+		with self.assertRaises(ValueError):
+			client.query(self.start, self.end, site_ids = [10, 20])
+		self.assertEqual(client.backoffice_session.windows, [])
+
+
+class StandInSiteTest(unittest.TestCase):
+	start = datetime.datetime(2015, 12, 1)
+	end = datetime.datetime(2015, 12, 31)
+
+	def setUp(self):
+		self.server = fixtures.StandInServer(site = fixtures.SITE, screens = fixtures.SCREENS, sessions = fixtures.SESSIONS, site_id = 10)
+		self.server.start()
+		self.addCleanup(self.server.stop)
+
+		http = transport.HttpSession(retries = 0)
+		self.client = libveezi.VeeziClient(
+			backoffice.BackofficeSession(http, root = self.server.root),
+			api.VeeziApi("token", http = http, root = self.server.api_root, cache = False),
+			site_apis = dict([(10, api.VeeziApi("token10", http = http, root = self.server.api_root, cache = False))]),
+		)
+
+	def test_site_ids(self):
+		result = self.client.query(self.start, self.end, site_ids = [10])
+		self.assertEqual(list(result["sites"]), [10])
+		self.assertEqual(len(result["shows"]), len(fixtures.SESSIONS))
+
+		with self.assertRaises(ValueError):
+			self.client.query(self.start, self.end, site_ids = [10, 20])
+		# The stand-in only serves site 10.
+		with self.assertRaises(ValueError):
+			self.client.backoffice_session.sessions(self.start, days = 30, site_id = 20)
+		self.assertEqual(self.server.requests[("POST", "/programming/getsessionview/20")], 1)
+
+
+def main():
+	unittest.main()
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+test_metrics.py
+"""
+
+import datetime
+import unittest
+
+from veezi import api
+from veezi import backoffice
+from veezi import libveezi
+from veezi import metrics
+from veezi import transport
+
+import fixtures
+
+
+class MetricsTest(unittest.TestCase):
+	def test_endpoint(self):
+		self.assertEqual(metrics.endpoint("https://api.us.veezi.com/v1/film/ST00012?x=1"), "/v1/film/:id")
+		self.assertEqual(metrics.endpoint("https://my.us.veezi.com/programming/getsessionview/9999"),
+			"/programming/getsessionview/:id")
+		self.assertEqual(metrics.endpoint("https://my.us.veezi.com"), "/")
+
+	def test_histogram(self):
+		histogram = metrics.Histogram(buckets = (0.1, 1.0))
+		self.assertIsNone(histogram.quantile(0.5))
+		for value in (0.05, 0.05, 0.5, 3.0):
+			histogram.observe(value)
+		summary = histogram.to_dict()
+		self.assertEqual(summary["count"], 4)
+		self.assertEqual(summary["p50"], 0.1)
+		self.assertEqual(summary["p90"], 3.0)
+		self.assertEqual(summary["buckets"], [(0.1, 2), (1.0, 1), (float("inf"), 1)])
+
+	def test_query_metrics(self):
+		with fixtures.StandInServer(
+				site = fixtures.SITE,
+				screens = fixtures.SCREENS,
+				sessions = fixtures.SESSIONS,
+				engagements = fixtures.engagements()) as server:
+			collected = metrics.Metrics()
+			http = transport.HttpSession(collectors = [collected])
+			client = libveezi.VeeziClient(
+				backoffice.BackofficeSession(http, root = server.root),
+				api.VeeziApi("token", http = http, root = server.api_root),
+				parallel_fetch = True
+			)
+			client.query(datetime.datetime(2015, 12, 1), datetime.datetime(2015, 12, 31))
+
+		summary = collected.summary()
+		self.assertEqual(summary["requests"]["count"], sum(server.requests.values()))
+		self.assertEqual(summary["requests"]["in_flight"], 0)
+		self.assertEqual(summary["requests"]["errors"], 0)
+
+		export = summary["endpoints"]["GET /Reserved.ReportViewerWebControl.axd"]
+		self.assertEqual(export["statuses"], {200: 1})
+		self.assertGreater(export["bytes_received"], 0)
+		self.assertGreater(summary["endpoints"]["POST /programming/getsessionview/:id"]["bytes_sent"], 0)
+
+		for stage in ("query", "fetch", "join", "report.launch", "report.response", "report.download", "report.parse"):
+			self.assertEqual(summary["stages"][stage]["count"], 1, stage)
+
+	def test_no_collectors(self):
+		client = libveezi.VeeziClient(fixtures.FakeBackoffice(), fixtures.FakeApi())
+		self.assertEqual(client.collectors, [])
+
+
+def main():
+	unittest.main()
+
+if __name__ == "__main__":
+	main()
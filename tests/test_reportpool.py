@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+test_reportpool.py
+"""
+
+import concurrent.futures.process
+import datetime
+import io
+import unittest
+
+from veezi import backoffice
+from veezi import reportpool
+from veezi import reports
+from veezi import transport
+
+import fixtures
+
+
+def _report_rows():
+	site = fixtures.synthetic_site(distributors = 3, films_per_distributor = 3, screens = 2, days = 4,
+		shows_per_day = 2, ticket_types = 2)
+	return site, fixtures.report_rows(site["engagements"])
+
+
+class ReportPoolTest(unittest.TestCase):
+	def setUp(self):
+		self.site, rows = _report_rows()
+		self.workbook = fixtures.report_workbook(rows)
+		self.csv = fixtures.report_csv(rows)
+		self.expected = list(reports.iter_engagements(reports.xlsx_rows(io.BytesIO(self.workbook))))
+
+	def test_film_starts(self):
+		labels = [
+			"Distrib A  -  Film 1", "Screen 1", "Mon 1 Dec 2015", "18:00", "Adult", "18:00 total",
+			"Mon 1 Dec 2015 total", "Screen 1 total", "Film 1 total",
+			"Distrib A  -  Film 2", "Screen 1", "Screen 1 total", "Film 2 total",
+			"Distrib A total", None,
+			"Distrib B  -  Film 3", "Film 3 total", "Distrib B total",
+		]
+		self.assertEqual(list(reportpool._film_starts(labels)), [0, 9, 15])
+
+	def test_xlsx_matches_serial(self):
+		engagements = list(reportpool.xlsx_engagements(io.BytesIO(self.workbook), workers = 2,
+			min_segment_rows = 20))
+		self.assertEqual(engagements, self.expected)
+
+	def test_csv_matches_serial(self):
+		expected = list(reports.iter_engagements(reports._csv_rows(io.BytesIO(self.csv))))
+		engagements = list(reportpool._csv_engagements(io.BytesIO(self.csv), workers = 2, min_segment_rows = 20))
+		self.assertEqual(engagements, expected)
+
+	def test_segments(self):
+		body = reportpool._XlsxBody(io.BytesIO(self.workbook), "Sheet1")
+		cuts = reportpool._cuts(reportpool._film_starts(body.labels()), len(body.rows), 2, 20)
+		self.assertGreater(len(cuts), 1)
+		engagements = []
+		for segment in body.segments(cuts):
+			reportpool._init_worker(body.shared_strings)
+			engagements.extend(reportpool._parse_segment(segment, body.header["report_key_offsets"]))
+		self.assertEqual(engagements, self.expected)
+
+	def test_row_count_ignores_other_row_tags(self):
+		body = reportpool._XlsxBody(io.BytesIO(self.workbook), "Sheet1", min_rows = 10 ** 6)
+		xml = body.xml.replace(b"</sheetData>", b"</sheetData><rowBreaks count=\"1\"><brk id=\"1\"/></rowBreaks>")
+		self.assertEqual(len(reportpool._ROW_TAG.findall(xml)), xml.count(b"<row ") + xml.count(b"<row>"))
+
+	def test_report_errors_propagate(self):
+		bad = fixtures.report_csv(_report_rows()[1][:-3])
+		with self.assertLogs("veezi.reportpool", level = "DEBUG") as logs:
+			with self.assertRaises(ValueError):
+				list(reportpool._csv_engagements(io.BytesIO(bad), workers = 2, min_segment_rows = 20))
+		self.assertEqual([record.levelname for record in logs.records], ["DEBUG"])
+
+	def test_broken_pool_is_parsed_serially(self):
+		def broken(body, cuts, workers):
+			raise concurrent.futures.process.BrokenProcessPool("worker died")
+
+		self.addCleanup(setattr, reportpool, "_parse", reportpool._parse)
+		reportpool._parse = broken
+		with self.assertLogs("veezi.reportpool", level = "WARNING"):
+			engagements = list(reportpool.xlsx_engagements(io.BytesIO(self.workbook), workers = 2,
+				min_segment_rows = 20))
+		self.assertEqual(engagements, self.expected)
+
+	def test_small_report_is_parsed_serially(self):
+		body = reportpool._XlsxBody(io.BytesIO(self.workbook), "Sheet1", min_rows = 10 ** 6)
+		self.assertEqual(body.rows, [])
+		engagements = list(reportpool.xlsx_engagements(io.BytesIO(self.workbook), workers = 2))
+		self.assertEqual(engagements, self.expected)
+
+
+class BackofficeParseWorkersTest(unittest.TestCase):
+	def setUp(self):
+		self.site, rows = _report_rows()
+		self.server = fixtures.StandInServer(
+			site = self.site["site"],
+			screens = self.site["screens"],
+			sessions = self.site["sessions"],
+			engagements = self.site["engagements"],
+		)
+		self.server.start()
+		self.addCleanup(self.server.stop)
+
+	def _report(self, **kwargs):
+		session = backoffice.BackofficeSession(transport.HttpSession(), root = self.server.root, **kwargs)
+		return session.distributors_by_film_and_ticket_type_report(
+			datetime.datetime(2015, 1, 1),
+			datetime.datetime(2015, 1, 4),
+		)
+
+	def test_parallel_report_matches(self):
+		report = self._report()
+		self.assertTrue(report)
+		self.assertEqual(self._report(parse_workers = 2, min_segment_rows = 20), report)
+
+
+def main():
+	unittest.main()
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+test_reports.py
+"""
+
+import datetime
+import io
+import unittest
+
+from veezi import reports
+
+import fixtures
+
+
+def _row(*values):
+	return tuple(values) + (None,) * (13 - len(values))
+
+def _ticket_row(name, sales):
+	return _row(name, None, None, None, None, sales, 0, sales, 10.0, 9.0, sales * 9.0, sales * 1.0, sales * 10.0)
+
+def _report_xlsx(rows):
+	import openpyxl
+
+	wb = openpyxl.Workbook()
+	ws = wb.active
+	ws.title = "Sheet1"
+	for row in rows:
+		ws.append(row)
+
+	f = io.BytesIO()
+	wb.save(f)
+	f.seek(0)
+	return f
+
+def _report_rows():
+	header = [_row(None) for i in range(reports.HEADER_ROWS)]
+	header[0] = _row(None, "Distributors by Film and Ticket Type", *([None] * 10 + ["Test Cinema"]))
+	header[3] = _row(*reports.PARAM_KEYS)
+	header[4] = _row("2015-12-01 - 2015-12-02", "All", "All", "Full")
+	header[9] = _row(None, None, None, None, None, *reports.REPORT_KEYS)
+
+	return header + [
+		_row("Fox  -  Heat"),
+		_row("Test Cinema  -  Screen 1"),
+		_row("Tuesday, December 01, 2015"),
+		_row("7:00 PM"),
+		_ticket_row("Adult", 3),
+		_ticket_row("Child", 1),
+		_row(None),
+		_row("7:00 PM total"),
+		_row("Tuesday, December 01, 2015 total"),
+		_row("Test Cinema  -  Screen 1 total"),
+		_row("Test Cinema  -  Screen 2"),
+		_row("Wednesday, December 02, 2015"),
+		_row("9:30 PM"),
+		_ticket_row("Adult", 2),
+		_row("9:30 PM total"),
+		_row("Wednesday, December 02, 2015 total"),
+		_row("Test Cinema  -  Screen 2 total"),
+		_row("Heat total"),
+		_row("Fox total"),
+		_row(None),
+		_row("Warner  -  Elf"),
+		_row("Test Cinema  -  Screen 1"),
+		_row("Wednesday, December 02, 2015"),
+		_row("1:00 PM"),
+		_ticket_row("Child", 5),
+		_row("1:00 PM total"),
+		_row("Wednesday, December 02, 2015 total"),
+		_row("Test Cinema  -  Screen 1 total"),
+		_row("Elf total"),
+		_row("Warner total"),
+	]
+
+
+class ReportsTest(unittest.TestCase):
+	def test_iter_engagements(self):
+		engagements = list(reports.iter_engagements(_report_rows()))
+
+		self.assertEqual([(e["site_name"], e["film_name"], e["distributor_name"]) for e in engagements], [
+			("Test Cinema", "Heat", "Fox"),
+			("Test Cinema", "Elf", "Warner"),
+		])
+		heat = engagements[0]
+		self.assertEqual([(s["screen_name"], s["showtime"]) for s in heat["showtimes"]], [
+			("Screen 1", datetime.datetime(2015, 12, 1, 19, 0)),
+			("Screen 2", datetime.datetime(2015, 12, 2, 21, 30)),
+		])
+		self.assertEqual(sorted(heat["showtimes"][0]["tickets"]), ["Adult", "Child"])
+		self.assertEqual(heat["showtimes"][0]["tickets"]["Adult"]["admits"], 3)
+		self.assertEqual(heat["showtimes"][0]["tickets"]["Adult"]["gross_total"], 30.0)
+
+	def test_truncated_report(self):
+		with self.assertRaises(ValueError):
+			list(reports.iter_engagements(_report_rows()[:-5]))
+
+	def test_merge_engagements(self):
+		first = reports.merge_engagements(dict(), reports.iter_engagements(_report_rows()))
+		merged = reports.merge_engagements(first, reports.iter_engagements(_report_rows()))
+		self.assertEqual(len(merged[("Test Cinema", "Heat")]["showtimes"]), 4)
+
+	def test_xlsx_backends(self):
+		rows = _report_rows()
+		native = list(reports.iter_engagements(reports.xlsx_rows(_report_xlsx(rows), reports.XlsxBackend.native)))
+		fallback = list(reports.iter_engagements(reports.xlsx_rows(_report_xlsx(rows), reports.XlsxBackend.openpyxl)))
+		self.assertEqual(native, list(reports.iter_engagements(rows)))
+		self.assertEqual(native, fallback)
+
+	def test_row_tracing(self):
+		rows = _report_rows()
+		with self.assertLogs("veezi.reports", level = "DEBUG") as logs:
+			untraced = list(reports.iter_engagements(rows))
+			reports.log.debug("done")
+		self.assertEqual(logs.output, ["DEBUG:veezi.reports:done"])
+
+		tracer = reports.RowTracer()
+		with self.assertLogs("veezi.reports", level = "DEBUG") as logs:
+			self.assertEqual(list(reports.iter_engagements(rows, tracer)), untraced)
+		self.assertEqual(len(logs.output), len(rows) - reports.HEADER_ROWS)
+		self.assertEqual(logs.records[0].getMessage(), "DISTRIBUTOR: Fox  -  Heat" + " | None" * 12)
+
+		sampled = reports.RowTracer(every = 10)
+		with self.assertLogs("veezi.reports", level = "DEBUG") as logs:
+			list(reports.iter_engagements(rows, sampled))
+		self.assertEqual(sampled.rows, len(rows) - reports.HEADER_ROWS)
+		self.assertEqual(len(logs.output), (sampled.rows + 9) // 10)
+
+	def test_csv_rows(self):
+		rows = _report_rows()
+		csv_rows = list(reports._csv_rows(io.BytesIO(fixtures.report_csv(rows))))
+		self.assertEqual(csv_rows[11], ("Fox  -  Heat",) + (None,) * 12)
+		self.assertEqual(
+			list(reports.iter_engagements(csv_rows)),
+			list(reports.iter_engagements(reports.xlsx_rows(_report_xlsx(rows))))
+		)
+
+	def test_synthetic_site(self):
+		site = fixtures.synthetic_site(distributors = 2, films_per_distributor = 2, screens = 2, days = 3,
+			shows_per_day = 2, ticket_types = 3)
+		self.assertEqual(len(site["sessions"]), 2 * 3 * 2)
+		self.assertEqual(len(site["engagements"]), 4)
+
+		rows = fixtures.report_rows(site["engagements"])
+		parsed = list(reports.iter_engagements(reports.xlsx_rows(_report_xlsx(rows))))
+		self.assertEqual([e["film_name"] for e in parsed], [e["film_name"] for e in site["engagements"]])
+		self.assertEqual(sum(len(e["showtimes"]) for e in parsed), len(site["sessions"]))
+		admits = sum(t["admits"] for e in parsed for s in e["showtimes"] for t in s["tickets"].values())
+		self.assertEqual(admits, sum(s["seatsSold"] for s in site["sessions"]))
+
+
+def main():
+	unittest.main()
+
+if __name__ == "__main__":
+	main()
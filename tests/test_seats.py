@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+test_seats.py
+"""
+
+import asyncio
+import datetime
+import unittest
+
+from veezi import seats
+
+import fixtures
+
+
+class FakeSessions(object):
+	def __init__(self):
+		self.sessions = [dict(s) for s in fixtures.SESSIONS]
+		self.windows = []
+
+	def iter_sessions(self, start_date, end_date = None, **kwargs):
+		self.windows.append((start_date, end_date))
+		return iter([dict(s) for s in self.sessions])
+
+
+class SeatWatcherTest(unittest.TestCase):
+	now = datetime.datetime(2015, 12, 1, 18, 0)
+
+	def setUp(self):
+		self.backoffice = FakeSessions()
+		self.watcher = seats.SeatWatcher(self.backoffice)
+
+	def test_poll(self):
+		deltas = []
+		self.watcher.subscribe(deltas.append)
+
+		delta = self.watcher.poll(self.now)
+		self.assertEqual(list(delta["added"]), [0])
+		self.assertEqual(self.backoffice.windows, [(datetime.datetime(2015, 12, 1), datetime.datetime(2015, 12, 3))])
+		self.assertEqual(self.watcher.snapshot[0]["seatsSold"], 10)
+
+		self.watcher.poll(self.now)
+		self.assertEqual(len(deltas), 1)
+
+		self.backoffice.sessions[0].update(seatsSold = 12, seatsAvailable = 88)
+		self.backoffice.sessions[1].update(seatsSold = 50)
+		delta = self.watcher.poll(self.now)
+		self.assertEqual(delta["updated"][0]["seatsSold"], 12)
+		self.assertEqual(delta["added"], dict())
+		self.assertEqual(len(deltas), 2)
+
+		delta = self.watcher.poll(self.now + datetime.timedelta(hours = 4))
+		self.assertEqual(list(delta["removed"]), [0])
+		self.assertEqual(self.watcher.snapshot, dict())
+
+	def test_interval(self):
+		self.watcher.poll(self.now)
+		self.assertEqual(self.watcher.interval(self.now), 60)
+		self.assertEqual(self.watcher.interval(self.now + datetime.timedelta(minutes = 45)), 15)
+		self.assertEqual(self.watcher.interval(self.now + datetime.timedelta(minutes = 80)), 15)
+		self.assertEqual(self.watcher.interval(self.now + datetime.timedelta(hours = 2)), seats.IDLE_INTERVAL)
+		self.assertEqual(self.watcher.interval(self.now - datetime.timedelta(hours = 4)), 180)
+
+	def test_changes(self):
+		self.watcher.poll(self.now)
+
+		async def watch():
+			changes = self.watcher.changes()
+			initial = await changes.__anext__()
+			self.backoffice.sessions[0]["seatsHeld"] = 4
+			loop = asyncio.get_running_loop()
+			await loop.run_in_executor(None, self.watcher.poll, self.now)
+			update = await changes.__anext__()
+			await changes.aclose()
+			return initial, update
+
+		initial, update = asyncio.run(watch())
+		self.assertEqual(list(initial["added"]), [0])
+		self.assertEqual(update["updated"][0]["seatsHeld"], 4)
+		self.assertEqual(self.watcher._subscribers, [])
+
+	def test_start_stop(self):
+		with self.watcher:
+			while not self.watcher.polls:
+				self.watcher._stopping.wait(0.01)
+		self.assertIsNone(self.watcher._thread)
+
+
+def main():
+	unittest.main()
+
+if __name__ == "__main__":
+	main()
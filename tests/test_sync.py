@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+test_sync.py
+"""
+
+import copy
+import datetime
+import unittest
+
+from veezi import libveezi
+from veezi import sync
+
+
+def _show(film_id, admits):
+	return dict(film_id = film_id, boxoffice = dict(Adult = dict(name = "Adult", admits = admits)))
+
+
+class FakeClient(object):
+	CINEMA_EPOCH = libveezi.VeeziClient.CINEMA_EPOCH
+
+	def __init__(self, shows, films):
+		self.shows = shows
+		self.films = films
+		self.windows = []
+
+	def query(self, start_date, end_date):
+		self.windows.append((start_date, end_date))
+		shows = dict(
+			(k, copy.deepcopy(v)) for k, v in self.shows.items()
+			if start_date <= k[2] < end_date
+		)
+		films = dict(
+			(film_id, dict(self.films[film_id]))
+			for film_id in set(show["film_id"] for show in shows.values())
+		)
+		return dict(films = films, shows = shows, sites = dict(), screens = dict())
+
+
+class VeeziSyncTest(unittest.TestCase):
+	def test_sync(self):
+		old_key = (1, 1, datetime.datetime(2015, 1, 1, 19))
+		recent_key = (1, 1, datetime.datetime(2015, 12, 20, 19))
+		client = FakeClient(
+			shows = {old_key : _show("F1", 3), recent_key : _show("F2", 1)},
+			films = dict(F1 = dict(id = "F1", name = "Heat"), F2 = dict(id = "F2", name = "Elf")),
+		)
+		veezi_sync = sync.VeeziSync(client, reopen_days = 7, lookahead_days = 30)
+
+		now = datetime.datetime(2015, 12, 21, 12)
+		delta = veezi_sync.sync(now)
+		self.assertEqual(set(delta["shows"]["added"]), set([old_key, recent_key]))
+		self.assertEqual(set(delta["films"]["added"]), set(["F1", "F2"]))
+
+		new_key = (1, 2, datetime.datetime(2015, 12, 22, 21))
+		client.shows[new_key] = _show("F3", 2)
+		client.films["F3"] = dict(id = "F3", name = "Carol")
+		client.shows[recent_key]["boxoffice"]["Adult"]["admits"] = 5
+		client.shows[recent_key]["boxoffice"]["Child"] = dict(name = "Child", admits = 1)
+
+		delta = veezi_sync.sync(now + datetime.timedelta(hours = 1))
+		self.assertEqual(client.windows[-1][0], datetime.datetime(2015, 12, 14))
+		self.assertEqual(list(delta["shows"]["added"]), [new_key])
+		self.assertEqual(list(delta["shows"]["updated"]), [recent_key])
+		self.assertEqual(list(delta["films"]["added"]), ["F3"])
+		self.assertEqual(set(delta["tickets"]["added"]), set([(recent_key, "Child"), (new_key, "Adult")]))
+		self.assertEqual(list(delta["tickets"]["updated"]), [(recent_key, "Adult")])
+
+		del client.shows[new_key]
+		delta = veezi_sync.sync(now + datetime.timedelta(hours = 2))
+		self.assertEqual(list(delta["shows"]["removed"]), [new_key])
+		self.assertEqual(list(delta["films"]["removed"]), ["F3"])
+		self.assertEqual(set(veezi_sync.result["shows"]), set([old_key, recent_key]))
+
+
+def main():
+	unittest.main()
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+test_transport.py
+"""
+
+import datetime
+import json
+import unittest
+
+from veezi import backoffice
+from veezi import metrics
+from veezi import transport
+
+import fixtures
+
+
+class HttpSessionTest(unittest.TestCase):
+	def setUp(self):
+		self.server = fixtures.StandInServer(sessions = fixtures.SESSIONS, compress = True)
+		self.server.start()
+		self.addCleanup(self.server.stop)
+		self.metrics = metrics.Metrics()
+		self.http = transport.HttpSession(collectors = [self.metrics], retries = 2, backoff = 0.001)
+		self.addCleanup(self.http.close)
+
+	def test_retries_idempotent_requests(self):
+		self.server.fail_next(2, status = 503)
+		r = self.http.get(self.server.url + "/")
+		self.assertEqual(r.status_code, 200)
+		self.assertEqual(self.server.requests[("GET", "/")], 3)
+
+		endpoint = self.metrics.summary()["endpoints"]["GET /"]
+		self.assertEqual(endpoint["retries"], 2)
+		self.assertEqual(endpoint["statuses"], {503: 2, 200: 1})
+
+	def test_gives_up_after_retries(self):
+		self.server.fail_next(3, status = 502)
+		r = self.http.get(self.server.url + "/")
+		self.assertEqual(r.status_code, 502)
+		self.assertEqual(self.server.requests[("GET", "/")], 3)
+
+	def test_does_not_retry_posts(self):
+		self.server.fail_next(1, status = 503)
+		r = self.http.post(self.server.url + "/authentication/signin", data = dict(UserName = "user"))
+		self.assertEqual(r.status_code, 503)
+		self.assertEqual(self.server.requests[("POST", "/authentication/signin")], 1)
+
+	def test_gzip_sessions(self):
+		session = backoffice.BackofficeSession(self.http, root = self.server.root)
+		path = "/programming/getsessionview/9999"
+		self.server.fail_next(1, status = 503, path = path)
+
+		sessions = list(session.iter_sessions(datetime.datetime(2015, 12, 1), datetime.datetime(2015, 12, 31)))
+		self.assertEqual(len(sessions), len(fixtures.SESSIONS))
+		self.assertEqual(self.server.requests[("POST", path)], 2)
+
+		endpoint = self.metrics.summary()["endpoints"]["POST /programming/getsessionview/:id"]
+		self.assertEqual(endpoint["retries"], 1)
+		self.assertEqual(self.http.headers["Accept-Encoding"], "gzip, deflate")
+		uncompressed = len(json.dumps(dict(sessions = fixtures.SESSIONS)))
+		self.assertLess(endpoint["bytes_received"], uncompressed)
+
+	def test_shared_session(self):
+		self.assertIs(transport.shared_session(), transport.shared_session())
+		self.assertIsInstance(transport.shared_session(), transport.HttpSession)
+
+
+def main():
+	unittest.main()
+
+if __name__ == "__main__":
+	main()
@@ -4,6 +4,9 @@
 test_veezi.py
 """
 
+import json
+import subprocess
+import sys
 import unittest
 import veezi
 
@@ -12,6 +15,22 @@ class VeeziTest(unittest.TestCase):
 	def test(self):
 		self.failIf(False)
 
+	def test_import_is_cheap(self):
+		code = (
+			"import json, logging, sys, veezi; "
+			"print(json.dumps([sorted(m for m in ('bs4', 'openpyxl', 'dateutil', 'requests', 'pkg_resources') if m in sys.modules), "
+			"len(logging.getLogger().handlers)]))"
+		)
+		loaded, root_handlers = json.loads(subprocess.check_output([sys.executable, "-c", code]).decode("utf-8"))
+		self.assertEqual(loaded, [])
+		self.assertEqual(root_handlers, 0)
+
+	def test_lazy_attributes(self):
+		self.assertTrue(veezi.__version__)
+		self.assertIs(veezi.libveezi.VeeziClient, __import__("veezi.libveezi").libveezi.VeeziClient)
+		with self.assertRaises(AttributeError):
+			veezi.missing
+
 
 def main():
 	unittest.main()